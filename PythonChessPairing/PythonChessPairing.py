@@ -1,60 +1,143 @@
 import tkinter as tk
 from tkinter import messagebox, filedialog, Toplevel, simpledialog
-from tkinter.ttk import Treeview, Notebook
-import csv
-import uuid
+from tkinter.ttk import Treeview, Notebook, Progressbar
 import sqlite3
-import json
 import random
 
-DB_FILE = "chess_tournaments.db"
+import batch
+import db
+import exporters
+import importers
+import jobs
+import metrics
+import tiebreaks
+from db import DB_FILE
+from model import TournamentModel
+from pairing import pair_round
+from vlist import RowSource, VirtualList
+
+class ProgressDialog:
+    def __init__(self, parent, title, job):
+        self.win = Toplevel(parent)
+        self.win.title(title)
+        self.win.transient(parent)
+        self.label = tk.Label(self.win, text=f"{title}...")
+        self.label.pack(padx=20, pady=5)
+        self.bar = Progressbar(self.win, mode="indeterminate", length=250)
+        self.bar.pack(padx=20, pady=5)
+        self.bar.start()
+        tk.Button(self.win, text="Cancel", command=job.cancel).pack(pady=5)
+        self.win.protocol("WM_DELETE_WINDOW", job.cancel)
+
+    def update(self, done, total, text):
+        if total:
+            self.bar.stop()
+            self.bar.config(mode="determinate", maximum=total, value=done)
+        if text:
+            self.label.config(text=text)
+
+    def close(self):
+        self.win.destroy()
+
+
+class LazyTabs:
+    """Notebook tabs that are built the first time they are shown.
+
+    build(frame) fills a tab and returns its refresh function. What a tab
+    shows stays as it is until stale() marks it out of date after a write;
+    the visible tab is then refreshed at once and the others when they are
+    next selected.
+    """
+
+    def __init__(self, notebook):
+        self.notebook = notebook
+        self.tabs = {}
+        notebook.bind("<<NotebookTabChanged>>", self._on_changed)
+
+    def add(self, name, build):
+        frame = tk.Frame(self.notebook)
+        # frame, build, refresh (None until built), stale
+        self.tabs[name] = [frame, build, None, False]
+        self.notebook.add(frame, text=name)
+
+    def current(self):
+        selected = self.notebook.select()
+        for name, tab in self.tabs.items():
+            if str(tab[0]) == selected:
+                return name
+        return None
+
+    def show(self, name):
+        tab = self.tabs[name]
+        if tab[2] is None:
+            with metrics.action(f"Building {name} tab"):
+                tab[2] = tab[1](tab[0])
+        elif tab[3]:
+            tab[2]()
+        tab[3] = False
+
+    def stale(self, *names):
+        # Jobs finish after their window may have been closed.
+        if not self.notebook.winfo_exists():
+            return
+        for name in names:
+            if self.tabs[name][2] is not None:
+                self.tabs[name][3] = True
+        current = self.current()
+        if current in names:
+            self.show(current)
+
+    def _on_changed(self, event):
+        current = self.current()
+        if current is not None:
+            self.show(current)
+
 
 class ChessApp:
-    def __init__(self, root):
+    def __init__(self, root, db_path=DB_FILE):
         self.root = root
         self.root.title("Chess Manager")
-        self.conn = sqlite3.connect(DB_FILE)
+        self.conn = metrics.instrument(sqlite3.connect(db_path, timeout=30))
         self.create_tables()
+        self.jobs = jobs.JobRunner(self.root, db_path)
+        self.db_path = db_path
+        self.feed = None
         self.cur_tourney = None
+        # TournamentID -> LazyTabs of each window open on it.
+        self.t_windows = {}
         self.init_ui()
 
     def create_tables(self):
-        cursor = self.conn.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS Tournaments (
-                TournamentID INTEGER PRIMARY KEY AUTOINCREMENT,
-                TournamentName TEXT NOT NULL UNIQUE,
-                CreatedDate DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS Players (
-                PlayerID INTEGER PRIMARY KEY AUTOINCREMENT,
-                PlayerUUID TEXT UNIQUE NOT NULL,
-                PlayerName TEXT NOT NULL,
-                TournamentID INTEGER NOT NULL,
-                FOREIGN KEY (TournamentID) REFERENCES Tournaments (TournamentID) ON DELETE CASCADE
-            )
-        """)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS Rounds (
-                RoundID INTEGER PRIMARY KEY AUTOINCREMENT,
-                RoundNumber INTEGER NOT NULL,
-                TournamentID INTEGER NOT NULL,
-                Pairings TEXT NOT NULL, -- JSON format to store pairings
-                Results TEXT, -- JSON format to store results
-                FOREIGN KEY (TournamentID) REFERENCES Tournaments (TournamentID) ON DELETE CASCADE
-            )
-        """)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS PlayerPoints (
-                PlayerID INTEGER PRIMARY KEY,
-                TournamentID INTEGER NOT NULL,
-                Points REAL DEFAULT 0,
-                FOREIGN KEY (PlayerID) REFERENCES Players (PlayerID) ON DELETE CASCADE
-            )
-        """)
-        self.conn.commit()
+        db.create_tables(self.conn)
+
+    def run_job(self, title, fn, *args, on_done=None):
+        """Run fn(conn, job, *args) on the worker thread.
+
+        With a title a progress dialog with a Cancel button is shown until
+        the job ends. on_done(result) runs on the Tk thread.
+        """
+        dialog = None
+
+        def done(result):
+            if dialog:
+                dialog.close()
+            if on_done:
+                on_done(result)
+
+        def failed(error):
+            if dialog:
+                dialog.close()
+            if not isinstance(error, jobs.Cancelled):
+                messagebox.showerror("Error", str(error))
+
+        def progress(done, total, text):
+            if dialog:
+                dialog.update(done, total, text)
+
+        job = self.jobs.submit(fn, *args, on_done=done, on_error=failed, on_progress=progress, name=title)
+        if title:
+            dialog = ProgressDialog(self.root, title, job)
+        return job
 
     def init_ui(self):
         tk.Label(self.root, text="Tournaments").grid(row=0, column=0, padx=10, pady=5)
@@ -65,8 +148,80 @@ class ChessApp:
         tk.Button(self.root, text="Add", command=self.add_t).grid(row=2, column=0, padx=10, pady=5)
         tk.Button(self.root, text="Edit", command=self.edit_t).grid(row=3, column=0, padx=10, pady=5)
         tk.Button(self.root, text="Delete", command=self.del_t).grid(row=4, column=0, padx=10, pady=5)
+        self.feed_button = tk.Button(self.root, text="Start Live Feed", command=self.toggle_feed)
+        self.feed_button.grid(row=5, column=0, padx=10, pady=5)
+        tk.Button(self.root, text="Pair Selected", command=self.pair_selected).grid(row=6, column=0, padx=10, pady=5)
         self.refresh_t_list()
 
+    def pair_selected(self):
+        # Every selected tournament (festival section) gets its next round.
+        names = [self.t_list.item(item, "values")[0] for item in self.t_list.selection()]
+        if not names:
+            messagebox.showerror("Error", "No tournament selected")
+            return
+
+        def work(conn, job):
+            cursor = conn.cursor()
+            tourney_ids = []
+            for name in names:
+                cursor.execute("SELECT TournamentID FROM Tournaments WHERE TournamentName = ?", (name,))
+                tourney_ids.append(cursor.fetchone()[0])
+            return batch.pair_sections(
+                conn, self.db_path, tourney_ids,
+                progress=lambda done, total, result: job.progress(done, total, f"{done} of {total} sections paired"))
+
+        def done(results):
+            for r in results:
+                if r.error is None:
+                    self.stale_windows(r.tourney_id, "Rounds")
+            lines = [
+                f"{r.name}: round {r.round_number}, {r.boards} boards in {sum(r.seconds):.2f} s" if r.error is None
+                else f"{r.name}: FAILED - {r.error}"
+                for r in results
+            ]
+            if any(r.error for r in results):
+                messagebox.showwarning("Pair Selected", "\n".join(lines))
+            else:
+                messagebox.showinfo("Pair Selected", "\n".join(lines))
+
+        self.run_job("Pairing sections", work, on_done=done)
+
+    def stale_windows(self, tourney_id, *names):
+        """Mark tabs stale in every window open on a tournament."""
+        windows = [tabs for tabs in self.t_windows.get(tourney_id, []) if tabs.notebook.winfo_exists()]
+        self.t_windows[tourney_id] = windows
+        for tabs in windows:
+            tabs.stale(*names)
+
+    def toggle_feed(self):
+        if self.feed is not None:
+            self.feed.shutdown()
+            self.feed.server_close()
+            self.feed = None
+            self.feed_button.config(text="Start Live Feed")
+            return
+        port = simpledialog.askinteger("Live Feed", "Port:", initialvalue=8080, minvalue=1, maxvalue=65535)
+        if not port:
+            return
+        # Only this computer unless the user opts in, as with cli.py serve.
+        network = messagebox.askyesno(
+            "Live Feed", "Let other devices on the network open the feed?\n\n"
+            "No serves it to this computer only.")
+        host = "0.0.0.0" if network else "127.0.0.1"
+        import server
+        try:
+            self.feed = server.start(self.db_path, host, port)
+        except (OSError, sqlite3.Error) as e:
+            messagebox.showerror("Error", f"Could not start the live feed: {e}")
+            return
+        self.feed_button.config(text="Stop Live Feed")
+        if network:
+            import socket
+            address = f"http://{socket.gethostname()}:{port}/ (every network interface)"
+        else:
+            address = f"http://127.0.0.1:{port}/"
+        messagebox.showinfo("Live Feed", f"Serving standings and pairings on {address}")
+
     def add_t(self):
         name = simpledialog.askstring("Add Tournament", "Enter name:")
         if name:
@@ -85,7 +240,11 @@ class ChessApp:
             new = simpledialog.askstring("Edit", "New name:", initialvalue=cur)
             if new:
                 cursor = self.conn.cursor()
-                cursor.execute("UPDATE Tournaments SET TournamentName = ? WHERE TournamentName = ?", (new, cur))
+                cursor.execute("SELECT TournamentID FROM Tournaments WHERE TournamentName = ?", (cur,))
+                tourney_id = cursor.fetchone()[0]
+                cursor.execute("UPDATE Tournaments SET TournamentName = ? WHERE TournamentID = ?", (new, tourney_id))
+                # The live feed shows the name; a new revision changes its ETag.
+                db.bump_revision(cursor, tourney_id)
                 self.conn.commit()
                 self.refresh_t_list()
 
@@ -115,207 +274,155 @@ class ChessApp:
         cursor = self.conn.cursor()
         cursor.execute("SELECT TournamentID FROM Tournaments WHERE TournamentName = ?", (self.cur_tourney,))
         tourney_id = cursor.fetchone()[0]
+        # Loaded on first use, then kept current by every write made here.
+        model = TournamentModel(tourney_id)
 
         win = Toplevel(self.root)
         win.title(f"Manage - {self.cur_tourney}")
         notebook = Notebook(win)
         notebook.pack(expand=True, fill="both")
+        tabs = LazyTabs(notebook)
+        self.t_windows.setdefault(tourney_id, []).append(tabs)
 
-        def manage_players():
-            frame = tk.Frame(notebook)
-            notebook.add(frame, text="Players")
+        def manage_players(frame):
             tk.Label(frame, text="Players", font=("Arial", 12, "bold")).pack(pady=5)
-            p_list = Treeview(frame, columns=("Player UUID", "Name"), show="headings")
-            p_list.heading("Player UUID", text="Player UUID")
-            p_list.heading("Name", text="Name")
+            p_list = VirtualList(frame, RowSource(
+                self.conn,
+                """SELECT PlayerID AS Key, PlayerUUID AS UUID, PlayerName AS Name, COALESCE(Rating, 0) AS Rating
+                   FROM Players WHERE TournamentID = ?""",
+                (tourney_id,),
+                columns=("UUID", "Name", "Rating"),
+                filter_column="Name",
+            ), headings={"UUID": "Player UUID"})
             p_list.pack(pady=5, expand=True, fill="both")
 
-            def refresh_p_list():
-                p_list.delete(*p_list.get_children())
-                cursor = self.conn.cursor()
-                cursor.execute("SELECT PlayerUUID, PlayerName FROM Players WHERE TournamentID = ?", (tourney_id,))
-                for row in cursor.fetchall():
-                    p_list.insert("", "end", values=(row[0], row[1]))
-
             def add_p():
                 name = simpledialog.askstring("Add", "Player name:")
                 if name:
-                    player_uuid = str(uuid.uuid4())[:8]
-                    cursor = self.conn.cursor()
-                    cursor.execute(
-                        "INSERT INTO Players (PlayerUUID, PlayerName, TournamentID) VALUES (?, ?, ?)",
-                        (player_uuid, name, tourney_id),
-                    )
-                    cursor.execute(
-                        "INSERT INTO PlayerPoints (PlayerID, TournamentID) SELECT PlayerID, ? FROM Players WHERE PlayerUUID = ?",
-                        (tourney_id, player_uuid),
-                    )
+                    db.add_player(self.conn, tourney_id, name)
                     self.conn.commit()
-                    refresh_p_list()
+                    model.load_new_players(self.conn)
+                    tabs.stale("Players", "Standings", "Ratings")
 
-            def import_csv():
-                path = filedialog.askopenfilename(filetypes=[("CSV files", "*.csv")])
-                if path:
-                    try:
-                        with open(path, "r") as file:
-                            reader = csv.reader(file)
-                            for row in reader:
-                                if row:
-                                    name = row[0].strip()
-                                    player_uuid = str(uuid.uuid4())[:8]
-                                    cursor = self.conn.cursor()
-                                    cursor.execute(
-                                        "INSERT INTO Players (PlayerUUID, PlayerName, TournamentID) VALUES (?, ?, ?)",
-                                        (player_uuid, name, tourney_id),
-                                    )
-                                    cursor.execute(
-                                        "INSERT INTO PlayerPoints (PlayerID, TournamentID) SELECT PlayerID, ? FROM Players WHERE PlayerUUID = ?",
-                                        (tourney_id, player_uuid),
-                                    )
-                            self.conn.commit()
-                            refresh_p_list()
-                            messagebox.showinfo("Success", "Players imported from CSV")
-                    except Exception as e:
-                        messagebox.showerror("Error", str(e))
+            def set_rating():
+                player_id = p_list.selected_key()
+                if player_id is None:
+                    messagebox.showerror("Error", "No player selected")
+                    return
+                rating = simpledialog.askinteger("Set Rating", "Rating (0 for unrated):", minvalue=0, maxvalue=4000)
+                if rating is None:
+                    return
+                db.set_rating(self.conn, player_id, rating or None)
+                self.conn.commit()
+                tabs.stale("Players", "Ratings")
+
+            def import_file():
+                path = filedialog.askopenfilename(filetypes=[
+                    ("Player lists", "*.csv *.trf *.txt"),
+                    ("CSV files", "*.csv"),
+                    ("FIDE TRF files", "*.trf *.txt"),
+                ])
+                if not path:
+                    return
+
+                def work(conn, job):
+                    count = 0
+                    with open(path, "r", newline="") as file:
+                        players = importers.read_rated_players(file, path)
+                        for count in importers.import_players_iter(conn, tourney_id, players):
+                            job.check()
+                            job.progress(count, None, f"Imported {count} players...")
+                    model.load_new_players(conn)
+                    return count
+
+                def done(count):
+                    tabs.stale("Players", "Standings", "Ratings")
+                    messagebox.showinfo("Success", f"{count} players imported")
+
+                self.run_job("Importing players", work, on_done=done)
 
             ctrl = tk.Frame(frame)
             ctrl.pack(pady=10)
             tk.Button(ctrl, text="Add", command=add_p).grid(row=0, column=0, padx=5)
-            tk.Button(ctrl, text="Import CSV", command=import_csv).grid(row=0, column=1, padx=5)
-            refresh_p_list()
+            tk.Button(ctrl, text="Import CSV/TRF", command=import_file).grid(row=0, column=1, padx=5)
+            tk.Button(ctrl, text="Set Rating", command=set_rating).grid(row=0, column=2, padx=5)
+            return p_list.refresh
 
-        def manage_rounds():
-            frame = tk.Frame(notebook)
-            notebook.add(frame, text="Rounds")
+        def manage_rounds(frame):
             tk.Label(frame, text="Rounds", font=("Arial", 12, "bold")).pack(pady=5)
-            r_list = Treeview(frame, columns=("Round Number", "Pairings"), show="headings")
-            r_list.heading("Round Number", text="Round Number")
-            r_list.heading("Pairings", text="Pairings")
+            r_list = VirtualList(frame, RowSource(self.conn, """
+                SELECT RoundID AS Key, RoundNumber AS Round, Boards,
+                       CASE WHEN Done = 0 THEN 'Pending'
+                            WHEN Done = Boards THEN 'Complete'
+                            ELSE Done || ' of ' || Boards END AS Status
+                FROM (
+                    SELECT Rounds.RoundID, Rounds.RoundNumber, COUNT(Games.GameID) AS Boards,
+                           COUNT(Games.WhitePoints) AS Done
+                    FROM Rounds
+                    LEFT JOIN Games ON Games.RoundID = Rounds.RoundID
+                    WHERE Rounds.TournamentID = ?
+                    GROUP BY Rounds.RoundID
+                )
+            """, (tourney_id,), columns=("Round", "Boards", "Status")), headings={"Round": "Round Number"}, sort="Round")
             r_list.pack(pady=5, expand=True, fill="both")
 
-            def refresh_rounds():
-                r_list.delete(*r_list.get_children())
-                cursor = self.conn.cursor()
-                cursor.execute("SELECT RoundID, RoundNumber, Pairings, Results FROM Rounds WHERE TournamentID = ?", (tourney_id,))
-                for row in cursor.fetchall():
-                    round_number = row[1]
-                    pairings = row[2]
-                    results = row[3] if row[3] else "Pending"
-                    r_list.insert("", "end", values=(round_number, pairings, results))
-
             def generate_round():
-                cursor = self.conn.cursor()
-                cursor.execute("SELECT PlayerID, Points FROM PlayerPoints WHERE TournamentID = ? ORDER BY Points DESC, PlayerID ASC", (tourney_id,))
-                players = [row[0] for row in cursor.fetchall()]
-
-                if len(players) < 2:
+                if len(model.sync(self.conn)) < 2:
                     messagebox.showerror("Error", "Not enough players for pairing")
                     return
 
-                # Create a new round number
-                cursor.execute("SELECT COUNT(*) FROM Rounds WHERE TournamentID = ?", (tourney_id,))
-                round_number = cursor.fetchone()[0] + 1
-
-                # FIDE-compliant Swiss pairing logic
-                pairings = []
-                used = set()
-                for i, player1 in enumerate(players):
-                    if player1 in used:
-                        continue
-                    for player2 in players[i + 1:]:
-                        if player2 in used:
-                            continue
-                        pairings.append((player1, player2))
-                        used.add(player1)
-                        used.add(player2)
-                        break
-
-                # If an odd number of players, the last player gets a bye
-                if len(used) < len(players):
-                    for player in players:
-                        if player not in used:
-                            pairings.append((player, None))
-                            break
-
-                pairings_json = json.dumps(pairings)
-                cursor.execute(
-                    "INSERT INTO Rounds (RoundNumber, TournamentID, Pairings) VALUES (?, ?, ?)",
-                    (round_number, tourney_id, pairings_json),
-                )
-                self.conn.commit()
-                refresh_rounds()
+                # Swiss pairing over the full history, avoiding rematches and colour clashes
+                def work(conn, job):
+                    round_number = db.next_round_number(conn, tourney_id)
+                    pairings = pair_round(model.sync(conn).player_states())
+                    job.check()
+                    db.insert_round(conn, tourney_id, round_number, pairings)
+                    model.add_round(conn, round_number, pairings)
+
+                self.run_job("Generating round", work, on_done=lambda _: tabs.stale("Rounds"))
 
             def update_results():
-                sel = r_list.selection()
+                sel = r_list.selected()
                 if not sel:
                     messagebox.showerror("Error", "No round selected")
                     return
 
-                round_id = r_list.item(sel, "values")[0]
-                pairings_json = r_list.item(sel, "values")[1]
-                results_json = r_list.item(sel, "values")[2]
-
-                pairings = json.loads(pairings_json)
-                existing_results = json.loads(results_json) if results_json and results_json != "Pending" else []
-
-                # Convert existing_results to a dictionary for easy access
-                results_dict = {}
-                for result in existing_results:
-                    results_dict[(result.get("white_id"), result.get("black_id"))] = (result.get("white_points", 0), result.get("black_points", 0))
+                round_id, round_number = sel[0], sel[1]
+                games = db.round_games(self.conn, round_id)
+                model.sync(self.conn)
 
                 results = []
 
                 def save_results():
-                    cursor = self.conn.cursor()
-                    for white_id, black_id, white_var, black_var in results:
-                        white_points = white_var.get()
-                        black_points = black_var.get()
-
-                        # Save results for each pairing
-                        if white_id is not None:
-                            cursor.execute(
-                                "UPDATE PlayerPoints SET Points = Points + ? WHERE PlayerID = ? AND TournamentID = ?",
-                                (white_points, white_id, tourney_id),
-                            )
-                        if black_id is not None:
-                            cursor.execute(
-                                "UPDATE PlayerPoints SET Points = Points + ? WHERE PlayerID = ? AND TournamentID = ?",
-                                (black_points, black_id, tourney_id),
-                            )
-
-                    # Save results as JSON in the Rounds table
-                    results_json = json.dumps([
-                        {
-                            "white_id": white_id,
-                            "black_id": black_id,
-                            "white_points": white_var.get(),
-                            "black_points": black_var.get(),
-                        }
-                        for white_id, black_id, white_var, black_var in results
-                    ])
-                    cursor.execute("UPDATE Rounds SET Results = ? WHERE RoundID = ?", (results_json, round_id))
-
-                    self.conn.commit()
-                    refresh_rounds()
+                    # Boards left blank stay pending.
+                    try:
+                        values = importers.entered_results(
+                            (white_id, black_id, white_var.get(), black_var.get())
+                            for white_id, black_id, white_var, black_var in results
+                        )
+                    except ValueError:
+                        messagebox.showerror("Error", "Results must be 0, 1/2 or 1", parent=result_window)
+                        return
                     result_window.destroy()
 
+                    def work(conn, job):
+                        changed = db.save_results(conn, tourney_id, round_id, values)
+                        model.set_results(conn, round_number, values, changed)
+                        return changed
+
+                    self.run_job("Saving results", work, on_done=lambda _: tabs.stale("Rounds", "Standings", "Ratings"))
+
                 result_window = Toplevel(self.root)
                 result_window.title("Update Results")
 
-                for i, (white_id, black_id) in enumerate(pairings):
-                    cursor.execute("SELECT PlayerName FROM Players WHERE PlayerID = ?", (white_id,))
-                    white_name = cursor.fetchone()[0]
-                    black_name = None
-                    if black_id:
-                        cursor.execute("SELECT PlayerName FROM Players WHERE PlayerID = ?", (black_id,))
-                        black_name = cursor.fetchone()[0]
-
-                    tk.Label(result_window, text=f"{white_name} vs {black_name if black_name else 'Bye'}").grid(row=i, column=0, padx=10, pady=5)
+                for i, (board, white_id, black_id, white_points, black_points) in enumerate(games):
+                    white_name = model.name(white_id)
+                    black_name = model.name(black_id)
 
-                    white_points, black_points = results_dict.get((white_id, black_id), (0, 0))
+                    tk.Label(result_window, text=f"{white_name} vs {black_name}").grid(row=i, column=0, padx=10, pady=5)
 
-                    white_var = tk.DoubleVar(value=white_points)
-                    black_var = tk.DoubleVar(value=black_points)
+                    white_var = tk.StringVar(value="" if white_points is None else white_points)
+                    black_var = tk.StringVar(value="" if black_points is None else black_points)
 
                     tk.Entry(result_window, textvariable=white_var).grid(row=i, column=1, padx=5)
                     tk.Label(result_window, text="-").grid(row=i, column=2, padx=5)
@@ -323,40 +430,85 @@ class ChessApp:
 
                     results.append((white_id, black_id, white_var, black_var))
 
-                tk.Button(result_window, text="Save Results", command=save_results).grid(row=len(pairings) + 1, column=1, pady=10)
+                tk.Button(result_window, text="Save Results", command=save_results).grid(row=len(games) + 1, column=1, pady=10)
 
-            def view_results():
-                sel = r_list.selection()
+            def import_results():
+                sel = r_list.selected()
                 if not sel:
                     messagebox.showerror("Error", "No round selected")
                     return
+                round_number = sel[1]
+                path = filedialog.askopenfilename(filetypes=[
+                    ("Result files", "*.csv *.trf *.txt"),
+                    ("CSV files (board,result)", "*.csv"),
+                    ("FIDE TRF files", "*.trf *.txt"),
+                ])
+                if not path:
+                    return
 
-                round_id = r_list.item(sel, "values")[0]
-                results_json = r_list.item(sel, "values")[2]
+                def work(conn, job):
+                    with open(path, "r", newline="") as file:
+                        return importers.import_round_results(conn, tourney_id, round_number, file, path, model)
 
-                if not results_json or results_json == "Pending":
-                    messagebox.showinfo("Results", "No results available for this round yet.")
+                def done(counts):
+                    tabs.stale("Rounds", "Standings", "Ratings")
+                    messagebox.showinfo("Success", f"{counts[0]} results read, {counts[1]} changed")
+
+                self.run_job("Importing results", work, on_done=done)
+
+            def rollback():
+                rows = db.checkpoints(self.conn, tourney_id)
+                if not rows:
+                    messagebox.showinfo("Rollback", "No checkpoints yet.")
                     return
+                rollback_window = Toplevel(self.root)
+                rollback_window.title("Rollback")
+                cp_list = Treeview(rollback_window, columns=("Checkpoint", "Taken"), show="headings")
+                cp_list.heading("Checkpoint", text="Checkpoint")
+                cp_list.heading("Taken", text="Taken")
+                cp_list.pack(padx=10, pady=5, expand=True, fill="both")
+                for checkpoint_id, label, created in rows:
+                    cp_list.insert("", "end", iid=str(checkpoint_id), values=(label, created))
+
+                def restore():
+                    sel = cp_list.selection()
+                    if not sel:
+                        messagebox.showerror("Error", "No checkpoint selected", parent=rollback_window)
+                        return
+                    label = cp_list.item(sel[0], "values")[0]
+                    if not messagebox.askyesno(
+                            "Rollback", f"Restore the tournament to \"{label}\"?\nLater rounds and results are discarded.",
+                            parent=rollback_window):
+                        return
+                    rollback_window.destroy()
+                    self.run_job(
+                        "Rolling back",
+                        lambda conn, job: db.rollback(conn, tourney_id, int(sel[0])),
+                        on_done=lambda _: tabs.stale("Rounds", "Standings", "Ratings"),
+                    )
 
-                results = json.loads(results_json)
+                tk.Button(rollback_window, text="Restore", command=restore).pack(pady=5)
 
-                result_window = Toplevel(self.root)
-                result_window.title(f"Results - Round {round_id}")
+            def view_results():
+                sel = r_list.selected()
+                if not sel:
+                    messagebox.showerror("Error", "No round selected")
+                    return
 
-                for i, result in enumerate(results):
-                    white_id = result["white_id"]
-                    black_id = result["black_id"]
+                round_id, round_number = sel[0], sel[1]
+                results = [game for game in db.round_games(self.conn, round_id) if game[3] is not None]
+                model.sync(self.conn)
 
-                    cursor.execute("SELECT PlayerName FROM Players WHERE PlayerID = ?", (white_id,))
-                    white_name = cursor.fetchone()[0]
+                if not results:
+                    messagebox.showinfo("Results", "No results available for this round yet.")
+                    return
 
-                    black_name = "Bye"
-                    if black_id:
-                        cursor.execute("SELECT PlayerName FROM Players WHERE PlayerID = ?", (black_id,))
-                        black_name = cursor.fetchone()[0]
+                result_window = Toplevel(self.root)
+                result_window.title(f"Results - Round {round_number}")
 
-                    white_points = result["white_points"]
-                    black_points = result["black_points"]
+                for i, (board, white_id, black_id, white_points, black_points) in enumerate(results):
+                    white_name = model.name(white_id)
+                    black_name = model.name(black_id)
 
                     tk.Label(result_window, text=f"{white_name} ({white_points}) vs {black_name} ({black_points})").grid(row=i, column=0, padx=10, pady=5)
 
@@ -365,146 +517,133 @@ class ChessApp:
             tk.Button(ctrl, text="Generate Round", command=generate_round).grid(row=0, column=0, padx=5)
             tk.Button(ctrl, text="Update Results", command=update_results).grid(row=0, column=1, padx=5)
             tk.Button(ctrl, text="View Results", command=view_results).grid(row=0, column=2, padx=5)
-            refresh_rounds()
+            tk.Button(ctrl, text="Import Results", command=import_results).grid(row=0, column=3, padx=5)
+            tk.Button(ctrl, text="Rollback", command=rollback).grid(row=0, column=4, padx=5)
+            return r_list.refresh
 
-        def manage_standings():
-            frame = tk.Frame(notebook)
-            notebook.add(frame, text="Standings")
+        def manage_standings(frame):
             tk.Label(frame, text="Standings", font=("Arial", 12, "bold")).pack(pady=5)
-            standings_list = Treeview(frame, columns=("Rank", "Player", "Points", "Buchholz", "Wins"), show="headings")
-            standings_list.heading("Rank", text="Rank")
-            standings_list.heading("Player", text="Player")
-            standings_list.heading("Points", text="Points")
-            standings_list.heading("Buchholz", text="Buchholz")
-            standings_list.heading("Wins", text="Wins")
+            # Rank is numbered over the whole tournament before filtering, so
+            # a filtered view still shows each player's real place. The rank
+            # order is idx_standings_rank; names come from a subquery so that
+            # counting and paging never touch Players.
+            standings_list = VirtualList(frame, RowSource(self.conn, """
+                SELECT PlayerID AS Key,
+                       (SELECT PlayerName FROM Players WHERE Players.PlayerID = Standings.PlayerID) AS Player,
+                       Points, Buchholz, Wins
+                FROM Standings
+                WHERE TournamentID = ?
+            """, (tourney_id,), columns=("Rank", "Player", "Points", "Buchholz", "Wins"), filter_column="Player",
+                rank=[("Points", True), ("Buchholz", True), ("Wins", True), ("Key", False)]), sort="Rank")
             standings_list.pack(pady=5, expand=True, fill="both")
 
-            def refresh_standings():
-                standings_list.delete(*standings_list.get_children())
-                cursor = self.conn.cursor()
-
-                # 1) Fetch all players in the tournament
-                cursor.execute("""
-                    SELECT Players.PlayerID, Players.PlayerName, PlayerPoints.Points
-                    FROM PlayerPoints
-                    JOIN Players ON PlayerPoints.PlayerID = Players.PlayerID
-                    WHERE PlayerPoints.TournamentID = ?
-                """, (tourney_id,))
-                players_data = cursor.fetchall()
-
-                # Convert to dict for easy lookup: {player_id: {"name": ..., "points": ..., "buchholz": 0, "wins": 0}}
-                players_dict = {}
-                for pid, pname, pts in players_data:
-                    players_dict[pid] = {
-                        "name": pname,
-                        "points": pts,
-                        "buchholz": 0,
-                        "wins": 0
-                    }
-
-                # 2) Fetch all rounds for this tournament
-                cursor.execute("SELECT RoundID, Pairings, Results FROM Rounds WHERE TournamentID = ?", (tourney_id,))
-                rounds_data = cursor.fetchall()
-
-                # 3) Build a mapping of opponents (for Buchholz) and track wins
-                #    We'll go round by round, pairing by pairing.
-                for (round_id, pairings_json, results_json) in rounds_data:
-                    try:
-                        pairings = json.loads(pairings_json)
-                    except:
-                        pairings = []
-
-                    if not results_json or results_json == "Pending":
-                        # No results yet, so no wins to update and no guaranteed opponents
-                        # (some might not have played if they had a bye)
-                        continue
-                    else:
-                        results = json.loads(results_json)
-
-                    # Build a dict for easy results lookup:
-                    #   key = (white_id, black_id),
-                    #   value = (white_points, black_points)
-                    results_dict = {}
-                    for r in results:
-                        w_id = r.get("white_id")
-                        b_id = r.get("black_id")
-                        w_pts = r.get("white_points", 0)
-                        b_pts = r.get("black_points", 0)
-                        results_dict[(w_id, b_id)] = (w_pts, b_pts)
-
-                    # pairings is a list of tuples: (white_id, black_id)
-                    for (white_id, black_id) in pairings:
-                        if white_id is None or black_id is None:
-                            # bye situation
-                            continue
-                        if (white_id, black_id) not in results_dict:
-                            # No result stored? skip
-                            continue
-
-                        w_pts, b_pts = results_dict[(white_id, black_id)]
-
-                        # 3.1) Update WINS
-                        # If white had a full point:
-                        if w_pts == 1.0 and white_id in players_dict:
-                            players_dict[white_id]["wins"] += 1
-                        # If black had a full point:
-                        if b_pts == 1.0 and black_id in players_dict:
-                            players_dict[black_id]["wins"] += 1
-
-                        # 3.2) Each is an opponent to the other, so for Buchholz later
-                        # We'll store them in a structure so we can sum up their final points.
-                        # For instance, keep a dict of opponents:
-                        #   players_opponents = { pid1: set([opp1, opp2, ...]), pid2: set([...]) }
-                        # We'll define it outside the round loop:
-                        if "opponents" not in players_dict[white_id]:
-                            players_dict[white_id]["opponents"] = set()
-                        if "opponents" not in players_dict[black_id]:
-                            players_dict[black_id]["opponents"] = set()
-
-                        players_dict[white_id]["opponents"].add(black_id)
-                        players_dict[black_id]["opponents"].add(white_id)
-
-                # 4) Once we've processed all rounds, we now compute Buchholz for each player
-                for pid, data in players_dict.items():
-                    opp_ids = data.get("opponents", [])
-                    buchholz = 0
-                    for opp_id in opp_ids:
-                        if opp_id in players_dict:
-                            buchholz += players_dict[opp_id]["points"]
-                    players_dict[pid]["buchholz"] = buchholz
-
-                # 5) Build a final list (player_name, points, buchholz, wins) and sort
-                standings = []
-                for pid, data in players_dict.items():
-                    pname = data["name"]
-                    pts = data["points"]
-                    bch = data["buchholz"]
-                    wns = data["wins"]
-                    standings.append((pname, pts, bch, wns))
-
-                # Sort by (descending points, descending buchholz, descending wins)
-                #  i.e. the best is first
-                standings.sort(key=lambda x: (-x[1], -x[2], -x[3]))
-
-                # 6) Insert into the standings Treeview
-                for rank, (player_name, points, buchholz, wins) in enumerate(standings, start=1):
-                    standings_list.insert(
-                        "",
-                        "end",
-                        values=(rank, player_name, points, buchholz, wins)
+            def edit_tiebreaks():
+                current = ", ".join(tiebreaks.get_order(self.conn, tourney_id))
+                text = simpledialog.askstring(
+                    "Tiebreaks", "Order, comma separated, from:\n" + ", ".join(tiebreaks.TIEBREAKS),
+                    initialvalue=current)
+                if text is None:
+                    return
+                try:
+                    tiebreaks.set_order(self.conn, tourney_id, text.split(","))
+                    self.conn.commit()
+                except ValueError as e:
+                    messagebox.showerror("Error", str(e))
+
+            def final_standings():
+                # The engine is fast enough for the Tk thread; the rows go to
+                # a temp table on this connection so the list can page them.
+                # Tiebreak columns are numbered, not named after stored data.
+                with metrics.action("Final standings"):
+                    order, rows = tiebreaks.standings(self.conn, tourney_id, model=model)
+                    columns = [f"Tiebreak{i + 1}" for i in range(len(order))]
+                    cursor = self.conn.cursor()
+                    cursor.execute("DROP TABLE IF EXISTS temp.FinalStandings")
+                    cursor.execute(f"""
+                        CREATE TEMP TABLE FinalStandings (
+                            Key INTEGER PRIMARY KEY, Rank INTEGER, Player TEXT, Points REAL,
+                            {', '.join(f'{column} REAL' for column in columns)})
+                    """)
+                    cursor.executemany(
+                        f"INSERT INTO temp.FinalStandings VALUES ({', '.join('?' * (len(order) + 4))})",
+                        [(player_id, rank, name, *values) for rank, player_id, name, *values in rows])
+                    final_window = Toplevel(self.root)
+                    final_window.title(f"Final Standings - {self.cur_tourney}")
+                    VirtualList(final_window, RowSource(
+                        self.conn, "SELECT * FROM temp.FinalStandings",
+                        columns=["Rank", "Player", "Points"] + columns, filter_column="Player"),
+                        headings={column: tiebreaks.TIEBREAKS.get(name, name) for column, name in zip(columns, order)},
+                        sort="Rank").pack(expand=True, fill="both")
+
+            def export():
+                export_window = Toplevel(self.root)
+                export_window.title("Export")
+                kind_var = tk.StringVar(value="crosstable.html")
+                for i, (kind, (_, _, description)) in enumerate(exporters.EXPORTS.items()):
+                    tk.Radiobutton(export_window, text=description, variable=kind_var, value=kind).grid(
+                        row=i, column=0, columnspan=2, sticky="w", padx=10)
+                tk.Label(export_window, text="Round (blank = latest/all):").grid(row=len(exporters.EXPORTS), column=0, padx=10, pady=5)
+                round_var = tk.StringVar()
+                tk.Entry(export_window, textvariable=round_var, width=6).grid(row=len(exporters.EXPORTS), column=1, padx=5)
+
+                def save():
+                    kind = kind_var.get()
+                    round_text = round_var.get().strip()
+                    if round_text and not round_text.isdigit():
+                        messagebox.showerror("Error", "Round must be a number", parent=export_window)
+                        return
+                    extension = exporters.EXPORTS[kind][1]
+                    path = filedialog.asksaveasfilename(
+                        parent=export_window, defaultextension=extension,
+                        initialfile=f"{self.cur_tourney} {kind.split('.')[0]}{extension}")
+                    if not path:
+                        return
+                    export_window.destroy()
+                    self.run_job(
+                        "Exporting",
+                        lambda conn, job: exporters.export(
+                            conn, tourney_id, kind, path, int(round_text) if round_text else None, model),
+                        on_done=lambda _: messagebox.showinfo("Success", f"Exported to {path}"),
                     )
 
+                tk.Button(export_window, text="Save As...", command=save).grid(
+                    row=len(exporters.EXPORTS) + 1, column=0, columnspan=2, pady=10)
 
-
-
-
-            refresh_standings()
-
-        manage_players()
-        manage_rounds()
-        manage_standings()
+            ctrl = tk.Frame(frame)
+            ctrl.pack(pady=5)
+            tk.Button(ctrl, text="Tiebreaks", command=edit_tiebreaks).grid(row=0, column=0, padx=5)
+            tk.Button(ctrl, text="Final Standings", command=final_standings).grid(row=0, column=1, padx=5)
+            tk.Button(ctrl, text="Export", command=export).grid(row=0, column=2, padx=5)
+            return standings_list.refresh
+
+        def manage_ratings(frame):
+            tk.Label(frame, text="Ratings", font=("Arial", 12, "bold")).pack(pady=5)
+            # Read straight from RatingStats, which every result save keeps
+            # current; 0 stands for unrated or not computable yet. Ranked on
+            # idx_ratingstats_rank like the Standings tab.
+            ratings_list = VirtualList(frame, RowSource(self.conn, """
+                SELECT PlayerID AS Key,
+                       (SELECT PlayerName FROM Players WHERE Players.PlayerID = RatingStats.PlayerID) AS Player,
+                       (SELECT COALESCE(Rating, 0) FROM Players WHERE Players.PlayerID = RatingStats.PlayerID) AS Rating,
+                       Games, Score, COALESCE(ROUND(AverageOpponent), 0) AS AvgOpp,
+                       COALESCE(Performance, 0) AS Performance, COALESCE(RatingChange, 0) AS Change
+                FROM RatingStats
+                WHERE TournamentID = ?
+            """, (tourney_id,), columns=("Rank", "Player", "Rating", "Games", "Score", "AvgOpp", "Performance", "Change"),
+                filter_column="Player", rank=[("Performance", True), ("Key", False)]),
+                headings={"Games": "Rated Games", "AvgOpp": "Avg Opp"}, sort="Rank")
+            ratings_list.pack(pady=5, expand=True, fill="both")
+            return ratings_list.refresh
+
+        # Each tab is filled when it is first selected (Players straight away).
+        with metrics.action("Opening tournament"):
+            tabs.add("Players", manage_players)
+            tabs.add("Rounds", manage_rounds)
+            tabs.add("Standings", manage_standings)
+            tabs.add("Ratings", manage_ratings)
 
 if __name__ == "__main__":
+    metrics.configure()
     root = tk.Tk()
     app = ChessApp(root)
     root.mainloop()
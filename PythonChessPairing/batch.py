@@ -0,0 +1,147 @@
+"""Pair the next round of many tournaments (festival sections) at once.
+
+    python cli.py pair-batch "Under 7" "Under 9" Open --workers 4
+    python cli.py pair-batch --all
+
+Sections are loaded and paired on a process pool, largest first, so a
+40-section round takes about as long as its biggest section. Only the
+parent process writes: each section's round is stored in its own
+transaction as soon as its pairings arrive, and is refused if the section
+changed (Tournaments.Revision) while it was being paired. A section that
+fails is reported and leaves the others untouched.
+"""
+import sqlite3
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import db
+import metrics
+from model import TournamentModel
+from pairing import pair_round
+
+# seconds are (load, pair, commit); error is None on success.
+SectionResult = namedtuple("SectionResult", "tourney_id name round_number boards seconds error")
+
+
+def pair_section(path, tourney_id):
+    """Pool task: read one section and pair it without writing anything.
+
+    Returns (round_number, revision, pairings, load_seconds, pair_seconds).
+    """
+    conn = sqlite3.connect(path, timeout=30)
+    try:
+        start = time.perf_counter()
+        model = TournamentModel.load(conn, tourney_id)
+        round_number = db.next_round_number(conn, tourney_id)
+        loaded = time.perf_counter()
+        if len(model) < 2:
+            raise ValueError("not enough players for pairing")
+        pairings = pair_round(model.player_states())
+        return round_number, model.revision, pairings, loaded - start, time.perf_counter() - loaded
+    finally:
+        conn.close()
+
+
+def commit_section(conn, tourney_id, round_number, revision, pairings):
+    """Store one section's round atomically, unless it changed meanwhile.
+
+    conn must be idle: its own transaction is begun and committed here, and
+    work the caller left uncommitted is refused rather than committed along.
+    """
+    _check_idle(conn)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if db.revision(conn, tourney_id) != revision:
+            raise ValueError("changed while it was being paired; pair it again")
+        db.insert_round(conn, tourney_id, round_number, pairings)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+
+def _check_idle(conn):
+    if conn.in_transaction:
+        raise ValueError("the connection has an open transaction; commit or roll it back first")
+
+
+def section_sizes(conn, tourney_ids):
+    """(name, players) per TournamentID; raises ValueError for an unknown id."""
+    sizes = {}
+    cursor = conn.cursor()
+    for tourney_id in tourney_ids:
+        cursor.execute("""
+            SELECT TournamentName, (SELECT COUNT(*) FROM Players WHERE Players.TournamentID = Tournaments.TournamentID)
+            FROM Tournaments WHERE TournamentID = ?
+        """, (tourney_id,))
+        row = cursor.fetchone()
+        if row is None:
+            raise ValueError(f"no tournament {tourney_id}")
+        sizes[tourney_id] = row
+    return sizes
+
+
+def pair_sections(conn, path, tourney_ids, workers=None, progress=None):
+    """Pair the next round of every tournament in tourney_ids.
+
+    conn is the writing connection, which must have no open transaction
+    (each section commits on its own), and path the database file the pool
+    processes read. workers=1 pairs in this process. progress(done, total,
+    result) is called as each section finishes. Returns a SectionResult per
+    section, in the order given.
+    """
+    _check_idle(conn)
+    sizes = section_sizes(conn, tourney_ids)
+    # Largest first, so the longest task is never the one started last.
+    order = sorted(sizes, key=lambda tourney_id: -sizes[tourney_id][1])
+    results = {}
+
+    def finish(tourney_id, paired=None, error=None):
+        name = sizes[tourney_id][0]
+        if error is None:
+            round_number, revision, pairings, load_seconds, pair_seconds = paired
+            start = time.perf_counter()
+            try:
+                with metrics.span("batch.commit"):
+                    commit_section(conn, tourney_id, round_number, revision, pairings)
+            except (ValueError, sqlite3.Error) as e:
+                error = e
+            seconds = (load_seconds, pair_seconds, time.perf_counter() - start)
+        if error is None:
+            result = SectionResult(tourney_id, name, round_number, len(pairings), seconds, None)
+        else:
+            result = SectionResult(tourney_id, name, None, 0, None, str(error) or type(error).__name__)
+        results[tourney_id] = result
+        if progress:
+            progress(len(results), len(order), result)
+
+    if workers == 1:
+        for tourney_id in order:
+            try:
+                paired = pair_section(path, tourney_id)
+            except Exception as e:
+                finish(tourney_id, error=e)
+            else:
+                finish(tourney_id, paired)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(pair_section, path, tourney_id): tourney_id for tourney_id in order}
+            for future in as_completed(futures):
+                try:
+                    paired = future.result()
+                except Exception as e:
+                    finish(futures[future], error=e)
+                else:
+                    finish(futures[future], paired)
+    return [results[tourney_id] for tourney_id in tourney_ids]
+
+
+def format_report(results, out):
+    out.write(f"{'section':<28}{'round':>6}{'boards':>8}{'load ms':>10}{'pair ms':>10}{'commit ms':>11}  status\n")
+    for r in results:
+        if r.error is None:
+            load, pair, commit = (f"{s * 1000:.1f}" for s in r.seconds)
+            out.write(f"{r.name[:27]:<28}{r.round_number:>6}{r.boards:>8}{load:>10}{pair:>10}{commit:>11}  ok\n")
+        else:
+            out.write(f"{r.name[:27]:<28}{'':>6}{'':>8}{'':>10}{'':>10}{'':>11}  failed: {r.error}\n")
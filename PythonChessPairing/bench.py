@@ -0,0 +1,187 @@
+"""Benchmarks for the core operations on synthetic tournaments.
+
+    python bench.py --sizes 100,1000,10000 --rounds 5 --output before.jsonl
+    python bench.py --compare before.jsonl after.jsonl
+
+Every size gets a fresh temporary database. Players are imported from a
+generated CSV file, then each round is paired, gets random results and has
+its standings read, with every step timed. One JSON object per measurement
+is written, tagged with the current git commit, so runs from different
+commits can be compared.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import db
+import importers
+from model import TournamentModel
+from pairing import pair_round
+
+DEFAULT_SIZES = (100, 1000, 10000)
+
+# Probability of (white win, draw); the rest are black wins.
+DISTRIBUTIONS = {
+    "even": (0.40, 0.30),
+    "decisive": (0.50, 0.05),
+    "drawish": (0.25, 0.60),
+}
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def random_results(games, distribution, rng):
+    white_win, draw = DISTRIBUTIONS[distribution]
+    results = []
+    for _, white_id, black_id, _, _ in games:
+        if black_id is None:
+            results.append((white_id, None, 1.0, 0.0))
+            continue
+        x = rng.random()
+        if x < white_win:
+            results.append((white_id, black_id, 1.0, 0.0))
+        elif x < white_win + draw:
+            results.append((white_id, black_id, 0.5, 0.5))
+        else:
+            results.append((white_id, black_id, 0.0, 1.0))
+    return results
+
+
+def generate_tournament(path, players, rounds, distribution="even", seed=0, timer=None):
+    """Create a tournament with results in the database at path.
+
+    timer(operation, round_number, seconds) is called for every timed step.
+    Returns the TournamentID.
+    """
+    timer = timer or (lambda *args: None)
+    rng = random.Random(seed)
+    conn = db.connect(path)
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO Tournaments (TournamentName) VALUES (?)", (f"Synthetic {players}x{rounds}",))
+    tourney_id = cursor.lastrowid
+
+    with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as file:
+        for i in range(players):
+            file.write(f"Player {i + 1:06d}\n")
+    try:
+        start = time.perf_counter()
+        with open(file.name, "r", newline="") as players_file:
+            importers.import_players(conn, tourney_id, importers.read_players(players_file, file.name))
+        conn.commit()
+        timer("import", 0, time.perf_counter() - start)
+    finally:
+        os.unlink(file.name)
+
+    # Kept current the way a tournament window keeps its model.
+    model = TournamentModel.load(conn, tourney_id)
+    for _ in range(rounds):
+        start = time.perf_counter()
+        round_number = db.next_round_number(conn, tourney_id)
+        states = model.sync(conn).player_states()
+        loaded = time.perf_counter()
+        pairings = pair_round(states)
+        paired = time.perf_counter()
+        round_id = db.insert_round(conn, tourney_id, round_number, pairings)
+        model.add_round(conn, round_number, pairings)
+        conn.commit()
+        done = time.perf_counter()
+        timer("load_states", round_number, loaded - start)
+        timer("pair_round", round_number, paired - loaded)
+        timer("generate_round", round_number, done - start)
+
+        results = random_results(db.round_games(conn, round_id), distribution, rng)
+        start = time.perf_counter()
+        changed = db.save_results(conn, tourney_id, round_id, results)
+        model.set_results(conn, round_number, results, changed)
+        conn.commit()
+        timer("save_results", round_number, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        changed = db.save_results(conn, tourney_id, round_id, results)
+        model.set_results(conn, round_number, results, changed)
+        conn.commit()
+        timer("save_results_again", round_number, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        db.standings(conn, tourney_id)
+        timer("standings", round_number, time.perf_counter() - start)
+
+    conn.close()
+    return tourney_id
+
+
+def run(sizes, rounds, distribution, seed, out):
+    commit = git_commit()
+    for players in sizes:
+        def timer(operation, round_number, seconds):
+            record = {
+                "commit": commit,
+                "operation": operation,
+                "players": players,
+                "rounds": rounds,
+                "round": round_number,
+                "seconds": round(seconds, 6),
+            }
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+
+        with tempfile.TemporaryDirectory() as tmp:
+            generate_tournament(os.path.join(tmp, "bench.db"), players, rounds, distribution, seed, timer)
+
+
+def load(path):
+    """Median seconds per (operation, players) from a results file."""
+    samples = {}
+    with open(path) as file:
+        for line in file:
+            record = json.loads(line)
+            samples.setdefault((record["operation"], record["players"]), []).append(record["seconds"])
+    return {key: statistics.median(values) for key, values in samples.items()}
+
+
+def compare(old_path, new_path, out):
+    old, new = load(old_path), load(new_path)
+    out.write(f"{'operation':<20}{'players':>9}{'old ms':>12}{'new ms':>12}{'ratio':>8}\n")
+    for key in sorted(set(old) & set(new), key=lambda k: (k[1], k[0])):
+        ratio = new[key] / old[key] if old[key] else float("inf")
+        out.write(f"{key[0]:<20}{key[1]:>9}{old[key] * 1000:>12.2f}{new[key] * 1000:>12.2f}{ratio:>8.2f}\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark pairing, results and standings on synthetic tournaments")
+    parser.add_argument("--sizes", default=",".join(str(n) for n in DEFAULT_SIZES),
+                        help="comma separated player counts (default: %(default)s)")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--distribution", choices=sorted(DISTRIBUTIONS), default="even")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write JSON lines here instead of stdout")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two result files")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(args.compare[0], args.compare[1], sys.stdout)
+        return
+    sizes = [int(size) for size in args.sizes.split(",")]
+    if args.output:
+        with open(args.output, "w") as out:
+            run(sizes, args.rounds, args.distribution, args.seed, out)
+    else:
+        run(sizes, args.rounds, args.distribution, args.seed, sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
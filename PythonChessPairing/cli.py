@@ -0,0 +1,341 @@
+"""Command line interface.
+
+    python cli.py create "Spring Open"
+    python cli.py import "Spring Open" players.csv
+    python cli.py pair "Spring Open"
+    python cli.py pair-batch "Under 9" "Under 11" Open --workers 4
+    python cli.py results "Spring Open" 1 round1.csv
+    python cli.py standings "Spring Open" --format csv
+    python cli.py ratings "Spring Open"
+    python cli.py rollback "Spring Open" --round 3
+    python cli.py tiebreaks "Spring Open" buchholz_cut1 sonneborn_berger
+    python cli.py export "Spring Open" crosstable.html crosstable.html
+    python cli.py serve --port 8080
+    python cli.py --metrics chess_metrics.jsonl --profile pair "Spring Open"
+
+Running it without a command starts the GUI. tkinter is only imported in
+that case, so the other commands work on machines without a display.
+"""
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import sys
+import time
+
+import db
+import metrics
+
+
+def find_tournament(conn, name_or_id):
+    cursor = conn.cursor()
+    cursor.execute("SELECT TournamentID FROM Tournaments WHERE TournamentName = ?", (name_or_id,))
+    row = cursor.fetchone()
+    if row is None and name_or_id.isdigit():
+        cursor.execute("SELECT TournamentID FROM Tournaments WHERE TournamentID = ?", (int(name_or_id),))
+        row = cursor.fetchone()
+    if row is None:
+        raise SystemExit(f"error: no tournament {name_or_id!r}")
+    return row[0]
+
+
+def cmd_list(conn, args):
+    cursor = conn.cursor()
+    cursor.execute("SELECT TournamentID, TournamentName FROM Tournaments ORDER BY TournamentID")
+    for tourney_id, name in cursor.fetchall():
+        print(f"{tourney_id}\t{name}")
+
+
+def cmd_create(conn, args):
+    try:
+        cursor = conn.cursor()
+        cursor.execute("INSERT INTO Tournaments (TournamentName) VALUES (?)", (args.name,))
+    except sqlite3.IntegrityError:
+        raise SystemExit("error: tournament name must be unique")
+    conn.commit()
+    print(cursor.lastrowid)
+
+
+def cmd_import(conn, args):
+    import importers
+
+    tourney_id = find_tournament(conn, args.tournament)
+    with open(args.file, "r", newline="") as file:
+        count = importers.import_players(conn, tourney_id, importers.read_rated_players(file, args.file))
+    conn.commit()
+    print(f"{count} players imported")
+
+
+def cmd_pair(conn, args):
+    from model import TournamentModel
+    from pairing import pair_round
+
+    tourney_id = find_tournament(conn, args.tournament)
+    model = TournamentModel.load(conn, tourney_id)
+    if len(model) < 2:
+        raise SystemExit("error: not enough players for pairing")
+    round_number = db.next_round_number(conn, tourney_id)
+    pairings = pair_round(model.player_states())
+    db.insert_round(conn, tourney_id, round_number, pairings)
+    conn.commit()
+    print(f"Round {round_number}")
+    for board, (white_id, black_id) in enumerate(pairings, start=1):
+        print(f"{board}\t{model.name(white_id)}\t{model.name(black_id)}")
+
+
+def cmd_pair_batch(conn, args):
+    import batch
+
+    if args.all:
+        tourney_ids = [row[0] for row in conn.execute("SELECT TournamentID FROM Tournaments ORDER BY TournamentID")]
+    else:
+        tourney_ids = [find_tournament(conn, name) for name in args.tournaments]
+    if not tourney_ids:
+        raise SystemExit("error: name the tournaments to pair, or use --all")
+    start = time.perf_counter()
+    results = batch.pair_sections(conn, args.db, tourney_ids, args.workers)
+    batch.format_report(results, sys.stdout)
+    failed = sum(r.error is not None for r in results)
+    print(f"{len(results) - failed} paired, {failed} failed in {time.perf_counter() - start:.2f} s")
+    if failed:
+        raise SystemExit(1)
+
+
+def cmd_results(conn, args):
+    import importers
+
+    tourney_id = find_tournament(conn, args.tournament)
+    path = args.format_hint if args.file == "-" else args.file
+    file = sys.stdin if args.file == "-" else open(args.file, "r", newline="")
+    with file:
+        try:
+            read, changed = importers.import_round_results(conn, tourney_id, args.round, file, path)
+        except ValueError as e:
+            raise SystemExit(f"error: {e}")
+    conn.commit()
+    print(f"{read} results read, {changed} changed")
+
+
+def cmd_checkpoints(conn, args):
+    tourney_id = find_tournament(conn, args.tournament)
+    for checkpoint_id, label, created in db.checkpoints(conn, tourney_id):
+        print(f"{checkpoint_id}\t{created}\t{label}")
+
+
+def cmd_rollback(conn, args):
+    tourney_id = find_tournament(conn, args.tournament)
+    checkpoint_id = args.checkpoint
+    try:
+        if checkpoint_id is None:
+            checkpoint_id = db.rollback_to_round(conn, tourney_id, args.round)
+        else:
+            db.rollback(conn, tourney_id, checkpoint_id)
+    except ValueError as e:
+        raise SystemExit(f"error: {e}")
+    conn.commit()
+    print(f"restored checkpoint {checkpoint_id}")
+
+
+def cmd_standings(conn, args):
+    tourney_id = find_tournament(conn, args.tournament)
+    if args.final:
+        import tiebreaks
+
+        order, rows = tiebreaks.standings(conn, tourney_id)
+        rows = [(rank, name) + tuple(values) for rank, _, name, *values in rows]
+        header = ("Rank", "Player", "Points") + tuple(tiebreaks.TIEBREAKS[name] for name in order)
+    else:
+        rows = [(rank,) + tuple(row) for rank, row in enumerate(db.standings(conn, tourney_id), start=1)]
+        header = ("Rank", "Player", "Points", "Buchholz", "Wins")
+    print_table(header, rows, args.format)
+
+
+def print_table(header, rows, fmt):
+    if fmt == "csv":
+        writer = csv.writer(sys.stdout)
+        writer.writerow(header)
+        writer.writerows(rows)
+    elif fmt == "json":
+        json.dump([dict(zip(header, row)) for row in rows], sys.stdout, indent=1)
+        print()
+    else:
+        print("\t".join(header))
+        for row in rows:
+            print("\t".join(str(value) for value in row))
+
+
+def cmd_ratings(conn, args):
+    import reports
+
+    tourney_id = find_tournament(conn, args.tournament)
+    header, rows = reports.ratings_table(conn, tourney_id)
+    print_table(header, rows, args.format)
+
+
+def cmd_set_rating(conn, args):
+    tourney_id = find_tournament(conn, args.tournament)
+    row = conn.execute(
+        "SELECT PlayerID FROM Players WHERE TournamentID = ? AND (PlayerName = ? OR PlayerUUID = ?)",
+        (tourney_id, args.player, args.player),
+    ).fetchone()
+    if row is None:
+        raise SystemExit(f"error: no player {args.player!r} in this tournament")
+    db.set_rating(conn, row[0], args.rating or None)
+    conn.commit()
+
+
+def cmd_tiebreaks(conn, args):
+    import tiebreaks
+
+    tourney_id = find_tournament(conn, args.tournament)
+    if args.names:
+        try:
+            tiebreaks.set_order(conn, tourney_id, ",".join(args.names).split(","))
+        except ValueError as e:
+            raise SystemExit(f"error: {e}")
+        conn.commit()
+    print(",".join(tiebreaks.get_order(conn, tourney_id)))
+
+
+def cmd_export(conn, args):
+    import exporters
+
+    tourney_id = find_tournament(conn, args.tournament)
+    try:
+        if args.file == "-":
+            exporters.export(conn, tourney_id, args.kind, sys.stdout, args.round)
+        else:
+            exporters.export(conn, tourney_id, args.kind, args.file, args.round)
+    except ValueError as e:
+        raise SystemExit(f"error: {e}")
+
+
+def cmd_serve(conn, args):
+    conn.close()
+    import server
+
+    print(f"Serving http://{args.host}:{args.port}/ (Ctrl+C to stop)")
+    server.serve(args.db, args.host, args.port)
+
+
+def cmd_gui(conn, args):
+    conn.close()
+    import tkinter as tk
+    from PythonChessPairing import ChessApp
+
+    root = tk.Tk()
+    ChessApp(root, args.db)
+    root.mainloop()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Chess tournament manager")
+    parser.add_argument("--db", default=db.DB_FILE, help="SQLite database file (default: %(default)s)")
+    parser.add_argument("--metrics", metavar="FILE",
+                        help=f"record timings to FILE (the GUI always records to {metrics.METRICS_FILE})")
+    parser.add_argument("--profile", action="store_true", help="also run every action under cProfile")
+    sub = parser.add_subparsers(dest="command")
+
+    sub.add_parser("gui", help="start the graphical interface (default)").set_defaults(func=cmd_gui)
+    sub.add_parser("list", help="list tournaments").set_defaults(func=cmd_list)
+
+    p = sub.add_parser("create", help="create a tournament")
+    p.add_argument("name")
+    p.set_defaults(func=cmd_create)
+
+    p = sub.add_parser("import", help="import players from a CSV or TRF file")
+    p.add_argument("tournament", help="tournament name or id")
+    p.add_argument("file")
+    p.set_defaults(func=cmd_import)
+
+    p = sub.add_parser("pair", help="pair the next round")
+    p.add_argument("tournament", help="tournament name or id")
+    p.set_defaults(func=cmd_pair)
+
+    p = sub.add_parser("pair-batch", help="pair the next round of several tournaments in parallel")
+    p.add_argument("tournaments", nargs="*", help="tournament names or ids")
+    p.add_argument("--all", action="store_true", help="every tournament in the database")
+    p.add_argument("--workers", type=int, help="pool processes (default: CPU count, 1 pairs in-process)")
+    p.set_defaults(func=cmd_pair_batch)
+
+    p = sub.add_parser("results", help="enter the results of a round from CSV")
+    p.add_argument("tournament", help="tournament name or id")
+    p.add_argument("round", type=int)
+    p.add_argument("file", help="CSV or TRF file, or - for stdin")
+    p.add_argument("--trf", dest="format_hint", action="store_const", const="stdin.trf", default="stdin.csv",
+                   help="read stdin as TRF instead of CSV")
+    p.set_defaults(func=cmd_results)
+
+    p = sub.add_parser("checkpoints", help="list restore points")
+    p.add_argument("tournament", help="tournament name or id")
+    p.set_defaults(func=cmd_checkpoints)
+
+    p = sub.add_parser("rollback", help="restore the tournament to an earlier round or checkpoint")
+    p.add_argument("tournament", help="tournament name or id")
+    group = p.add_mutually_exclusive_group(required=True)
+    group.add_argument("--round", type=int, help="keep rounds up to this one with their latest results (0 removes every round)")
+    group.add_argument("--checkpoint", type=int, help="checkpoint id from the checkpoints command")
+    p.set_defaults(func=cmd_rollback)
+
+    p = sub.add_parser("standings", help="print standings")
+    p.add_argument("tournament", help="tournament name or id")
+    p.add_argument("--format", choices=("text", "csv", "json"), default="text")
+    p.add_argument("--final", action="store_true", help="rank with the tournament's full tiebreak order")
+    p.set_defaults(func=cmd_standings)
+
+    p = sub.add_parser("ratings", help="print performance ratings and rating changes")
+    p.add_argument("tournament", help="tournament name or id")
+    p.add_argument("--format", choices=("text", "csv", "json"), default="text")
+    p.set_defaults(func=cmd_ratings)
+
+    p = sub.add_parser("set-rating", help="set a player's rating (0 for unrated)")
+    p.add_argument("tournament", help="tournament name or id")
+    p.add_argument("player", help="player name or UUID")
+    p.add_argument("rating", type=int)
+    p.set_defaults(func=cmd_set_rating)
+
+    p = sub.add_parser("tiebreaks", help="show or set the tiebreak order")
+    p.add_argument("tournament", help="tournament name or id")
+    p.add_argument("names", nargs="*", help="e.g. buchholz_cut1 sonneborn_berger wins")
+    p.set_defaults(func=cmd_tiebreaks)
+
+    p = sub.add_parser("export", help="export TRF, crosstables, pairing sheets, PGN headers or rating boards")
+    p.add_argument("tournament", help="tournament name or id")
+    p.add_argument("kind", choices=("trf", "crosstable.csv", "crosstable.html", "pairings.csv", "pairings.html", "pgn",
+                                    "ratings.csv", "ratings.html"))
+    p.add_argument("file", help="output file, or - for stdout")
+    p.add_argument("--round", type=int, help="round of a pairing sheet (default: latest) or PGN (default: all)")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("serve", help="serve pairings and standings over HTTP")
+    p.add_argument("--host", default="127.0.0.1", help="use 0.0.0.0 to serve the whole network")
+    p.add_argument("--port", type=int, default=8080)
+    p.set_defaults(func=cmd_serve)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    func = getattr(args, "func", cmd_gui)
+    if args.metrics or args.profile or func is cmd_gui:
+        metrics.configure(args.metrics or metrics.METRICS_FILE, profile=args.profile or None)
+    conn = db.connect(args.db)
+    try:
+        if func in (cmd_gui, cmd_serve):
+            func(conn, args)
+        else:
+            with metrics.action(f"cli {args.command}"):
+                func(conn, args)
+    finally:
+        if func not in (cmd_gui, cmd_serve):
+            conn.close()
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except BrokenPipeError:
+        # Output was piped into something like head that stopped reading.
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(1)
@@ -0,0 +1,707 @@
+"""SQLite schema, migrations and the queries shared by the GUI and scripts.
+
+None of the helpers commit; the caller owns the transaction.
+"""
+import json
+import sqlite3
+import uuid
+from collections import defaultdict
+
+import metrics
+import ratings
+
+DB_FILE = "chess_tournaments.db"
+
+
+def connect(path=DB_FILE):
+    conn = sqlite3.connect(path)
+    metrics.instrument(conn)
+    create_tables(conn)
+    return conn
+
+
+def enable_wal(conn):
+    """Switch the file to write-ahead logging (persistent).
+
+    Readers then work from a snapshot and never block the writer, which is
+    what lets the HTTP feed poll while the arbiter enters results.
+    """
+    conn.execute("PRAGMA journal_mode = WAL")
+
+
+def create_tables(conn):
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS Tournaments (
+            TournamentID INTEGER PRIMARY KEY AUTOINCREMENT,
+            TournamentName TEXT NOT NULL UNIQUE,
+            CreatedDate DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS Players (
+            PlayerID INTEGER PRIMARY KEY AUTOINCREMENT,
+            PlayerUUID TEXT UNIQUE NOT NULL,
+            PlayerName TEXT NOT NULL,
+            TournamentID INTEGER NOT NULL,
+            FOREIGN KEY (TournamentID) REFERENCES Tournaments (TournamentID) ON DELETE CASCADE
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS Rounds (
+            RoundID INTEGER PRIMARY KEY AUTOINCREMENT,
+            RoundNumber INTEGER NOT NULL,
+            TournamentID INTEGER NOT NULL,
+            Pairings TEXT NOT NULL, -- JSON format to store pairings
+            Results TEXT, -- JSON format to store results
+            FOREIGN KEY (TournamentID) REFERENCES Tournaments (TournamentID) ON DELETE CASCADE
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS PlayerPoints (
+            PlayerID INTEGER PRIMARY KEY,
+            TournamentID INTEGER NOT NULL,
+            Points REAL DEFAULT 0,
+            FOREIGN KEY (PlayerID) REFERENCES Players (PlayerID) ON DELETE CASCADE
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS Games (
+            GameID INTEGER PRIMARY KEY AUTOINCREMENT,
+            TournamentID INTEGER NOT NULL,
+            RoundID INTEGER NOT NULL,
+            RoundNumber INTEGER NOT NULL,
+            Board INTEGER NOT NULL,
+            WhiteID INTEGER NOT NULL,
+            BlackID INTEGER, -- NULL for a bye
+            WhitePoints REAL, -- NULL until a result is entered
+            BlackPoints REAL,
+            FOREIGN KEY (TournamentID) REFERENCES Tournaments (TournamentID) ON DELETE CASCADE,
+            FOREIGN KEY (RoundID) REFERENCES Rounds (RoundID) ON DELETE CASCADE
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS Standings (
+            PlayerID INTEGER PRIMARY KEY,
+            TournamentID INTEGER NOT NULL,
+            Points REAL NOT NULL DEFAULT 0,
+            Wins INTEGER NOT NULL DEFAULT 0,
+            Buchholz REAL NOT NULL DEFAULT 0, -- sum of the current points of every opponent played
+            FOREIGN KEY (PlayerID) REFERENCES Players (PlayerID) ON DELETE CASCADE
+        )
+    """)
+    # Running sums over each player's games against rated opponents; see
+    # ratings.py. save_results keeps them current.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS RatingStats (
+            PlayerID INTEGER PRIMARY KEY,
+            TournamentID INTEGER NOT NULL,
+            Games INTEGER NOT NULL DEFAULT 0, -- games with a result against a rated opponent
+            Score REAL NOT NULL DEFAULT 0,
+            OpponentRatings INTEGER NOT NULL DEFAULT 0, -- sum of those opponents' ratings
+            Expected REAL NOT NULL DEFAULT 0, -- sum of expected scores; 0 for an unrated player
+            AverageOpponent REAL,
+            Performance INTEGER,
+            RatingChange REAL,
+            FOREIGN KEY (PlayerID) REFERENCES Players (PlayerID) ON DELETE CASCADE
+        )
+    """)
+    # Restore points taken before every pairing and result save: a copy of
+    # each player's totals, plus the previous result of every game a save
+    # changed. See checkpoint() and rollback().
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS Checkpoints (
+            CheckpointID INTEGER PRIMARY KEY AUTOINCREMENT,
+            TournamentID INTEGER NOT NULL,
+            Action TEXT NOT NULL, -- 'pair' or 'results'
+            RoundNumber INTEGER NOT NULL, -- the round being paired or scored
+            LastRound INTEGER NOT NULL, -- rounds paired at the time
+            CreatedDate DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (TournamentID) REFERENCES Tournaments (TournamentID) ON DELETE CASCADE
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS CheckpointStandings (
+            CheckpointID INTEGER NOT NULL,
+            PlayerID INTEGER NOT NULL,
+            Points REAL NOT NULL,
+            Wins INTEGER NOT NULL,
+            Buchholz REAL NOT NULL,
+            PlayerPoints REAL,
+            PRIMARY KEY (CheckpointID, PlayerID)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS CheckpointGames (
+            CheckpointID INTEGER NOT NULL,
+            GameID INTEGER NOT NULL,
+            WhitePoints REAL,
+            BlackPoints REAL,
+            PRIMARY KEY (CheckpointID, GameID)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_games_tournament_round ON Games (TournamentID, RoundNumber)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_checkpoints_tournament ON Checkpoints (TournamentID, Action, RoundNumber)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_checkpointgames_game ON CheckpointGames (GameID, CheckpointID)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_games_round_board ON Games (RoundID, Board)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_games_white ON Games (WhiteID)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_games_black ON Games (BlackID)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_rounds_tournament ON Rounds (TournamentID, RoundNumber)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_players_tournament ON Players (TournamentID, PlayerName)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_playerpoints_tournament ON PlayerPoints (TournamentID)")
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_standings_rank ON Standings (TournamentID, Points DESC, Buchholz DESC, Wins DESC)"
+    )
+    # The Ratings tab pages on this order, unrated (NULL) performances last.
+    cursor.execute("DROP INDEX IF EXISTS idx_ratingstats_tournament")
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_ratingstats_rank ON RatingStats (TournamentID, COALESCE(Performance, 0) DESC)"
+    )
+    migrate(conn)
+    conn.commit()
+
+
+def _migrate_games(cursor):
+    # Databases written before the Games table kept every round only as the
+    # JSON blobs in Rounds; unpack them once into one row per game.
+    cursor.execute("SELECT RoundID, RoundNumber, TournamentID, Pairings, Results FROM Rounds")
+    for round_id, round_number, tourney_id, pairings_json, results_json in cursor.fetchall():
+        try:
+            pairings = json.loads(pairings_json)
+        except (TypeError, ValueError):
+            pairings = []
+        results = {}
+        if results_json and results_json != "Pending":
+            for r in json.loads(results_json):
+                results[(r.get("white_id"), r.get("black_id"))] = (r.get("white_points", 0), r.get("black_points", 0))
+        _insert_games(cursor, tourney_id, round_id, round_number, pairings, results)
+
+
+def _migrate_standings(cursor):
+    rebuild_standings(cursor)
+
+
+def _migrate_tiebreaks(cursor):
+    # Comma separated tiebreak names (see tiebreaks.TIEBREAKS); NULL means
+    # the default Buchholz, Wins.
+    cursor.execute("ALTER TABLE Tournaments ADD COLUMN Tiebreaks TEXT")
+
+
+def _migrate_revision(cursor):
+    # Bumped in the same transaction as every round, result or player
+    # change, so readers can tell whether anything they cached is stale.
+    cursor.execute("ALTER TABLE Tournaments ADD COLUMN Revision INTEGER NOT NULL DEFAULT 0")
+
+
+def _migrate_ratings(cursor):
+    # Elo rating, NULL for an unrated player. Nobody had one before, so the
+    # rating sums start at zero.
+    cursor.execute("ALTER TABLE Players ADD COLUMN Rating INTEGER")
+    cursor.execute("INSERT INTO RatingStats (PlayerID, TournamentID) SELECT PlayerID, TournamentID FROM Players")
+
+
+# MIGRATIONS[n] upgrades a database from PRAGMA user_version n to n + 1.
+MIGRATIONS = [_migrate_games, _migrate_standings, _migrate_tiebreaks, _migrate_revision, _migrate_ratings]
+
+
+def migrate(conn):
+    cursor = conn.cursor()
+    version = cursor.execute("PRAGMA user_version").fetchone()[0]
+    for step in MIGRATIONS[version:]:
+        step(cursor)
+    if version < len(MIGRATIONS):
+        cursor.execute("PRAGMA user_version = %d" % len(MIGRATIONS))
+
+
+def bump_revision(cursor, tourney_id):
+    cursor.execute("UPDATE Tournaments SET Revision = Revision + 1 WHERE TournamentID = ?", (tourney_id,))
+
+
+def revision(conn, tourney_id):
+    """Current Revision of a tournament, or None if it does not exist."""
+    row = conn.execute("SELECT Revision FROM Tournaments WHERE TournamentID = ?", (tourney_id,)).fetchone()
+    return row[0] if row else None
+
+
+def _insert_games(cursor, tourney_id, round_id, round_number, pairings, results=None):
+    results = results or {}
+    rows = []
+    for board, (white_id, black_id) in enumerate(pairings, start=1):
+        white_points, black_points = results.get((white_id, black_id), (None, None))
+        rows.append((tourney_id, round_id, round_number, board, white_id, black_id, white_points, black_points))
+    cursor.executemany(
+        """INSERT INTO Games (TournamentID, RoundID, RoundNumber, Board, WhiteID, BlackID, WhitePoints, BlackPoints)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+        rows,
+    )
+
+
+def next_round_number(conn, tourney_id):
+    cursor = conn.cursor()
+    cursor.execute("SELECT COALESCE(MAX(RoundNumber), 0) + 1 FROM Rounds WHERE TournamentID = ?", (tourney_id,))
+    return cursor.fetchone()[0]
+
+
+@metrics.timed("db.insert_round")
+def insert_round(conn, tourney_id, round_number, pairings):
+    """Store a freshly paired round and return its RoundID.
+
+    The JSON copy in Rounds.Pairings is kept so that older versions of the
+    app can still read the file.
+    """
+    cursor = conn.cursor()
+    checkpoint(cursor, tourney_id, "pair", round_number)
+    cursor.execute(
+        "INSERT INTO Rounds (RoundNumber, TournamentID, Pairings) VALUES (?, ?, ?)",
+        (round_number, tourney_id, json.dumps(pairings)),
+    )
+    round_id = cursor.lastrowid
+    _insert_games(cursor, tourney_id, round_id, round_number, pairings)
+    bump_revision(cursor, tourney_id)
+    return round_id
+
+
+def round_games(conn, round_id):
+    """Return (board, white_id, black_id, white_points, black_points) rows."""
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT Board, WhiteID, BlackID, WhitePoints, BlackPoints FROM Games WHERE RoundID = ? ORDER BY Board",
+        (round_id,),
+    )
+    return cursor.fetchall()
+
+
+@metrics.timed("db.add_player")
+def add_player(conn, tourney_id, name, rating=None):
+    """Register a player with zero points and return the new PlayerID."""
+    cursor = conn.cursor()
+    cursor.execute(
+        "INSERT INTO Players (PlayerUUID, PlayerName, TournamentID, Rating) VALUES (?, ?, ?, ?)",
+        (str(uuid.uuid4())[:8], name, tourney_id, rating),
+    )
+    player_id = cursor.lastrowid
+    cursor.execute("INSERT INTO PlayerPoints (PlayerID, TournamentID) VALUES (?, ?)", (player_id, tourney_id))
+    cursor.execute("INSERT INTO Standings (PlayerID, TournamentID) VALUES (?, ?)", (player_id, tourney_id))
+    cursor.execute("INSERT INTO RatingStats (PlayerID, TournamentID) VALUES (?, ?)", (player_id, tourney_id))
+    bump_revision(cursor, tourney_id)
+    return player_id
+
+
+@metrics.timed("db.save_results")
+def save_results(conn, tourney_id, round_id, results):
+    """Record results given as (white_id, black_id, white_points, black_points).
+
+    Only the difference to what is already stored for the round is applied,
+    so saving a round again or correcting a result never double counts.
+    Standings are kept up to date by the same deltas. Raises ValueError for
+    a pairing that is not in the round; returns how many boards changed.
+    The revision is bumped once when that is not 0.
+    """
+    cursor = conn.cursor()
+    stored = {(white_id, black_id): (white_points, black_points)
+              for _, white_id, black_id, white_points, black_points in round_games(conn, round_id)}
+    # A board listed twice counts once, with its last result.
+    results = {(white_id, black_id): (white_id, black_id, white_points, black_points)
+               for white_id, black_id, white_points, black_points in results}.values()
+
+    points = defaultdict(float)
+    wins = defaultdict(int)
+    first_played = []
+    changed = []
+    rated = []
+    for white_id, black_id, white_points, black_points in results:
+        if (white_id, black_id) not in stored:
+            raise ValueError(f"{white_id} - {black_id} is not a pairing of this round")
+        old_white, old_black = stored[(white_id, black_id)]
+        if (old_white, old_black) == (white_points, black_points):
+            continue
+        changed.append((white_points, black_points, round_id, white_id, black_id))
+        points[white_id] += white_points - (old_white or 0)
+        if black_id is None:
+            continue
+        rated.append((white_id, black_id, old_white, old_black, white_points, black_points))
+        points[black_id] += black_points - (old_black or 0)
+        wins[white_id] += (white_points == 1.0) - (old_white == 1.0)
+        wins[black_id] += (black_points == 1.0) - (old_black == 1.0)
+        if old_white is None:
+            first_played.append((white_id, black_id))
+    if not changed:
+        return 0
+    cursor.execute("SELECT RoundNumber FROM Rounds WHERE RoundID = ?", (round_id,))
+    checkpoint_id = checkpoint(cursor, tourney_id, "results", cursor.fetchone()[0])
+    cursor.executemany(
+        """INSERT INTO CheckpointGames (CheckpointID, GameID, WhitePoints, BlackPoints)
+           SELECT ?, GameID, WhitePoints, BlackPoints FROM Games
+           WHERE RoundID = ? AND WhiteID = ? AND BlackID IS ?""",
+        [(checkpoint_id, round_id, white_id, black_id) for _, _, round_id, white_id, black_id in changed],
+    )
+
+    # A game that gets its first result adds each player's points so far to
+    # the other's Buchholz; the points scored from here on are propagated
+    # below together with every other change.
+    cursor.executemany(
+        "UPDATE Standings SET Buchholz = Buchholz + (SELECT Points FROM Standings WHERE PlayerID = ?) WHERE PlayerID = ?",
+        [(black_id, white_id) for white_id, black_id in first_played]
+        + [(white_id, black_id) for white_id, black_id in first_played],
+    )
+    deltas = [(points[pid], wins[pid], pid) for pid in points]
+    cursor.executemany("UPDATE Standings SET Points = Points + ?, Wins = Wins + ? WHERE PlayerID = ?", deltas)
+    cursor.executemany(
+        "UPDATE PlayerPoints SET Points = Points + ? WHERE PlayerID = ?",
+        [(delta, pid) for delta, _, pid in deltas],
+    )
+    cursor.executemany(
+        "UPDATE Games SET WhitePoints = ?, BlackPoints = ? WHERE RoundID = ? AND WhiteID = ? AND BlackID IS ?",
+        changed,
+    )
+    _propagate_buchholz(cursor, tourney_id, [(pid, delta) for delta, _, pid in deltas if delta])
+    _update_rating_stats(cursor, rated)
+
+    _write_results_json(cursor, round_id)
+    bump_revision(cursor, tourney_id)
+    return len(changed)
+
+
+def _write_results_json(cursor, round_id):
+    # The JSON copy lists every board with a result, not just the last batch.
+    cursor.execute(
+        "SELECT WhiteID, BlackID, WhitePoints, BlackPoints FROM Games WHERE RoundID = ? ORDER BY Board",
+        (round_id,),
+    )
+    results_json = json.dumps([
+        {
+            "white_id": white_id,
+            "black_id": black_id,
+            "white_points": white_points,
+            "black_points": black_points,
+        }
+        for white_id, black_id, white_points, black_points in cursor.fetchall()
+        if white_points is not None
+    ])
+    cursor.execute("UPDATE Rounds SET Results = ? WHERE RoundID = ?", (results_json, round_id))
+
+
+@metrics.timed("db.checkpoint")
+def checkpoint(cursor, tourney_id, action, round_number):
+    """Record a restore point for the current state and return its id.
+
+    Called inside the transaction that is about to pair (action "pair") or
+    score ("results") round_number. The totals of every player are copied;
+    save_results adds the old result of each game it changes.
+    """
+    cursor.execute("SELECT COALESCE(MAX(RoundNumber), 0) FROM Rounds WHERE TournamentID = ?", (tourney_id,))
+    last_round = cursor.fetchone()[0]
+    cursor.execute(
+        "INSERT INTO Checkpoints (TournamentID, Action, RoundNumber, LastRound) VALUES (?, ?, ?, ?)",
+        (tourney_id, action, round_number, last_round),
+    )
+    checkpoint_id = cursor.lastrowid
+    cursor.execute("""
+        INSERT INTO CheckpointStandings (CheckpointID, PlayerID, Points, Wins, Buchholz, PlayerPoints)
+        SELECT ?, Standings.PlayerID, Standings.Points, Standings.Wins, Standings.Buchholz, PlayerPoints.Points
+        FROM Standings
+        LEFT JOIN PlayerPoints ON PlayerPoints.PlayerID = Standings.PlayerID
+        WHERE Standings.TournamentID = ?
+    """, (checkpoint_id, tourney_id))
+    return checkpoint_id
+
+
+def checkpoints(conn, tourney_id):
+    """Return (checkpoint_id, label, created) rows, newest first."""
+    cursor = conn.cursor()
+    cursor.execute(
+        """SELECT CheckpointID, Action, RoundNumber, CreatedDate FROM Checkpoints
+           WHERE TournamentID = ? ORDER BY CheckpointID DESC""",
+        (tourney_id,),
+    )
+    return [
+        (checkpoint_id, f"Before {'pairing' if action == 'pair' else 'results of'} round {round_number}", created)
+        for checkpoint_id, action, round_number, created in cursor.fetchall()
+    ]
+
+
+def rollback_to_round(conn, tourney_id, round_number):
+    """Keep rounds up to round_number with their current results.
+
+    Restores the checkpoint taken just before round_number + 1 was paired,
+    then saves the results of the kept rounds again, so one entered or
+    corrected after that pairing is not lost. Returns the checkpoint id;
+    raises ValueError when there is no such checkpoint.
+    """
+    cursor = conn.cursor()
+    cursor.execute(
+        """SELECT MAX(CheckpointID) FROM Checkpoints
+           WHERE TournamentID = ? AND Action = 'pair' AND RoundNumber = ?""",
+        (tourney_id, round_number + 1),
+    )
+    checkpoint_id = cursor.fetchone()[0]
+    if checkpoint_id is None:
+        raise ValueError(f"no checkpoint from before round {round_number + 1} was paired")
+    cursor.execute(
+        """SELECT RoundID, WhiteID, BlackID, WhitePoints, BlackPoints FROM Games
+           WHERE TournamentID = ? AND RoundNumber <= ? AND WhitePoints IS NOT NULL
+           ORDER BY RoundNumber, Board""",
+        (tourney_id, round_number),
+    )
+    results = defaultdict(list)
+    for round_id, white_id, black_id, white_points, black_points in cursor.fetchall():
+        results[round_id].append((white_id, black_id, white_points, black_points))
+    rollback(conn, tourney_id, checkpoint_id)
+    for round_id, round_results in results.items():
+        save_results(conn, tourney_id, round_id, round_results)
+    return checkpoint_id
+
+
+@metrics.timed("db.rollback")
+def rollback(conn, tourney_id, checkpoint_id):
+    """Put a tournament back to the state recorded by a checkpoint.
+
+    Rounds paired since are deleted, games rescored since get their old
+    result back and every player's totals are copied from the checkpoint
+    (rating sums are adjusted by the games undone).
+    The work is proportional to the players and the games changed since,
+    not to the length of the history, and nothing is recomputed. Players
+    registered since are kept with zero points. Later checkpoints are
+    dropped; this one stays so it can be restored again.
+    """
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT LastRound FROM Checkpoints WHERE CheckpointID = ? AND TournamentID = ?",
+        (checkpoint_id, tourney_id),
+    )
+    row = cursor.fetchone()
+    if row is None:
+        raise ValueError(f"no checkpoint {checkpoint_id} for this tournament")
+    last_round = row[0]
+
+    # Rating sums are taken back game by game, like save_results adds them.
+    cursor.execute("""
+        SELECT WhiteID, BlackID, WhitePoints, BlackPoints, NULL, NULL FROM Games
+        WHERE TournamentID = ? AND RoundNumber > ? AND BlackID IS NOT NULL
+    """, (tourney_id, last_round))
+    rated = cursor.fetchall()
+    cursor.execute("DELETE FROM Games WHERE TournamentID = ? AND RoundNumber > ?", (tourney_id, last_round))
+    cursor.execute("DELETE FROM Rounds WHERE TournamentID = ? AND RoundNumber > ?", (tourney_id, last_round))
+
+    # The value a game had at the checkpoint is the old value stored by the
+    # first change made after it.
+    cursor.execute("""
+        SELECT DISTINCT Games.RoundID FROM CheckpointGames
+        JOIN Games ON Games.GameID = CheckpointGames.GameID
+        WHERE CheckpointGames.CheckpointID >= ? AND Games.TournamentID = ?
+    """, (checkpoint_id, tourney_id))
+    rescored_rounds = [r[0] for r in cursor.fetchall()]
+    cursor.execute("""
+        SELECT Games.WhiteID, Games.BlackID, Games.WhitePoints, Games.BlackPoints,
+               CheckpointGames.WhitePoints, CheckpointGames.BlackPoints
+        FROM Games
+        JOIN CheckpointGames ON CheckpointGames.GameID = Games.GameID
+        WHERE Games.TournamentID = ? AND Games.BlackID IS NOT NULL
+          AND CheckpointGames.CheckpointID = (
+              SELECT MIN(CheckpointID) FROM CheckpointGames AS c WHERE c.GameID = Games.GameID AND c.CheckpointID >= ?)
+    """, (tourney_id, checkpoint_id))
+    rated += cursor.fetchall()
+    _update_rating_stats(cursor, rated)
+    cursor.execute("""
+        UPDATE Games SET (WhitePoints, BlackPoints) = (
+            SELECT WhitePoints, BlackPoints FROM CheckpointGames
+            WHERE CheckpointGames.GameID = Games.GameID AND CheckpointGames.CheckpointID >= ?
+            ORDER BY CheckpointGames.CheckpointID LIMIT 1)
+        WHERE TournamentID = ? AND GameID IN (SELECT GameID FROM CheckpointGames WHERE CheckpointID >= ?)
+    """, (checkpoint_id, tourney_id, checkpoint_id))
+    for round_id in rescored_rounds:
+        _write_results_json(cursor, round_id)
+
+    cursor.execute("UPDATE Standings SET Points = 0, Wins = 0, Buchholz = 0 WHERE TournamentID = ?", (tourney_id,))
+    cursor.execute("UPDATE PlayerPoints SET Points = 0 WHERE TournamentID = ?", (tourney_id,))
+    cursor.execute("""
+        UPDATE Standings SET (Points, Wins, Buchholz) = (
+            SELECT Points, Wins, Buchholz FROM CheckpointStandings
+            WHERE CheckpointID = ? AND CheckpointStandings.PlayerID = Standings.PlayerID)
+        WHERE PlayerID IN (SELECT PlayerID FROM CheckpointStandings WHERE CheckpointID = ?)
+    """, (checkpoint_id, checkpoint_id))
+    cursor.execute("""
+        UPDATE PlayerPoints SET Points = (
+            SELECT COALESCE(CheckpointStandings.PlayerPoints, CheckpointStandings.Points) FROM CheckpointStandings
+            WHERE CheckpointID = ? AND CheckpointStandings.PlayerID = PlayerPoints.PlayerID)
+        WHERE PlayerID IN (SELECT PlayerID FROM CheckpointStandings WHERE CheckpointID = ?)
+    """, (checkpoint_id, checkpoint_id))
+
+    cursor.execute("""
+        DELETE FROM CheckpointGames WHERE CheckpointID IN (
+            SELECT CheckpointID FROM Checkpoints WHERE TournamentID = ? AND CheckpointID >= ?)
+    """, (tourney_id, checkpoint_id))
+    cursor.execute("""
+        DELETE FROM CheckpointStandings WHERE CheckpointID IN (
+            SELECT CheckpointID FROM Checkpoints WHERE TournamentID = ? AND CheckpointID > ?)
+    """, (tourney_id, checkpoint_id))
+    cursor.execute("DELETE FROM Checkpoints WHERE TournamentID = ? AND CheckpointID > ?", (tourney_id, checkpoint_id))
+    bump_revision(cursor, tourney_id)
+
+
+@metrics.timed("db.propagate_buchholz")
+def _propagate_buchholz(cursor, tourney_id, deltas):
+    # Every opponent of a player whose score moved sees the same move in
+    # Buchholz. Only the games of the changed players are read.
+    if not deltas:
+        return
+    cursor.execute("CREATE TEMP TABLE IF NOT EXISTS PointDeltas (PlayerID INTEGER PRIMARY KEY, Delta REAL)")
+    cursor.execute("DELETE FROM temp.PointDeltas")
+    cursor.executemany("INSERT INTO temp.PointDeltas (PlayerID, Delta) VALUES (?, ?)", deltas)
+    cursor.execute("""
+        SELECT g.WhiteID, d.Delta FROM temp.PointDeltas AS d
+        JOIN Games AS g ON g.BlackID = d.PlayerID
+        WHERE g.TournamentID = ? AND g.WhitePoints IS NOT NULL
+        UNION ALL
+        SELECT g.BlackID, d.Delta FROM temp.PointDeltas AS d
+        JOIN Games AS g ON g.WhiteID = d.PlayerID
+        WHERE g.TournamentID = ? AND g.BlackID IS NOT NULL AND g.WhitePoints IS NOT NULL
+    """, (tourney_id, tourney_id))
+    buchholz = defaultdict(float)
+    for pid, delta in cursor.fetchall():
+        buchholz[pid] += delta
+    cursor.executemany(
+        "UPDATE Standings SET Buchholz = Buchholz + ? WHERE PlayerID = ?",
+        [(delta, pid) for pid, delta in buchholz.items()],
+    )
+    cursor.execute("DELETE FROM temp.PointDeltas")
+
+
+def _player_ratings(cursor, player_ids):
+    # PlayerID -> Rating for the rated players among player_ids.
+    player_ids = list(player_ids)
+    found = {}
+    for i in range(0, len(player_ids), 500):
+        chunk = player_ids[i:i + 500]
+        cursor.execute(
+            "SELECT PlayerID, Rating FROM Players WHERE Rating IS NOT NULL AND PlayerID IN (%s)" % ",".join("?" * len(chunk)),
+            chunk,
+        )
+        found.update(cursor.fetchall())
+    return found
+
+
+@metrics.timed("db.update_rating_stats")
+def _update_rating_stats(cursor, games):
+    """Apply changed games to RatingStats.
+
+    games are (white_id, black_id, old_white, old_black, new_white,
+    new_black) with None for "no result". Only the players in games are
+    touched.
+    """
+    player_ratings = _player_ratings(cursor, {pid for game in games for pid in game[:2]})
+    sums = defaultdict(lambda: [0, 0.0, 0, 0.0])
+    for white_id, black_id, old_white, old_black, new_white, new_black in games:
+        for player, opponent, old, new in ((white_id, black_id, old_white, new_white),
+                                           (black_id, white_id, old_black, new_black)):
+            opponent_rating = player_ratings.get(opponent)
+            if opponent_rating is None or old == new:
+                continue
+            counted = (new is not None) - (old is not None)
+            delta = sums[player]
+            delta[0] += counted
+            delta[1] += (new or 0.0) - (old or 0.0)
+            delta[2] += counted * opponent_rating
+            if player in player_ratings:
+                delta[3] += counted * ratings.expected_score(player_ratings[player], opponent_rating)
+    if not sums:
+        return
+    cursor.executemany(
+        """UPDATE RatingStats SET Games = Games + ?, Score = Score + ?, OpponentRatings = OpponentRatings + ?,
+                  Expected = Expected + ?
+           WHERE PlayerID = ?""",
+        [(*delta, pid) for pid, delta in sums.items()],
+    )
+    player_ids = list(sums)
+    updates = []
+    for i in range(0, len(player_ids), 500):
+        chunk = player_ids[i:i + 500]
+        cursor.execute(
+            "SELECT PlayerID, Games, Score, OpponentRatings, Expected FROM RatingStats WHERE PlayerID IN (%s)"
+            % ",".join("?" * len(chunk)),
+            chunk,
+        )
+        for pid, count, score, opponent_ratings, expected in cursor.fetchall():
+            updates.append(ratings.derived(player_ratings.get(pid), count, score, opponent_ratings, expected) + (pid,))
+    cursor.executemany(
+        "UPDATE RatingStats SET AverageOpponent = ?, Performance = ?, RatingChange = ? WHERE PlayerID = ?",
+        updates,
+    )
+
+
+def rebuild_rating_stats(cursor, tourney_id):
+    """Recompute one tournament's RatingStats from its games.
+
+    Needed when a rating changes, since every opponent's sums include it.
+    """
+    cursor.execute("DELETE FROM RatingStats WHERE TournamentID = ?", (tourney_id,))
+    cursor.execute(
+        "INSERT INTO RatingStats (PlayerID, TournamentID) SELECT PlayerID, TournamentID FROM Players WHERE TournamentID = ?",
+        (tourney_id,),
+    )
+    cursor.execute("""
+        SELECT WhiteID, BlackID, NULL, NULL, WhitePoints, BlackPoints FROM Games
+        WHERE TournamentID = ? AND BlackID IS NOT NULL AND WhitePoints IS NOT NULL
+    """, (tourney_id,))
+    _update_rating_stats(cursor, cursor.fetchall())
+
+
+def set_rating(conn, player_id, rating):
+    """Change a player's rating (None for unrated)."""
+    cursor = conn.cursor()
+    cursor.execute("SELECT TournamentID FROM Players WHERE PlayerID = ?", (player_id,))
+    row = cursor.fetchone()
+    if row is None:
+        raise ValueError(f"no player {player_id}")
+    cursor.execute("UPDATE Players SET Rating = ? WHERE PlayerID = ?", (rating, player_id))
+    rebuild_rating_stats(cursor, row[0])
+    bump_revision(cursor, row[0])
+
+
+@metrics.timed("db.rebuild_standings")
+def rebuild_standings(cursor, tourney_id=None):
+    """Recompute Standings from PlayerPoints and Games.
+
+    Only needed to initialise the table; save_results keeps it current.
+    Buchholz sums the opponent's points once per game played, so an
+    opponent met twice counts twice (FIDE, and tiebreaks.py); the original
+    standings view counted each distinct opponent once.
+    """
+    where = "" if tourney_id is None else "WHERE TournamentID = %d" % tourney_id
+    cursor.execute("DELETE FROM Standings " + where)
+    cursor.execute("""
+        WITH Played AS (
+            SELECT WhiteID AS PlayerID, BlackID AS OpponentID, WhitePoints AS Score
+            FROM Games
+            WHERE BlackID IS NOT NULL AND WhitePoints IS NOT NULL
+            UNION ALL
+            SELECT BlackID, WhiteID, BlackPoints
+            FROM Games
+            WHERE BlackID IS NOT NULL AND WhitePoints IS NOT NULL
+        ),
+        Totals AS (
+            SELECT Played.PlayerID, SUM(pp.Points) AS Buchholz, SUM(Played.Score = 1.0) AS Wins
+            FROM Played
+            JOIN PlayerPoints AS pp ON pp.PlayerID = Played.OpponentID
+            GROUP BY Played.PlayerID
+        )
+        INSERT INTO Standings (PlayerID, TournamentID, Points, Wins, Buchholz)
+        SELECT PlayerPoints.PlayerID, PlayerPoints.TournamentID, COALESCE(PlayerPoints.Points, 0),
+               COALESCE(Totals.Wins, 0), COALESCE(Totals.Buchholz, 0)
+        FROM PlayerPoints
+        LEFT JOIN Totals ON Totals.PlayerID = PlayerPoints.PlayerID
+    """ + where)
+
+
+@metrics.timed("db.standings")
+def standings(conn, tourney_id):
+    """Return (player_name, points, buchholz, wins) rows, best first."""
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT Players.PlayerName, Standings.Points, Standings.Buchholz, Standings.Wins
+        FROM Standings
+        JOIN Players ON Standings.PlayerID = Players.PlayerID
+        WHERE Standings.TournamentID = ?
+        ORDER BY Standings.Points DESC, Standings.Buchholz DESC, Standings.Wins DESC
+    """, (tourney_id,))
+    return cursor.fetchall()
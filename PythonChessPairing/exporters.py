@@ -0,0 +1,210 @@
+"""Streaming exports: FIDE TRF-16, crosstables, pairing sheets and PGN headers.
+
+Every exporter is a generator of text chunks fed from a single SQLite cursor,
+and export() writes the chunks straight to a file, so even a 10,000 player,
+11 round crosstable is written without building it in memory. From scripts:
+
+    import db, exporters
+    conn = db.connect()
+    exporters.export(conn, 1, "crosstable.csv", "crosstable.csv")
+    exporters.export(conn, 1, "pairings.html", "round3.html", round_number=3)
+"""
+import csv
+import html
+import io
+import os
+
+import metrics
+import reports
+
+
+def _csv_lines(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def _html_lines(title, rows):
+    yield (f"<!DOCTYPE html><html><head><meta charset=\"utf-8\"><title>{html.escape(title)}</title>"
+           "<style>body{font-family:sans-serif}table{border-collapse:collapse}"
+           "td,th{border:1px solid #ccc;padding:2px 8px}</style></head>"
+           f"<body><h1>{html.escape(title)}</h1><table>\n")
+    tag = "th"
+    for row in rows:
+        yield "<tr>" + "".join(f"<{tag}>{html.escape(str(value))}</{tag}>" for value in row) + "</tr>\n"
+        tag = "td"
+    yield "</table></body></html>\n"
+
+
+def tournament_name(conn, tourney_id):
+    row = conn.execute("SELECT TournamentName FROM Tournaments WHERE TournamentID = ?", (tourney_id,)).fetchone()
+    if row is None:
+        raise ValueError(f"no tournament {tourney_id}")
+    return row[0]
+
+
+def crosstable_csv(conn, tourney_id, round_number=None, model=None):
+    return _csv_lines(reports.iter_crosstable(conn, tourney_id, model))
+
+
+def crosstable_html(conn, tourney_id, round_number=None, model=None):
+    title = f"{tournament_name(conn, tourney_id)} - Crosstable"
+    return _html_lines(title, reports.iter_crosstable(conn, tourney_id, model))
+
+
+def _round(conn, tourney_id, round_number):
+    last = reports.last_round_number(conn, tourney_id)
+    if last < 1:
+        raise ValueError("the tournament has no rounds yet")
+    if round_number and not 1 <= round_number <= last:
+        raise ValueError(f"no round {round_number}; the tournament has {last}")
+    return round_number or last
+
+
+def pairings_csv(conn, tourney_id, round_number=None, model=None):
+    return _csv_lines(reports.iter_pairings(conn, tourney_id, _round(conn, tourney_id, round_number)))
+
+
+def pairings_html(conn, tourney_id, round_number=None, model=None):
+    round_number = _round(conn, tourney_id, round_number)
+    title = f"{tournament_name(conn, tourney_id)} - Round {round_number}"
+    return _html_lines(title, reports.iter_pairings(conn, tourney_id, round_number))
+
+
+def ratings_csv(conn, tourney_id, round_number=None, model=None):
+    return _csv_lines(reports.iter_ratings(conn, tourney_id))
+
+
+def ratings_html(conn, tourney_id, round_number=None, model=None):
+    return _html_lines(f"{tournament_name(conn, tourney_id)} - Ratings", reports.iter_ratings(conn, tourney_id))
+
+
+TRF_RESULTS = {1.0: "1", 0.5: "=", 0.0: "0"}
+TRF_BYES = {1.0: "U", 0.5: "H", 0.0: "Z"}
+
+
+def _trf_code(codes, score, player_name, round_number):
+    if score not in codes:
+        raise ValueError(f"{player_name!r} has an unexpected score {score!r} in round {round_number}")
+    return codes[score]
+
+
+def trf(conn, tourney_id, round_number=None, model=None):
+    """FIDE TRF-16 report: 012/062/092 header records and one 001 per player.
+
+    Players are numbered in registration order and ratings go in columns
+    49-52 (blank when unrated). A bye is "U" (pairing-allocated, one point),
+    "H" (half a point) or "Z" (no points); byes and games without a result
+    are left blank. Any other score raises ValueError.
+    """
+    name = tournament_name(conn, tourney_id)
+    reports.load_ranks(conn, tourney_id, model)
+    players = conn.execute("SELECT COUNT(*) FROM temp.ReportRanks").fetchone()[0]
+    yield f"012 {name}\n"
+    yield f"062 {players}\n"
+    yield "092 Individual: Swiss-System\n"
+    for (_, rank, start_no, player_name, points, rating), games in reports.iter_player_games(conn, tourney_id, "StartNo"):
+        rating = f"{rating:4d}" if rating else "    "
+        line = f"001 {start_no:4d}      {player_name[:33]:<33} {rating}                            {points:4.1f} {rank:4d}"
+        blocks = {}
+        for game_round, colour, _, opponent_no, score in games:
+            if colour is None:
+                if score is not None:
+                    blocks[game_round] = f"0000 - {_trf_code(TRF_BYES, score, player_name, game_round)}"
+            elif score is None:
+                blocks[game_round] = f"{opponent_no or 0:4d} {colour}  "
+            else:
+                blocks[game_round] = f"{opponent_no or 0:4d} {colour} {_trf_code(TRF_RESULTS, score, player_name, game_round)}"
+        for r in range(1, max(blocks, default=0) + 1):
+            line += "  " + blocks.get(r, "        ")
+        yield line.rstrip() + "\n"
+
+
+def pgn(conn, tourney_id, round_number=None, model=None):
+    """PGN header blocks for every game with a black player.
+
+    A single round with round_number, else the whole event. Games without
+    a result get "*".
+    """
+    name = _pgn_string(tournament_name(conn, tourney_id))
+    sql = """
+        SELECT g.RoundNumber, g.Board, w.PlayerName, b.PlayerName, g.WhitePoints, g.BlackPoints
+        FROM Games AS g
+        JOIN Players AS w ON w.PlayerID = g.WhiteID
+        JOIN Players AS b ON b.PlayerID = g.BlackID
+        WHERE g.TournamentID = ?
+    """
+    params = [tourney_id]
+    if round_number:
+        sql += " AND g.RoundNumber = ?"
+        params.append(round_number)
+    cursor = conn.cursor()
+    cursor.execute(sql + " ORDER BY g.RoundNumber, g.Board", params)
+    for game_round, board, white, black, white_points, black_points in cursor:
+        if white_points is None:
+            result = "*"
+        elif white_points == black_points:
+            result = "1/2-1/2"
+        else:
+            result = "1-0" if white_points > black_points else "0-1"
+        yield (
+            f'[Event "{name}"]\n[Site "?"]\n[Date "????.??.??"]\n[Round "{game_round}.{board}"]\n'
+            f'[White "{_pgn_string(white)}"]\n[Black "{_pgn_string(black)}"]\n'
+            f'[Result "{result}"]\n\n{result}\n\n'
+        )
+
+
+def _pgn_string(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+# kind -> (generator, file extension, description)
+EXPORTS = {
+    "trf": (trf, ".trf", "FIDE TRF-16 rating report"),
+    "crosstable.csv": (crosstable_csv, ".csv", "Crosstable (CSV)"),
+    "crosstable.html": (crosstable_html, ".html", "Crosstable (HTML)"),
+    "pairings.csv": (pairings_csv, ".csv", "Pairing sheet (CSV)"),
+    "pairings.html": (pairings_html, ".html", "Pairing sheet (HTML)"),
+    "pgn": (pgn, ".pgn", "PGN game headers"),
+    "ratings.csv": (ratings_csv, ".csv", "Rating board (CSV)"),
+    "ratings.html": (ratings_html, ".html", "Rating board (HTML)"),
+}
+
+
+def export(conn, tourney_id, kind, path, round_number=None, model=None):
+    """Write one export to path (or an open text file) and return the number
+    of chunks written.
+
+    round_number selects the round of a pairing sheet (default: the latest)
+    or limits the PGN to one round; the other exports ignore it. Ranks come
+    from model (a model.TournamentModel) when one is given. A path is
+    written as path.part and renamed when complete, so a failed export
+    leaves an existing file as it was.
+    """
+    if kind not in EXPORTS:
+        raise ValueError(f"unknown export {kind!r}; choose from {', '.join(EXPORTS)}")
+    chunks = EXPORTS[kind][0](conn, tourney_id, round_number, model)
+    with metrics.span(f"export.{kind}"):
+        if hasattr(path, "write"):
+            return _write(chunks, path)
+        part = f"{path}.part"
+        try:
+            with open(part, "w", encoding="utf-8", newline="") as file:
+                count = _write(chunks, file)
+            os.replace(part, path)
+        except BaseException:
+            if os.path.exists(part):
+                os.remove(part)
+            raise
+        return count
+
+
+def _write(chunks, file):
+    count = 0
+    for count, chunk in enumerate(chunks, start=1):
+        file.write(chunk)
+    return count
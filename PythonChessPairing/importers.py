@@ -0,0 +1,292 @@
+"""Bulk import of players and round results from CSV and FIDE TRF files.
+
+Files are read lazily and written in chunks with executemany, all inside the
+caller's transaction, so a federation-sized list costs a handful of
+statements instead of two per player. Round results go through
+db.save_results, which only applies what differs from the stored round.
+"""
+import csv
+import os
+import uuid
+from itertools import islice
+
+import db
+
+CHUNK_SIZE = 5000
+
+
+def is_trf(path):
+    return os.path.splitext(path)[1].lower() in (".trf", ".txt")
+
+
+def read_csv_players(file):
+    """Yield player names from the first column of a CSV file."""
+    for row in csv.reader(file):
+        if row and row[0].strip():
+            yield row[0].strip()
+
+
+def read_trf_players(file):
+    """Yield player names from the 001 records of a FIDE TRF-16 file."""
+    for line in file:
+        if line.startswith("001") and line[14:47].strip():
+            yield line[14:47].strip()
+
+
+def read_rated_players(file, path):
+    """Yield (name, rating) pairs; rating is 0 when the file has none.
+
+    CSV ratings come from the second column, TRF ratings from columns 49-52
+    of the 001 records.
+    """
+    if is_trf(path):
+        for line in file:
+            if line.startswith("001") and line[14:47].strip():
+                rating = line[48:52].strip()
+                yield line[14:47].strip(), int(rating) if rating.isdigit() else 0
+    else:
+        for row in csv.reader(file):
+            if row and row[0].strip():
+                rating = row[1].strip() if len(row) > 1 else ""
+                yield row[0].strip(), int(rating) if rating.isdigit() else 0
+
+
+def read_players(file, path):
+    """Pick the reader from the file extension (.trf/.txt are TRF)."""
+    if is_trf(path):
+        return read_trf_players(file)
+    return read_csv_players(file)
+
+
+# TRF-16 result codes -> points; byes and forfeits included.
+TRF_SCORES = {
+    "1": 1.0, "0": 0.0, "=": 0.5, "+": 1.0, "-": 0.0,
+    "W": 1.0, "D": 0.5, "L": 0.0, "H": 0.5, "F": 1.0, "U": 1.0, "Z": 0.0,
+}
+
+
+def parse_score(text):
+    """Points from 0, 1/2 (also ½, = or 0.5) or 1; ValueError for anything else."""
+    text = text.strip()
+    if text in ("1/2", "½", "="):
+        return 0.5
+    points = float(text)
+    if points not in (0.0, 0.5, 1.0):
+        raise ValueError(f"{text!r} is not a score")
+    return points
+
+
+def entered_results(entries):
+    """Turn (white_id, black_id, white_text, black_text) entries into results.
+
+    Boards with both entries blank are left out. A bye (black_id None)
+    only needs the white entry; its black points are 0. Raises ValueError
+    for an entry that is not a score.
+    """
+    results = []
+    for white_id, black_id, white_text, black_text in entries:
+        if not white_text.strip() and not black_text.strip():
+            continue
+        black_points = 0.0 if black_id is None else parse_score(black_text)
+        results.append((white_id, black_id, parse_score(white_text), black_points))
+    return results
+
+
+def read_csv_results(file):
+    """Yield (board, white_points, black_points) from CSV rows.
+
+    A row is either "board,white_points,black_points" or "board,result" with
+    a result such as 1-0, 0-1 or 1/2-1/2. Rows whose board is not a number
+    (headers, comments) are skipped; a numbered row without a readable
+    result raises ValueError naming its line.
+    """
+    reader = csv.reader(file)
+    for row in reader:
+        if not row or not row[0].strip().isdigit():
+            continue
+        board = int(row[0])
+        if len(row) >= 3:
+            scores = row[1:3]
+        elif len(row) == 2:
+            scores = row[1].split("-")
+        else:
+            scores = []
+        if len(scores) != 2:
+            raise ValueError(f"line {reader.line_num}: board {board} has no result")
+        try:
+            white_points, black_points = parse_score(scores[0]), parse_score(scores[1])
+        except ValueError:
+            raise ValueError(f"line {reader.line_num}: board {board} has an unreadable result {','.join(row[1:])!r}") from None
+        yield board, white_points, black_points
+
+
+def read_trf_results(file, round_number):
+    """Yield (name, opponent name or None, colour, points) for one round.
+
+    Uses the round's 10 character block (from column 92) of each 001
+    record; start numbers are resolved to names within the file, so a name
+    used by two records raises ValueError.
+    """
+    entries = []
+    names = {}
+    start = 91 + 10 * (round_number - 1)
+    for line in file:
+        if not line.startswith("001") or not line[14:47].strip():
+            continue
+        if line[14:47].strip() in names.values():
+            raise ValueError(f"{line[14:47].strip()!r} has more than one 001 record")
+        names[line[4:8].strip()] = line[14:47].strip()
+        block = line[start:start + 10].ljust(10)
+        code = block[7].upper()
+        if code in TRF_SCORES:
+            opponent = block[0:4].strip()
+            entries.append((line[14:47].strip(), opponent, block[5].lower(), TRF_SCORES[code]))
+    for name, opponent, colour, points in entries:
+        yield name, names.get(opponent) if opponent not in ("", "0", "0000") else None, colour, points
+
+
+def round_results(conn, tourney_id, round_number, file, path):
+    """Read a file of board results into (white_id, black_id, wp, bp) tuples.
+
+    CSV rows name the board; TRF records are matched to the round's games
+    by player name. Raises ValueError for a board or game that the round
+    does not have, and for a TRF record naming a player whose name is not
+    unique in the tournament.
+    """
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT Board, WhiteID, BlackID FROM Games WHERE TournamentID = ? AND RoundNumber = ?",
+        (tourney_id, round_number),
+    )
+    games = cursor.fetchall()
+    if not games:
+        raise ValueError(f"round {round_number} has not been paired")
+
+    if not is_trf(path):
+        boards = {board: (white_id, black_id) for board, white_id, black_id in games}
+        results = []
+        for board, white_points, black_points in read_csv_results(file):
+            if board not in boards:
+                raise ValueError(f"round {round_number} has no board {board}")
+            results.append(boards[board] + (white_points, black_points))
+        return results
+
+    cursor.execute("SELECT PlayerName, PlayerID FROM Players WHERE TournamentID = ?", (tourney_id,))
+    ids = {}
+    shared = set()
+    for name, player_id in cursor.fetchall():
+        if name in ids:
+            shared.add(name)
+        ids[name] = player_id
+    by_white = {white_id: black_id for _, white_id, black_id in games}
+    paired_with = dict(by_white)
+    paired_with.update((black_id, white_id) for white_id, black_id in by_white.items() if black_id is not None)
+    scores = {}
+    for name, opponent, colour, points in read_trf_results(file, round_number):
+        if name not in ids:
+            raise ValueError(f"{name!r} is not a player of this tournament")
+        for player in (name, opponent):
+            if player in shared:
+                raise ValueError(f"{player!r} is the name of more than one player; enter this round by board instead")
+        if paired_with.get(ids[name], -1) != ids.get(opponent):
+            raise ValueError(f"{name!r} is paired differently in round {round_number}")
+        scores[ids[name]] = points
+    results = []
+    for white_id, black_id in by_white.items():
+        if white_id not in scores:
+            continue
+        if black_id is None:
+            results.append((white_id, None, scores[white_id], 0.0))
+        else:
+            results.append((white_id, black_id, scores[white_id], scores.get(black_id, 1.0 - scores[white_id])))
+    return results
+
+
+def import_round_results(conn, tourney_id, round_number, file, path, model=None):
+    """Apply a round of results from a file; returns (boards read, boards changed).
+
+    A model.TournamentModel passed as model gets the same results.
+    """
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT RoundID FROM Rounds WHERE TournamentID = ? AND RoundNumber = ?",
+        (tourney_id, round_number),
+    )
+    row = cursor.fetchone()
+    if row is None:
+        raise ValueError(f"no round {round_number}")
+    results = round_results(conn, tourney_id, round_number, file, path)
+    changed = db.save_results(conn, tourney_id, row[0], results)
+    if model is not None:
+        model.set_results(conn, round_number, results, changed)
+    return len(results), changed
+
+
+def import_players_iter(conn, tourney_id, names, chunk_size=CHUNK_SIZE):
+    """Import names in chunks, yielding the running count after each chunk.
+
+    names may also be (name, rating) pairs as read_rated_players yields
+    them; a rating of 0 is stored as unrated. Lets a caller such as the Tk
+    event loop do other work between chunks. PlayerPoints, Standings and
+    RatingStats rows are created with one set-based statement each once all
+    players are in. The write lock is held from the start; nothing is
+    committed.
+    """
+    cursor = conn.cursor()
+    # Take the write lock before reading MAX(PlayerID): a player added on
+    # another connection (the GUI while a worker imports) would otherwise
+    # fall into the range seeded below.
+    if not conn.in_transaction:
+        cursor.execute("BEGIN IMMEDIATE")
+    cursor.execute("SELECT COALESCE(MAX(PlayerID), 0) FROM Players")
+    first_new_id = cursor.fetchone()[0] + 1
+    cursor.execute("SELECT PlayerUUID FROM Players")
+    taken = {row[0] for row in cursor.fetchall()}
+
+    names = iter(names)
+    count = 0
+    while True:
+        chunk = list(islice(names, chunk_size))
+        if not chunk:
+            break
+        rows = []
+        for player in chunk:
+            name, rating = (player, None) if isinstance(player, str) else player
+            rows.append((_new_uuid(taken), name, tourney_id, rating or None))
+        cursor.executemany("INSERT INTO Players (PlayerUUID, PlayerName, TournamentID, Rating) VALUES (?, ?, ?, ?)", rows)
+        count += len(chunk)
+        yield count
+
+    cursor.execute(
+        """INSERT INTO PlayerPoints (PlayerID, TournamentID)
+           SELECT PlayerID, TournamentID FROM Players WHERE PlayerID >= ? AND TournamentID = ?""",
+        (first_new_id, tourney_id),
+    )
+    cursor.execute(
+        """INSERT INTO Standings (PlayerID, TournamentID)
+           SELECT PlayerID, TournamentID FROM Players WHERE PlayerID >= ? AND TournamentID = ?""",
+        (first_new_id, tourney_id),
+    )
+    cursor.execute(
+        """INSERT INTO RatingStats (PlayerID, TournamentID)
+           SELECT PlayerID, TournamentID FROM Players WHERE PlayerID >= ? AND TournamentID = ?""",
+        (first_new_id, tourney_id),
+    )
+    db.bump_revision(cursor, tourney_id)
+
+
+def import_players(conn, tourney_id, names, chunk_size=CHUNK_SIZE):
+    """Import names and return how many players were added."""
+    count = 0
+    for count in import_players_iter(conn, tourney_id, names, chunk_size):
+        pass
+    return count
+
+
+def _new_uuid(taken):
+    # Short ids collide quickly at this volume; retry until unused.
+    while True:
+        player_uuid = uuid.uuid4().hex[:8]
+        if player_uuid not in taken:
+            taken.add(player_uuid)
+            return player_uuid
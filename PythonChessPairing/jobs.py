@@ -0,0 +1,112 @@
+"""Background execution of database and pairing work.
+
+Jobs run one at a time on a worker thread that owns its own sqlite
+connection, so nothing slow ever runs on the Tk thread and no connection is
+shared between threads. Results, errors and progress are handed back to the
+Tk thread through a queue that is polled with root.after.
+"""
+import queue
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+POLL_MS = 50
+
+
+class Cancelled(Exception):
+    pass
+
+
+class Job(object):
+    def __init__(self, runner, on_progress=None):
+        self._runner = runner
+        self._on_progress = on_progress
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def check(self):
+        """Raise Cancelled if cancel() was called; call between steps."""
+        if self._cancel.is_set():
+            raise Cancelled()
+
+    def progress(self, done, total=None, text=""):
+        """Report progress from the worker; delivered on the Tk thread."""
+        if self._on_progress is not None:
+            self._runner._post(self._on_progress, done, total, text)
+
+
+class JobRunner(object):
+    """Run fn(conn, job, *args) off the Tk thread.
+
+    The worker commits when fn returns and rolls back when it raises, so a
+    cancelled or failed job leaves the database untouched. on_done(result)
+    or on_error(exception) is then called on the Tk thread.
+    """
+
+    def __init__(self, root, db_path):
+        self.root = root
+        self.db_path = db_path
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chess-worker")
+        self._local = threading.local()
+        self._results = queue.Queue()
+        self._pending = 0
+
+    def submit(self, fn, *args, on_done=None, on_error=None, on_progress=None, name=None):
+        """Queue fn; name labels the job in the metrics file (default fn's name)."""
+        job = Job(self, on_progress)
+        self._pending += 1
+        self._executor.submit(self._run, job, fn, args, on_done, on_error, name or fn.__name__)
+        if self._pending == 1:
+            self.root.after(POLL_MS, self._poll)
+        return job
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = metrics.instrument(sqlite3.connect(self.db_path, timeout=30))
+        return conn
+
+    def _run(self, job, fn, args, on_done, on_error, name):
+        conn = self._connection()
+        try:
+            with metrics.action(name):
+                job.check()
+                result = fn(conn, job, *args)
+                with metrics.span("db.commit"):
+                    conn.commit()
+        except Exception as e:
+            conn.rollback()
+            self._results.put((self._finish, (on_error, e)))
+        else:
+            self._results.put((self._finish, (on_done, result)))
+
+    def _finish(self, callback, value):
+        self._pending -= 1
+        if callback is not None:
+            callback(value)
+
+    def _post(self, callback, *args):
+        self._results.put((callback, args))
+
+    def _poll(self):
+        try:
+            while True:
+                try:
+                    callback, args = self._results.get_nowait()
+                except queue.Empty:
+                    break
+                callback(*args)
+        finally:
+            if self._pending or not self._results.empty():
+                self.root.after(POLL_MS, self._poll)
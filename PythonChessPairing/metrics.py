@@ -0,0 +1,311 @@
+"""Timing spans, query counters and optional cProfile capture per action.
+
+An action is one thing a user or script asked for (Generate Round, a
+standings refresh, a CLI command). Inside it, span() blocks add up time per
+name: db.* around database helpers, pairing.* around the pairing phases and
+ui.* around list refreshes. Every SQL statement run on an instrumented
+connection counts towards the action of the thread that ran it, as SQLite
+traces it: an executemany counts once per row, so "queries" is the number
+of statement executions rather than of calls into sqlite3. When the action
+ends one JSON line is appended to a rotating metrics file:
+
+    {"ts": "...", "action": "Generating round", "seconds": 0.41, "queries": 9,
+     "spans": {"pairing.match": {"count": 12, "seconds": 0.3}, ...}}
+
+With profiling switched on (CHESS_PROFILE=1 or --profile) each action also
+runs under cProfile; the .prof file is kept next to the metrics file and the
+hottest functions go into the line. Spans outside an action cost one
+thread-local lookup and record nothing.
+
+    python metrics.py                       # summary of chess_metrics.jsonl
+    python metrics.py --action "Generating round"
+    python metrics.py --prometheus > chess.prom
+"""
+import datetime
+import functools
+import io
+import json
+import os
+import sys
+import threading
+import time
+
+# logging, cProfile, pstats, argparse and statistics are imported where they
+# are used: db imports this module, and a CLI command that records nothing
+# should not pay for them.
+
+METRICS_FILE = "chess_metrics.jsonl"
+MAX_BYTES = 5 * 1024 * 1024
+BACKUP_COUNT = 3
+HOT_FUNCTIONS = 15
+
+_local = threading.local()
+_logger = None
+_profile = False
+_profile_dir = None
+# Only one cProfile can run in a process at a time.
+_profile_lock = threading.Lock()
+
+
+def configure(path=METRICS_FILE, profile=None):
+    """Write actions to path (None switches recording off).
+
+    profile defaults to the CHESS_PROFILE environment variable.
+    """
+    global _logger, _profile, _profile_dir
+    import logging.handlers
+
+    if _logger is None:
+        _logger = logging.getLogger("chess.metrics")
+        _logger.propagate = False
+        _logger.setLevel(logging.INFO)
+    for handler in list(_logger.handlers):
+        _logger.removeHandler(handler)
+        handler.close()
+    if profile is None:
+        profile = os.environ.get("CHESS_PROFILE", "") not in ("", "0")
+    _profile = profile
+    if path is None:
+        return
+    handler = logging.handlers.RotatingFileHandler(path, maxBytes=MAX_BYTES, backupCount=BACKUP_COUNT, encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    _logger.addHandler(handler)
+    _profile_dir = os.path.join(os.path.dirname(os.path.abspath(path)), "profiles")
+
+
+def enabled():
+    return _logger is not None and bool(_logger.handlers)
+
+
+def instrument(conn):
+    """Count every statement run on conn towards the current action.
+
+    The count comes from SQLite's trace callback, which fires once per
+    execution: each row of an executemany is one more.
+    """
+    conn.set_trace_callback(_count_query)
+    return conn
+
+
+def _count_query(statement):
+    record = getattr(_local, "action", None)
+    if record is not None:
+        record.queries += 1
+
+
+class span(object):
+    """Add the time spent in the block to the current action under name."""
+
+    __slots__ = ("name", "record", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.record = getattr(_local, "action", None)
+        if self.record is not None:
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.record is not None:
+            entry = self.record.spans.get(self.name)
+            if entry is None:
+                entry = self.record.spans[self.name] = [0, 0.0]
+            entry[0] += 1
+            entry[1] += time.perf_counter() - self.start
+        return False
+
+
+def timed(name):
+    """Decorator form of span()."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class _Record(object):
+    __slots__ = ("name", "spans", "queries")
+
+    def __init__(self, name):
+        self.name = name
+        self.spans = {}
+        self.queries = 0
+
+
+class action(object):
+    """Measure one user-level action and write it out when it ends.
+
+    Nested inside another action on the same thread it is just a span.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.record = None
+        self.inner = None
+        self.profiler = None
+
+    def __enter__(self):
+        if not enabled():
+            return self
+        if getattr(_local, "action", None) is not None:
+            self.inner = span(self.name)
+            self.inner.__enter__()
+            return self
+        self.record = _local.action = _Record(self.name)
+        if _profile and _profile_lock.acquire(blocking=False):
+            import cProfile
+
+            self.profiler = cProfile.Profile()
+            try:
+                self.profiler.enable()
+            except ValueError:
+                # Another profiler (a debugger, say) is already active.
+                self.profiler = None
+                _profile_lock.release()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.inner is not None:
+            return self.inner.__exit__(exc_type, exc, tb)
+        if self.record is None:
+            return False
+        seconds = time.perf_counter() - self.start
+        _local.action = None
+        line = {
+            "ts": datetime.datetime.now().isoformat(timespec="milliseconds"),
+            "action": self.name,
+            "seconds": round(seconds, 6),
+            "queries": self.record.queries,
+            "thread": threading.current_thread().name,
+            "spans": {
+                name: {"count": count, "seconds": round(total, 6)}
+                for name, (count, total) in sorted(self.record.spans.items(), key=lambda item: -item[1][1])
+            },
+        }
+        if exc_type is not None:
+            line["error"] = exc_type.__name__
+        if self.profiler is not None:
+            self.profiler.disable()
+            _profile_lock.release()
+            line.update(self._save_profile())
+        _logger.info(json.dumps(line))
+        return False
+
+    def _save_profile(self):
+        import pstats
+
+        os.makedirs(_profile_dir, exist_ok=True)
+        stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        safe = "".join(c if c.isalnum() else "_" for c in self.name)
+        path = os.path.join(_profile_dir, f"{stamp}-{safe}.prof")
+        self.profiler.dump_stats(path)
+        stats = pstats.Stats(self.profiler, stream=io.StringIO())
+        hot = sorted(stats.stats.items(), key=lambda item: -item[1][3])[:HOT_FUNCTIONS]
+        return {
+            "profile": path,
+            "hot": [[f"{os.path.basename(file)}:{line}({name})", round(cumulative, 6)]
+                    for (file, line, name), (_, _, _, cumulative, _) in hot],
+        }
+
+
+def load(path=METRICS_FILE):
+    """Yield the recorded actions from path and its rotated backups, oldest first."""
+    for name in [f"{path}.{i}" for i in range(BACKUP_COUNT, 0, -1)] + [path]:
+        if not os.path.exists(name):
+            continue
+        with open(name, encoding="utf-8") as file:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def summarize(records):
+    """Group records by action: durations, queries and span totals."""
+    actions = {}
+    for record in records:
+        entry = actions.setdefault(record["action"], {"seconds": [], "queries": [], "spans": {}, "errors": 0})
+        entry["seconds"].append(record["seconds"])
+        entry["queries"].append(record["queries"])
+        entry["errors"] += "error" in record
+        for name, value in record.get("spans", {}).items():
+            total = entry["spans"].setdefault(name, [0, 0.0])
+            total[0] += value["count"]
+            total[1] += value["seconds"]
+    return actions
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def report(actions, out, top=5):
+    import statistics
+
+    out.write(f"{'action':<32}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}{'queries':>9}{'errors':>8}\n")
+    ordered = sorted(actions.items(), key=lambda item: -sum(item[1]["seconds"]))
+    for name, entry in ordered:
+        seconds = entry["seconds"]
+        out.write(f"{name[:31]:<32}{len(seconds):>7}{_percentile(seconds, 0.5) * 1000:>10.1f}"
+                  f"{_percentile(seconds, 0.95) * 1000:>10.1f}{max(seconds) * 1000:>10.1f}"
+                  f"{statistics.mean(entry['queries']):>9.0f}{entry['errors']:>8}\n")
+    out.write("\nWhere the time goes (share of each action's total):\n")
+    for name, entry in ordered:
+        total = sum(entry["seconds"])
+        spans = sorted(entry["spans"].items(), key=lambda item: -item[1][1])[:top]
+        if not spans:
+            continue
+        out.write(f"  {name}\n")
+        for span_name, (count, seconds) in spans:
+            share = seconds / total * 100 if total else 0.0
+            out.write(f"    {span_name:<34}{seconds * 1000:>10.1f} ms{share:>7.1f}%  x{count}\n")
+
+
+def prometheus(actions, out):
+    """Write the summary in the Prometheus text exposition format."""
+    def label(value):
+        return value.replace("\\", "\\\\").replace('"', '\\"')
+
+    out.write("# TYPE chess_action_seconds summary\n")
+    for name, entry in actions.items():
+        for q in (0.5, 0.95):
+            out.write(f'chess_action_seconds{{action="{label(name)}",quantile="{q}"}} {_percentile(entry["seconds"], q)}\n')
+        out.write(f'chess_action_seconds_sum{{action="{label(name)}"}} {sum(entry["seconds"])}\n')
+        out.write(f'chess_action_seconds_count{{action="{label(name)}"}} {len(entry["seconds"])}\n')
+    out.write("# TYPE chess_action_queries_total counter\n")
+    for name, entry in actions.items():
+        out.write(f'chess_action_queries_total{{action="{label(name)}"}} {sum(entry["queries"])}\n')
+    out.write("# TYPE chess_span_seconds_total counter\n")
+    for name, entry in actions.items():
+        for span_name, (_, seconds) in entry["spans"].items():
+            out.write(f'chess_span_seconds_total{{action="{label(name)}",span="{label(span_name)}"}} {seconds}\n')
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Summarize the recorded action timings")
+    parser.add_argument("file", nargs="?", default=METRICS_FILE)
+    parser.add_argument("--action", help="only this action")
+    parser.add_argument("--top", type=int, default=5, help="spans shown per action")
+    parser.add_argument("--prometheus", action="store_true", help="print Prometheus text format instead")
+    args = parser.parse_args(argv)
+
+    records = (r for r in load(args.file) if args.action is None or r["action"] == args.action)
+    actions = summarize(records)
+    if not actions:
+        raise SystemExit(f"no recorded actions in {args.file}")
+    if args.prometheus:
+        prometheus(actions, sys.stdout)
+    else:
+        report(actions, sys.stdout, args.top)
+
+
+if __name__ == "__main__":
+    main()
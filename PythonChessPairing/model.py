@@ -0,0 +1,282 @@
+"""In-memory model of one tournament, shared by pairing, tiebreaks and exports.
+
+The model is loaded with two queries and then kept current by the code that
+writes: add_round(), set_results() and load_new_players() apply the change
+the database has just received instead of reading it back. Players are
+__slots__ records; everything per round lives in NumPy columns (rounds x
+players) for opponents, scores and colours, grown by doubling, so a
+2,000 player event stays a few hundred kilobytes no matter how often it is
+paired or ranked.
+
+    model = TournamentModel(tourney_id)
+    states = model.sync(conn).player_states()       # for pair_round
+    tiebreaks.standings(conn, tourney_id, model=model)
+
+sync() compares Tournaments.Revision with the revision the model last saw
+and reloads only when something else wrote in between (the CLI, another
+window, a rollback). Every method takes the model's lock, so the worker
+thread can update it while the Tk thread reads.
+"""
+import threading
+
+import numpy as np
+
+import db
+import metrics
+from pairing import PlayerState
+from tiebreaks import TournamentMatrix
+
+NOT_PAIRED = -1
+BYE = -2
+WHITE, BLACK = 1, -1
+
+
+class PlayerRecord(object):
+    __slots__ = ("player_id", "uuid", "name", "rating", "index")
+
+    def __init__(self, player_id, uuid, name, rating, index):
+        self.player_id = player_id
+        self.uuid = uuid
+        self.name = name
+        self.rating = rating
+        self.index = index
+
+    def __repr__(self):
+        return "PlayerRecord(%r, %r)" % (self.player_id, self.name)
+
+
+class TournamentModel(object):
+    """Players and games of one tournament, indexed by column.
+
+    Column i is the i-th player by PlayerID. opponents[r, i] is the column
+    of i's opponent in round r+1, BYE or NOT_PAIRED; scores[r, i] is NaN
+    until a result is in.
+    """
+
+    def __init__(self, tourney_id):
+        self.tourney_id = tourney_id
+        self.lock = threading.RLock()
+        self.revision = None
+        self._reset(0, 0)
+
+    @classmethod
+    def load(cls, conn, tourney_id):
+        model = cls(tourney_id)
+        model.reload(conn)
+        return model
+
+    def _reset(self, players, rounds):
+        self.players = []
+        self._by_id = {}
+        self.rounds = 0
+        self._player_ids = np.zeros(max(players, 16), dtype=np.int64)
+        self._points = np.zeros(max(players, 16))
+        shape = (max(rounds, 4), max(players, 16))
+        self._opponents = np.full(shape, NOT_PAIRED, dtype=np.int32)
+        self._scores = np.full(shape, np.nan)
+        self._colours = np.zeros(shape, dtype=np.int8)
+
+    def _reserve(self, players, rounds):
+        # Grow the columns by doubling; existing cells keep their values.
+        old_rounds, old_players = self._opponents.shape
+        if players <= old_players and rounds <= old_rounds:
+            return
+        new_rounds = max(rounds, old_rounds * 2 if rounds > old_rounds else old_rounds)
+        new_players = max(players, old_players * 2 if players > old_players else old_players)
+        for name, fill in (("_opponents", NOT_PAIRED), ("_scores", np.nan), ("_colours", 0)):
+            old = getattr(self, name)
+            grown = np.full((new_rounds, new_players), fill, dtype=old.dtype)
+            grown[:old_rounds, :old_players] = old
+            setattr(self, name, grown)
+        if new_players > old_players:
+            self._player_ids = np.concatenate([self._player_ids, np.zeros(new_players - old_players, dtype=np.int64)])
+            self._points = np.concatenate([self._points, np.zeros(new_players - old_players)])
+
+    # Views of the filled part of each column.
+    @property
+    def player_ids(self):
+        return self._player_ids[:len(self.players)]
+
+    @property
+    def points(self):
+        return self._points[:len(self.players)]
+
+    @property
+    def opponents(self):
+        return self._opponents[:self.rounds, :len(self.players)]
+
+    @property
+    def scores(self):
+        return self._scores[:self.rounds, :len(self.players)]
+
+    @property
+    def colours(self):
+        return self._colours[:self.rounds, :len(self.players)]
+
+    def __len__(self):
+        return len(self.players)
+
+    def get(self, player_id):
+        return self._by_id.get(player_id)
+
+    def name(self, player_id, default="Bye"):
+        """Player name, or default for a bye (None) or an unknown id."""
+        player = self._by_id.get(player_id)
+        return player.name if player else default
+
+    @metrics.timed("model.load")
+    def reload(self, conn):
+        with self.lock:
+            cursor = conn.cursor()
+            revision = db.revision(conn, self.tourney_id)
+            cursor.execute(
+                "SELECT PlayerID, PlayerUUID, PlayerName, Rating FROM Players WHERE TournamentID = ? ORDER BY PlayerID",
+                (self.tourney_id,),
+            )
+            players = cursor.fetchall()
+            cursor.execute(
+                """SELECT RoundNumber, WhiteID, BlackID, WhitePoints, BlackPoints
+                   FROM Games WHERE TournamentID = ? ORDER BY RoundNumber, Board""",
+                (self.tourney_id,),
+            )
+            games = cursor.fetchall()
+            rounds = games[-1][0] if games else 0
+            self._reset(len(players), rounds)
+            self._add_players(players)
+            self.rounds = rounds
+            self._set_games(games)
+            self.points[:] = np.nansum(self.scores, axis=0)
+            self.revision = revision
+        return self
+
+    def sync(self, conn):
+        """Reload if the database has changed behind the model's back."""
+        with self.lock:
+            if self.revision is None or db.revision(conn, self.tourney_id) != self.revision:
+                self.reload(conn)
+        return self
+
+    def _advance(self, conn, bumps):
+        # The write being applied bumped the revision exactly bumps times;
+        # any other value means a writer we have not seen, so reload on the
+        # next sync().
+        revision = db.revision(conn, self.tourney_id)
+        if self.revision is not None and revision == self.revision + bumps:
+            self.revision = revision
+        else:
+            self.revision = None
+
+    def _add_players(self, rows):
+        rows = list(rows)
+        self._reserve(len(self.players) + len(rows), self.rounds)
+        for player_id, uuid, name, rating in rows:
+            if self.players and player_id <= self.players[-1].player_id:
+                raise ValueError("players must be added in PlayerID order")
+            index = len(self.players)
+            record = PlayerRecord(player_id, uuid, name, rating, index)
+            self.players.append(record)
+            self._by_id[player_id] = record
+            self._player_ids[index] = player_id
+
+    def _set_games(self, games):
+        for round_number, white_id, black_id, white_points, black_points in games:
+            r = round_number - 1
+            white = self._by_id[white_id].index
+            if black_id is None:
+                self._opponents[r, white] = BYE
+                if white_points is not None:
+                    self._scores[r, white] = white_points
+                continue
+            black = self._by_id[black_id].index
+            self._opponents[r, white] = black
+            self._opponents[r, black] = white
+            self._colours[r, white] = WHITE
+            self._colours[r, black] = BLACK
+            if white_points is not None:
+                self._scores[r, white] = white_points
+                self._scores[r, black] = black_points
+
+    def load_new_players(self, conn):
+        """Add the players just stored with one db.add_player() or import."""
+        with self.lock:
+            if self.revision is None:
+                return
+            last = self.players[-1].player_id if self.players else 0
+            cursor = conn.cursor()
+            cursor.execute(
+                """SELECT PlayerID, PlayerUUID, PlayerName, Rating FROM Players
+                   WHERE TournamentID = ? AND PlayerID > ? ORDER BY PlayerID""",
+                (self.tourney_id, last),
+            )
+            self._add_players(cursor.fetchall())
+            self._advance(conn, 1)
+
+    def add_round(self, conn, round_number, pairings):
+        """Apply a round just stored with db.insert_round()."""
+        with self.lock:
+            if self.revision is None or round_number != self.rounds + 1:
+                self.revision = None
+                return
+            self._reserve(len(self.players), round_number)
+            self.rounds = round_number
+            self._set_games([(round_number, white_id, black_id, None, None) for white_id, black_id in pairings])
+            self._advance(conn, 1)
+
+    def set_results(self, conn, round_number, results, changed):
+        """Apply (white_id, black_id, white_points, black_points) tuples just
+        stored with db.save_results(); changed is what it returned."""
+        with self.lock:
+            if self.revision is None or not 1 <= round_number <= self.rounds:
+                self.revision = None
+                return
+            r = round_number - 1
+            for white_id, black_id, white_points, black_points in results:
+                white = self._by_id[white_id].index
+                cells = [(white, white_points)]
+                if black_id is not None:
+                    cells.append((self._by_id[black_id].index, black_points))
+                expected = BYE if black_id is None else cells[1][0]
+                if self._opponents[r, white] != expected:
+                    self.revision = None
+                    return
+                for i, value in cells:
+                    old = self._scores[r, i]
+                    self._points[i] += (value or 0.0) - (0.0 if np.isnan(old) else old)
+                    self._scores[r, i] = np.nan if value is None else value
+            self._advance(conn, 1 if changed else 0)
+
+    def player_states(self):
+        """PlayerState objects for pair_round()."""
+        with self.lock:
+            # One conversion to lists per column beats numpy calls per player.
+            opponents = self.opponents.T.tolist()
+            colours = self.colours.T.tolist()
+            ids = self.player_ids.tolist()
+            points = self.points.tolist()
+            states = []
+            for i, player in enumerate(self.players):
+                played = [(o, c) for o, c in zip(opponents[i], colours[i]) if o >= 0]
+                states.append(PlayerState(
+                    player.player_id,
+                    points[i],
+                    player.rating,
+                    opponents=[ids[o] for o, _ in played],
+                    colours="".join("W" if c == WHITE else "B" for _, c in played),
+                    had_bye=BYE in opponents[i],
+                ))
+            return states
+
+    def matrix(self):
+        """TournamentMatrix of the rounds with at least one result."""
+        with self.lock:
+            scores = self.scores
+            known = ~np.isnan(scores)
+            rounds = known.any(axis=1)
+            opponents = np.where(known & (self.opponents >= 0), self.opponents, -1)[rounds]
+            return TournamentMatrix.from_arrays(
+                self.player_ids.copy(), np.flatnonzero(rounds) + 1, opponents.astype(np.int64),
+                np.nan_to_num(scores[rounds]))
+
+    def names(self):
+        with self.lock:
+            return {player.player_id: player.name for player in self.players}
@@ -0,0 +1,636 @@
+"""Swiss pairing engine.
+
+Pure functions only: player states go in, pairings come out. Nothing in here
+touches sqlite or tkinter, so the same code is used by the GUI, scripts and
+batch jobs; metrics spans only time the phases.
+
+Players are split into score brackets (large brackets are cut into blocks so
+that the matching stays small) and every block is paired with a maximum
+weight matching. Rematches and pairs of players who both need the same
+colour (an absolute preference) are forbidden edges; mild colour clashes
+and deviations from the Dutch top-half vs bottom-half ideal only lower the
+weight of an edge.
+
+When the players left at the bottom cannot be paired that way, the lowest
+pairs are undone and paired again together with them as one group, twice
+as many pairs each time, until a legal pairing is found. Only when the
+whole field has none are colour clashes, and after that rematches, allowed
+at a penalty.
+"""
+import metrics
+
+MAX_BLOCK = 40
+# Outside the last block a player is only offered partners whose distance
+# from the ideal S1/S2 partner is at most this many places.
+WINDOW = 8
+
+# Edge weight components, largest first.
+REMATCH_PENALTY = 10 ** 12
+SCORE_PENALTY = 10 ** 6
+FLOAT_BONUS = 100000
+COLOUR_PENALTY = {3: 5000, 2: 500, 1: 50}
+
+# How much an edge may break, from the normal pairing to the last resort.
+STRICT, COLOUR_CLASH, REMATCH = 0, 1, 2
+
+
+class PlayerState(object):
+    __slots__ = ("player_id", "points", "rating", "opponents", "colours", "had_bye")
+
+    def __init__(self, player_id, points=0.0, rating=0, opponents=(), colours="", had_bye=False):
+        self.player_id = player_id
+        self.points = points
+        self.rating = rating or 0
+        self.opponents = frozenset(opponents)
+        # One "W"/"B" per game actually played, oldest first.
+        self.colours = colours
+        self.had_bye = had_bye
+
+    def __repr__(self):
+        return "PlayerState(%r, points=%r)" % (self.player_id, self.points)
+
+
+def colour_preference(colours):
+    """Return (strength, colour) for a colour history.
+
+    strength is 3 for absolute, 2 for strong, 1 for mild and 0 for none.
+    """
+    if not colours:
+        return 0, None
+    diff = colours.count("W") - colours.count("B")
+    if diff < -1 or colours[-2:] == "BB":
+        return 3, "W"
+    if diff > 1 or colours[-2:] == "WW":
+        return 3, "B"
+    if diff == -1:
+        return 2, "W"
+    if diff == 1:
+        return 2, "B"
+    return 1, "B" if colours[-1] == "W" else "W"
+
+
+def pair_round(players, max_block=MAX_BLOCK):
+    """Pair one Swiss round.
+
+    players is an iterable of PlayerState. Returns a list of
+    (white_id, black_id) tuples in board order; a bye is (player_id, None)
+    and always comes last.
+    """
+    with metrics.span("pairing.rank"):
+        ranked = sorted(players, key=lambda p: (-p.points, -p.rating, p.player_id))
+        if len(ranked) < 2:
+            return [(p.player_id, None) for p in ranked]
+
+        bye = None
+        if len(ranked) % 2:
+            bye = next((p for p in reversed(ranked) if not p.had_bye), ranked[-1])
+            ranked.remove(bye)
+
+        rank = {p.player_id: i for i, p in enumerate(ranked)}
+        brackets = _score_brackets(ranked)
+
+    pairs = []
+    floaters = []
+    with metrics.span("pairing.match"):
+        for b, bracket in enumerate(brackets):
+            last_bracket = b == len(brackets) - 1
+            blocks = _split_bracket(floaters + bracket, max_block)
+            floaters = []
+            for i, block in enumerate(blocks):
+                last = last_bracket and i == len(blocks) - 1
+                block_pairs, floaters = _pair_block(floaters + block, last)
+                pairs.extend(block_pairs)
+
+    if floaters:
+        with metrics.span("pairing.backtrack"):
+            pairs = _backtrack(rank, pairs, floaters)
+
+    with metrics.span("pairing.colours"):
+        pairs.sort(key=lambda pair: _board_key(pair, rank))
+        pairings = [_allocate_colours(a, b, board) for board, (a, b) in enumerate(pairs)]
+        pairings = [(w.player_id, b.player_id) for w, b in pairings]
+    if bye is not None:
+        pairings.append((bye.player_id, None))
+    return pairings
+
+
+def _score_brackets(ranked):
+    brackets = []
+    for p in ranked:
+        if brackets and brackets[-1][-1].points == p.points:
+            brackets[-1].append(p)
+        else:
+            brackets.append([p])
+    return brackets
+
+
+def _split_bracket(players, max_block):
+    # Cut a large bracket into blocks that keep the Dutch S1/S2 split: block k
+    # holds the k-th slice of the top half together with the k-th slice of
+    # the bottom half, so 1 still meets n/2 + 1 and so on.
+    if len(players) <= max_block:
+        return [players]
+    half = len(players) // 2
+    s1, s2 = players[:half], players[half:]
+    step = max_block // 2
+    blocks = []
+    for start in range(0, half, step):
+        end = start + step
+        if end >= half:
+            blocks.append(s1[start:] + s2[start:])
+            break
+        blocks.append(s1[start:end] + s2[start:end])
+    return blocks
+
+
+def _pair_block(block, last):
+    n = len(block)
+    if n < 2:
+        return [], block
+    half = n // 2
+    prefs = [colour_preference(p.colours) for p in block]
+
+    # The Dutch ideal, S1[i] against S2[i], cannot be beaten when it has no
+    # rematch and no colour clash.
+    if all(_edge_penalty(block, prefs, i, i + half, half, STRICT) == 0 for i in range(half)):
+        return [(block[i], block[i + half]) for i in range(half)], block[2 * half:]
+
+    window = n if last else WINDOW
+    mate = _match_block(block, prefs, window, False)
+    unpaired = [i for i in range(n) if mate[i] == -1]
+    if unpaired != list(range(n - len(unpaired), n)):
+        # Somebody other than the lowest ranked players would float down;
+        # pay for the rank bonus so that the right players are left over.
+        mate = _match_block(block, prefs, window, True)
+        unpaired = [i for i in range(n) if mate[i] == -1]
+    pairs = [(block[i], block[j]) for i, j in enumerate(mate) if i < j]
+    return pairs, [block[i] for i in unpaired]
+
+
+def _backtrack(rank, pairs, leftover):
+    # leftover could not be paired at the bottom. Undo the last 1, 2, 4, ...
+    # pairs made and pair those players together with leftover, so that
+    # players are pulled up from as low in the field as possible.
+    for relax in (STRICT, COLOUR_CLASH):
+        undo = 1
+        while True:
+            undo = min(undo, len(pairs))
+            kept = len(pairs) - undo
+            group = leftover + [p for pair in pairs[kept:] for p in pair]
+            group.sort(key=lambda p: rank[p.player_id])
+            found = _pair_group(group, relax)
+            if found is not None:
+                return pairs[:kept] + found
+            if kept == 0:
+                break
+            undo *= 2
+    # No pairing of the whole field avoids a rematch; take them among the
+    # players left at the bottom.
+    return pairs + _pair_group(leftover, REMATCH)
+
+
+def _pair_group(group, relax):
+    # Pair every player of group, or return None when the allowed edges do
+    # not cover all of them. Pairing within a score group beats everything
+    # but a forbidden edge.
+    n = len(group)
+    half = n // 2
+    prefs = [colour_preference(p.colours) for p in group]
+    edges = []
+    for i in range(n):
+        for j in range(i + 1, n):
+            penalty = _edge_penalty(group, prefs, i, j, half, relax)
+            if penalty is None:
+                continue
+            gap = int(round(2 * abs(group[i].points - group[j].points)))
+            edges.append((i, j, 2 * REMATCH_PENALTY - penalty - SCORE_PENALTY * gap * gap))
+    mate = max_weight_matching(edges, maxcardinality=True)
+    mate = mate + (n - len(mate)) * [-1]
+    if -1 in mate:
+        return None
+    return [(group[i], group[j]) for i, j in enumerate(mate) if i < j]
+
+
+def _edge_penalty(block, prefs, i, j, half, relax):
+    penalty = 0
+    if block[j].player_id in block[i].opponents:
+        if relax < REMATCH:
+            return None
+        penalty += REMATCH_PENALTY
+    si, ci = prefs[i]
+    sj, cj = prefs[j]
+    if ci is not None and ci == cj:
+        if min(si, sj) == 3 and relax < COLOUR_CLASH:
+            return None
+        penalty += COLOUR_PENALTY[min(si, sj)]
+    return penalty + abs(j - i - half)
+
+
+def _match_block(block, prefs, window, rank_bonus):
+    n = len(block)
+    half = n // 2
+    edges = []
+    for i in range(n):
+        for j in range(max(i + 1, i + half - window), min(n, i + half + window + 1)):
+            penalty = _edge_penalty(block, prefs, i, j, half, STRICT)
+            if penalty is None:
+                continue
+            weight = REMATCH_PENALTY - penalty
+            if rank_bonus:
+                weight += FLOAT_BONUS * (2 * n - i - j)
+            edges.append((i, j, weight))
+    mate = max_weight_matching(edges, maxcardinality=True)
+    return mate + (n - len(mate)) * [-1]
+
+
+def _allocate_colours(a, b, board):
+    # a is the higher ranked player of the pair. Without any colour history
+    # (round one) the higher ranked player gets white on odd boards and
+    # black on even ones, so the field does not start split by colour.
+    sa, ca = colour_preference(a.colours)
+    sb, cb = colour_preference(b.colours)
+    if ca is None and cb is None:
+        return (a, b) if board % 2 == 0 else (b, a)
+    if ca != cb:
+        if ca == "W" or cb == "B":
+            return (a, b)
+        return (b, a)
+    if sa != sb:
+        winner = a if sa > sb else b
+    else:
+        for x, y in zip(reversed(a.colours), reversed(b.colours)):
+            if x != y:
+                return (b, a) if x == "W" else (a, b)
+        winner = a
+    loser = b if winner is a else a
+    return (winner, loser) if ca == "W" else (loser, winner)
+
+
+def _board_key(pair, rank):
+    w, b = pair
+    return (-max(w.points, b.points), -(w.points + b.points), min(rank[w.player_id], rank[b.player_id]))
+
+
+def max_weight_matching(edges, maxcardinality=False):
+    """Maximum weight matching in a general graph (Edmonds' blossom method).
+
+    edges is a list of (i, j, weight) with integer vertex ids starting at 0
+    and integer weights. If maxcardinality is true the matching has maximum
+    cardinality first and maximum weight among those. Returns mate, where
+    mate[v] is the vertex matched to v or -1.
+
+    This follows the O(n^3) primal-dual formulation by Galil, as popularised
+    by Joris van Rantwijk's reference implementation.
+    """
+    if not edges:
+        return []
+
+    nedge = len(edges)
+    nvertex = 0
+    for i, j, w in edges:
+        nvertex = max(nvertex, i + 1, j + 1)
+    maxweight = max(0, max(w for _, _, w in edges))
+
+    # endpoint[p] is the vertex at endpoint p; edge k has endpoints 2k, 2k+1.
+    endpoint = [edges[p >> 1][p & 1] for p in range(2 * nedge)]
+    neighbend = [[] for _ in range(nvertex)]
+    for k, (i, j, w) in enumerate(edges):
+        neighbend[i].append(2 * k + 1)
+        neighbend[j].append(2 * k)
+
+    mate = nvertex * [-1]
+    label = (2 * nvertex) * [0]
+    labelend = (2 * nvertex) * [-1]
+    inblossom = list(range(nvertex))
+    blossomparent = (2 * nvertex) * [-1]
+    blossomchilds = (2 * nvertex) * [None]
+    blossombase = list(range(nvertex)) + nvertex * [-1]
+    blossomendps = (2 * nvertex) * [None]
+    bestedge = (2 * nvertex) * [-1]
+    blossombestedges = (2 * nvertex) * [None]
+    unusedblossoms = list(range(nvertex, 2 * nvertex))
+    dualvar = nvertex * [maxweight] + nvertex * [0]
+    allowedge = nedge * [False]
+    queue = []
+
+    def slack(k):
+        i, j, wt = edges[k]
+        return dualvar[i] + dualvar[j] - 2 * wt
+
+    def blossom_leaves(b):
+        if b < nvertex:
+            yield b
+        else:
+            for t in blossomchilds[b]:
+                if t < nvertex:
+                    yield t
+                else:
+                    for v in blossom_leaves(t):
+                        yield v
+
+    def assign_label(w, t, p):
+        b = inblossom[w]
+        label[w] = label[b] = t
+        labelend[w] = labelend[b] = p
+        bestedge[w] = bestedge[b] = -1
+        if t == 1:
+            queue.extend(blossom_leaves(b))
+        elif t == 2:
+            base = blossombase[b]
+            assign_label(endpoint[mate[base]], 1, mate[base] ^ 1)
+
+    def scan_blossom(v, w):
+        # Trace back from v and w to find a new blossom or an augmenting path.
+        path = []
+        base = -1
+        while v != -1 or w != -1:
+            b = inblossom[v]
+            if label[b] & 4:
+                base = blossombase[b]
+                break
+            path.append(b)
+            label[b] = 5
+            if labelend[b] == -1:
+                v = -1
+            else:
+                v = endpoint[labelend[b]]
+                b = inblossom[v]
+                v = endpoint[labelend[b]]
+            if w != -1:
+                v, w = w, v
+        for b in path:
+            label[b] = 1
+        return base
+
+    def add_blossom(base, k):
+        v, w, wt = edges[k]
+        bb = inblossom[base]
+        bv = inblossom[v]
+        bw = inblossom[w]
+        b = unusedblossoms.pop()
+        blossombase[b] = base
+        blossomparent[b] = -1
+        blossomparent[bb] = b
+        blossomchilds[b] = path = []
+        blossomendps[b] = endps = []
+        while bv != bb:
+            blossomparent[bv] = b
+            path.append(bv)
+            endps.append(labelend[bv])
+            v = endpoint[labelend[bv]]
+            bv = inblossom[v]
+        path.append(bb)
+        path.reverse()
+        endps.reverse()
+        endps.append(2 * k)
+        while bw != bb:
+            blossomparent[bw] = b
+            path.append(bw)
+            endps.append(labelend[bw] ^ 1)
+            w = endpoint[labelend[bw]]
+            bw = inblossom[w]
+        label[b] = 1
+        labelend[b] = labelend[bb]
+        dualvar[b] = 0
+        for v in blossom_leaves(b):
+            if label[inblossom[v]] == 2:
+                queue.append(v)
+            inblossom[v] = b
+        bestedgeto = (2 * nvertex) * [-1]
+        for bv in path:
+            if blossombestedges[bv] is None:
+                nblists = [[p >> 1 for p in neighbend[v]] for v in blossom_leaves(bv)]
+            else:
+                nblists = [blossombestedges[bv]]
+            for nblist in nblists:
+                for k in nblist:
+                    i, j, wt = edges[k]
+                    if inblossom[j] == b:
+                        i, j = j, i
+                    bj = inblossom[j]
+                    if bj != b and label[bj] == 1 and (bestedgeto[bj] == -1 or slack(k) < slack(bestedgeto[bj])):
+                        bestedgeto[bj] = k
+            blossombestedges[bv] = None
+            bestedge[bv] = -1
+        blossombestedges[b] = [k for k in bestedgeto if k != -1]
+        bestedge[b] = -1
+        for k in blossombestedges[b]:
+            if bestedge[b] == -1 or slack(k) < slack(bestedge[b]):
+                bestedge[b] = k
+
+    def expand_blossom(b, endstage):
+        for s in blossomchilds[b]:
+            blossomparent[s] = -1
+            if s < nvertex:
+                inblossom[s] = s
+            elif endstage and dualvar[s] == 0:
+                expand_blossom(s, endstage)
+            else:
+                for v in blossom_leaves(s):
+                    inblossom[v] = s
+        if not endstage and label[b] == 2:
+            entrychild = inblossom[endpoint[labelend[b] ^ 1]]
+            j = blossomchilds[b].index(entrychild)
+            if j & 1:
+                j -= len(blossomchilds[b])
+                jstep = 1
+                endptrick = 0
+            else:
+                jstep = -1
+                endptrick = 1
+            p = labelend[b]
+            while j != 0:
+                label[endpoint[p ^ 1]] = 0
+                label[endpoint[blossomendps[b][j - endptrick] ^ endptrick ^ 1]] = 0
+                assign_label(endpoint[p ^ 1], 2, p)
+                allowedge[blossomendps[b][j - endptrick] >> 1] = True
+                j += jstep
+                p = blossomendps[b][j - endptrick] ^ endptrick
+                allowedge[p >> 1] = True
+                j += jstep
+            bv = blossomchilds[b][j]
+            label[endpoint[p ^ 1]] = label[bv] = 2
+            labelend[endpoint[p ^ 1]] = labelend[bv] = p
+            bestedge[bv] = -1
+            j += jstep
+            while blossomchilds[b][j] != entrychild:
+                bv = blossomchilds[b][j]
+                if label[bv] == 1:
+                    j += jstep
+                    continue
+                for v in blossom_leaves(bv):
+                    if label[v] != 0:
+                        break
+                if label[v] != 0:
+                    label[v] = 0
+                    label[endpoint[mate[blossombase[bv]]]] = 0
+                    assign_label(v, 2, labelend[v])
+                j += jstep
+        label[b] = labelend[b] = -1
+        blossomchilds[b] = blossomendps[b] = None
+        blossombase[b] = -1
+        blossombestedges[b] = None
+        bestedge[b] = -1
+        unusedblossoms.append(b)
+
+    def augment_blossom(b, v):
+        t = v
+        while blossomparent[t] != b:
+            t = blossomparent[t]
+        if t >= nvertex:
+            augment_blossom(t, v)
+        i = j = blossomchilds[b].index(t)
+        if i & 1:
+            j -= len(blossomchilds[b])
+            jstep = 1
+            endptrick = 0
+        else:
+            jstep = -1
+            endptrick = 1
+        while j != 0:
+            j += jstep
+            t = blossomchilds[b][j]
+            p = blossomendps[b][j - endptrick] ^ endptrick
+            if t >= nvertex:
+                augment_blossom(t, endpoint[p])
+            j += jstep
+            t = blossomchilds[b][j]
+            if t >= nvertex:
+                augment_blossom(t, endpoint[p ^ 1])
+            mate[endpoint[p]] = p ^ 1
+            mate[endpoint[p ^ 1]] = p
+        blossomchilds[b] = blossomchilds[b][i:] + blossomchilds[b][:i]
+        blossomendps[b] = blossomendps[b][i:] + blossomendps[b][:i]
+        blossombase[b] = blossombase[blossomchilds[b][0]]
+
+    def augment_matching(k):
+        v, w, wt = edges[k]
+        for s, p in ((v, 2 * k + 1), (w, 2 * k)):
+            while True:
+                bs = inblossom[s]
+                if bs >= nvertex:
+                    augment_blossom(bs, s)
+                mate[s] = p
+                if labelend[bs] == -1:
+                    break
+                t = endpoint[labelend[bs]]
+                bt = inblossom[t]
+                s = endpoint[labelend[bt]]
+                j = endpoint[labelend[bt] ^ 1]
+                if bt >= nvertex:
+                    augment_blossom(bt, j)
+                mate[j] = labelend[bt]
+                p = labelend[bt] ^ 1
+
+    for _ in range(nvertex):
+        # Each stage either augments the matching or proves it maximum.
+        label[:] = (2 * nvertex) * [0]
+        bestedge[:] = (2 * nvertex) * [-1]
+        blossombestedges[nvertex:] = nvertex * [None]
+        allowedge[:] = nedge * [False]
+        queue[:] = []
+        for v in range(nvertex):
+            if mate[v] == -1 and label[inblossom[v]] == 0:
+                assign_label(v, 1, -1)
+
+        augmented = False
+        while True:
+            while queue and not augmented:
+                v = queue.pop()
+                for p in neighbend[v]:
+                    k = p >> 1
+                    w = endpoint[p]
+                    if inblossom[v] == inblossom[w]:
+                        continue
+                    if not allowedge[k]:
+                        kslack = slack(k)
+                        if kslack <= 0:
+                            allowedge[k] = True
+                    if allowedge[k]:
+                        if label[inblossom[w]] == 0:
+                            assign_label(w, 2, p ^ 1)
+                        elif label[inblossom[w]] == 1:
+                            base = scan_blossom(v, w)
+                            if base >= 0:
+                                add_blossom(base, k)
+                            else:
+                                augment_matching(k)
+                                augmented = True
+                                break
+                        elif label[w] == 0:
+                            label[w] = 2
+                            labelend[w] = p ^ 1
+                    elif label[inblossom[w]] == 1:
+                        b = inblossom[v]
+                        if bestedge[b] == -1 or kslack < slack(bestedge[b]):
+                            bestedge[b] = k
+                    elif label[w] == 0:
+                        if bestedge[w] == -1 or kslack < slack(bestedge[w]):
+                            bestedge[w] = k
+            if augmented:
+                break
+
+            # No augmenting path with tight edges; adjust the duals.
+            deltatype = -1
+            delta = deltaedge = deltablossom = None
+            if not maxcardinality:
+                deltatype = 1
+                delta = min(dualvar[:nvertex])
+            for v in range(nvertex):
+                if label[inblossom[v]] == 0 and bestedge[v] != -1:
+                    d = slack(bestedge[v])
+                    if deltatype == -1 or d < delta:
+                        delta = d
+                        deltatype = 2
+                        deltaedge = bestedge[v]
+            for b in range(2 * nvertex):
+                if blossomparent[b] == -1 and label[b] == 1 and bestedge[b] != -1:
+                    d = slack(bestedge[b]) // 2
+                    if deltatype == -1 or d < delta:
+                        delta = d
+                        deltatype = 3
+                        deltaedge = bestedge[b]
+            for b in range(nvertex, 2 * nvertex):
+                if (blossombase[b] >= 0 and blossomparent[b] == -1 and label[b] == 2
+                        and (deltatype == -1 or dualvar[b] < delta)):
+                    delta = dualvar[b]
+                    deltatype = 4
+                    deltablossom = b
+            if deltatype == -1:
+                deltatype = 1
+                delta = max(0, min(dualvar[:nvertex]))
+
+            for v in range(nvertex):
+                if label[inblossom[v]] == 1:
+                    dualvar[v] -= delta
+                elif label[inblossom[v]] == 2:
+                    dualvar[v] += delta
+            for b in range(nvertex, 2 * nvertex):
+                if blossombase[b] >= 0 and blossomparent[b] == -1:
+                    if label[b] == 1:
+                        dualvar[b] += delta
+                    elif label[b] == 2:
+                        dualvar[b] -= delta
+
+            if deltatype == 1:
+                break
+            elif deltatype == 2:
+                allowedge[deltaedge] = True
+                i, j, wt = edges[deltaedge]
+                if label[inblossom[i]] == 0:
+                    i, j = j, i
+                queue.append(i)
+            elif deltatype == 3:
+                allowedge[deltaedge] = True
+                i, j, wt = edges[deltaedge]
+                queue.append(i)
+            else:
+                expand_blossom(deltablossom, False)
+
+        if not augmented:
+            break
+        for b in range(nvertex, 2 * nvertex):
+            if blossomparent[b] == -1 and blossombase[b] >= 0 and label[b] == 1 and dualvar[b] == 0:
+                expand_blossom(b, True)
+
+    return [endpoint[m] if m >= 0 else -1 for m in mate]
@@ -0,0 +1,51 @@
+"""Elo arithmetic for the rating board: expected scores, performance rating
+and rating change, following the FIDE rating regulations.
+
+db.py keeps one RatingStats row per player with running sums over the games
+that count (a result against a rated opponent): games, score, opponents'
+ratings and expected score. save_results() adds the difference a changed
+board makes to those sums and then recomputes the three columns below for
+the players involved only, so a round of results costs a few statements
+however large the field.
+"""
+
+# FIDE table 8.1.2: rating difference dp for a percentage score p, for
+# p = 0.50, 0.51, ... 1.00. Scores below 50% mirror it.
+DP = (
+    0, 7, 14, 21, 29, 36, 43, 50, 57, 65, 72, 80, 87, 95, 102, 110, 117, 125, 133, 141,
+    149, 158, 166, 175, 184, 193, 202, 211, 220, 230, 240, 251, 262, 273, 284, 296, 309,
+    322, 336, 351, 366, 383, 401, 422, 444, 470, 501, 538, 589, 677, 800,
+)
+# A difference of more than 400 points counts as 400.
+MAX_DIFFERENCE = 400
+
+
+def expected_score(rating, opponent_rating):
+    difference = max(-MAX_DIFFERENCE, min(MAX_DIFFERENCE, opponent_rating - rating))
+    return 1.0 / (1.0 + 10 ** (difference / 400.0))
+
+
+def k_factor(rating):
+    return 20 if rating < 2400 else 10
+
+
+def rating_difference(fraction):
+    """dp for a score fraction between 0 and 1."""
+    p = int(round(fraction * 100))
+    if p >= 50:
+        return DP[p - 50]
+    return -DP[50 - p]
+
+
+def derived(rating, games, score, opponent_ratings, expected):
+    """(average opponent, performance, rating change) from the running sums.
+
+    Values that cannot be computed yet (no rated games, an unrated player)
+    are None.
+    """
+    if not games:
+        return None, None, None
+    average = opponent_ratings / games
+    performance = round(average + rating_difference(score / games))
+    change = None if rating is None else round(k_factor(rating) * (score - expected), 1)
+    return round(average, 1), performance, change
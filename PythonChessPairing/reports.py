@@ -0,0 +1,169 @@
+"""Read-only tournament reports as plain (header, rows) tables.
+
+Shared by the HTTP feed and the exporters so every output shows the same
+standings, pairings and crosstable.
+"""
+import db
+import tiebreaks
+
+
+def format_points(value):
+    if value is None:
+        return ""
+    whole, half = int(value), value % 1 == 0.5
+    if half:
+        return f"{whole}½" if whole else "½"
+    return str(whole)
+
+
+def format_result(white_points, black_points, bye=False):
+    if bye:
+        return "bye"
+    if white_points is None:
+        return ""
+    return f"{format_points(white_points)}-{format_points(black_points)}"
+
+
+def standings_table(conn, tourney_id):
+    order, rows = tiebreaks.standings(conn, tourney_id)
+    header = ["Rank", "Player", "Points"] + [tiebreaks.TIEBREAKS[name] for name in order]
+    return header, [[rank, name] + list(values) for rank, _, name, *values in rows]
+
+
+def iter_ratings(conn, tourney_id):
+    """Yield the header, then one rating board row per player.
+
+    Best performance first; players without a rated game come last. Reads
+    the RatingStats sums that save_results keeps current.
+    """
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT p.PlayerName, p.Rating, r.Games, r.Score, r.AverageOpponent, r.Performance, r.RatingChange
+        FROM RatingStats AS r
+        JOIN Players AS p ON p.PlayerID = r.PlayerID
+        WHERE r.TournamentID = ?
+        ORDER BY r.Performance IS NULL, r.Performance DESC, p.Rating IS NULL, p.Rating DESC, p.PlayerName
+    """, (tourney_id,))
+    yield ["Player", "Rating", "Rated Games", "Score", "Avg Opp", "Performance", "Change"]
+    for name, rating, games, score, average, performance, change in cursor:
+        yield [name, rating or "", games, format_points(score) if games else "",
+               "" if average is None else round(average), "" if performance is None else performance,
+               "" if change is None else f"{change:+.1f}"]
+
+
+def ratings_table(conn, tourney_id):
+    """The rating board as (header, rows); see iter_ratings."""
+    rows = iter_ratings(conn, tourney_id)
+    return next(rows), list(rows)
+
+
+def last_round_number(conn, tourney_id):
+    return db.next_round_number(conn, tourney_id) - 1
+
+
+def load_ranks(conn, tourney_id, model=None):
+    """Fill temp.ReportRanks (PlayerID, Rank, StartNo, Points) for one tournament.
+
+    Rank follows the tournament's tiebreak order and StartNo the order of
+    registration. Reports join against it so they can stream their rows
+    straight from one cursor. Returns the tiebreak order.
+    """
+    order, ranked = tiebreaks.standings(conn, tourney_id, model=model)
+    start_numbers = {player_id: n for n, player_id in enumerate(sorted(row[1] for row in ranked), start=1)}
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS ReportRanks (
+            PlayerID INTEGER PRIMARY KEY, Rank INTEGER, StartNo INTEGER, Points REAL)
+    """)
+    cursor.execute("DELETE FROM temp.ReportRanks")
+    cursor.executemany(
+        "INSERT INTO temp.ReportRanks VALUES (?, ?, ?, ?)",
+        [(player_id, rank, start_numbers[player_id], points) for rank, player_id, _, points, *_ in ranked],
+    )
+    return order
+
+
+def iter_pairings(conn, tourney_id, round_number):
+    """Yield the header, then Board, White, Black, Result for one round."""
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT g.Board, w.PlayerName, b.PlayerName, g.BlackID IS NULL, g.WhitePoints, g.BlackPoints
+        FROM Games AS g
+        JOIN Players AS w ON w.PlayerID = g.WhiteID
+        LEFT JOIN Players AS b ON b.PlayerID = g.BlackID
+        WHERE g.TournamentID = ? AND g.RoundNumber = ?
+        ORDER BY g.Board
+    """, (tourney_id, round_number))
+    yield ["Board", "White", "Black", "Result"]
+    for board, white, black, bye, white_points, black_points in cursor:
+        yield [board, white, "Bye" if bye else black, format_result(white_points, black_points, bye)]
+
+
+def pairings_table(conn, tourney_id, round_number):
+    """Board list of one round as (header, rows)."""
+    rows = iter_pairings(conn, tourney_id, round_number)
+    return next(rows), list(rows)
+
+
+def iter_player_games(conn, tourney_id, order_by="Rank"):
+    """Yield (player row, games) per player, sorted by Rank or StartNo.
+
+    The player row is (player_id, rank, start_no, name, points, rating) and
+    games a list of (round, colour, opponent rank, opponent start no,
+    points), with colour None for a bye. Needs load_ranks() first; one
+    cursor is walked from start to end.
+    """
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT r.PlayerID, r.Rank, r.StartNo, p.PlayerName, r.Points, p.Rating,
+               g.RoundNumber, CASE WHEN g.BlackID IS NULL THEN NULL ELSE 'w' END,
+               o.Rank, o.StartNo, g.WhitePoints
+        FROM temp.ReportRanks AS r
+        JOIN Players AS p ON p.PlayerID = r.PlayerID
+        LEFT JOIN Games AS g ON g.WhiteID = r.PlayerID AND g.TournamentID = ?
+        LEFT JOIN temp.ReportRanks AS o ON o.PlayerID = g.BlackID
+        UNION ALL
+        SELECT r.PlayerID, r.Rank, r.StartNo, p.PlayerName, r.Points, p.Rating,
+               g.RoundNumber, 'b', o.Rank, o.StartNo, g.BlackPoints
+        FROM temp.ReportRanks AS r
+        JOIN Players AS p ON p.PlayerID = r.PlayerID
+        JOIN Games AS g ON g.BlackID = r.PlayerID AND g.TournamentID = ?
+        LEFT JOIN temp.ReportRanks AS o ON o.PlayerID = g.WhiteID
+        ORDER BY {"2" if order_by == "Rank" else "3"}, 7
+    """, (tourney_id, tourney_id))
+    player, games = None, []
+    for row in cursor:
+        if player is not None and row[0] != player[0]:
+            yield player, games
+            games = []
+        player = row[:6]
+        if row[6] is not None:
+            games.append(row[6:])
+    if player is not None:
+        yield player, games
+
+
+def iter_crosstable(conn, tourney_id, model=None):
+    """Yield the header, then Rank, Player, one cell per round, Points.
+
+    A cell is the opponent's rank, w/b for the colour and the score, e.g.
+    "12w1" or "3b½"; a bye is "+" with its score and an unplayed round is
+    empty.
+    """
+    load_ranks(conn, tourney_id, model)
+    rounds = last_round_number(conn, tourney_id)
+    yield ["Rank", "Player"] + [f"R{r}" for r in range(1, rounds + 1)] + ["Points"]
+    for (_, rank, _, name, points, _), games in iter_player_games(conn, tourney_id):
+        cells = [""] * rounds
+        for round_number, colour, opponent_rank, _, score in games:
+            if colour is None:
+                cells[round_number - 1] = "+" + format_points(score)
+            else:
+                cells[round_number - 1] = f"{opponent_rank or '?'}{colour}{format_points(score)}"
+        yield [rank, name] + cells + [points]
+
+
+def crosstable(conn, tourney_id):
+    """The crosstable as (header, rows); see iter_crosstable."""
+    rows = iter_crosstable(conn, tourney_id)
+    return next(rows), list(rows)
@@ -0,0 +1,242 @@
+"""Read-only HTTP feed of pairings, standings and crosstables.
+
+    python cli.py serve --port 8080
+
+    GET /                                  tournament list (HTML)
+    GET /tournaments.json
+    GET /t/<id>/standings.html   .json
+    GET /t/<id>/pairings.html    .json     latest round, or ?round=N
+    GET /t/<id>/crosstable.html  .json
+    GET /t/<id>/ratings.html     .json     performance ratings and rating changes
+
+The database is switched to WAL so readers work from snapshots and never
+block the arbiter's writes. Requests are answered from a small pool of
+read-only connections, and rendered pages are cached under an ETag built
+from Tournaments.Revision, which every round, result and player change
+bumps in its own transaction. A poll of an unchanged page therefore costs
+one indexed lookup, and returns 304 when the client sent the ETag back.
+"""
+import html
+import json
+import pathlib
+import queue
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import db
+import metrics
+import reports
+
+POOL_SIZE = 4
+REFRESH_SECONDS = 30
+ROUTE = re.compile(r"^/t/(\d+)/(standings|pairings|crosstable|ratings)\.(html|json)$")
+
+
+class ReadPool(object):
+    """A fixed set of read-only connections shared by the request threads."""
+
+    def __init__(self, path, size=POOL_SIZE):
+        uri = pathlib.Path(path).resolve().as_uri() + "?mode=ro"
+        self._idle = queue.Queue()
+        self._all = []
+        for _ in range(size):
+            conn = metrics.instrument(sqlite3.connect(uri, uri=True, timeout=30, check_same_thread=False))
+            self._all.append(conn)
+            self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self._idle.get()
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    def close(self):
+        for conn in self._all:
+            conn.close()
+
+
+class FeedServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, db_path, host="127.0.0.1", port=8080, pool_size=POOL_SIZE):
+        conn = db.connect(db_path)
+        db.enable_wal(conn)
+        conn.close()
+        self.pool = ReadPool(db_path, pool_size)
+        # (tournament, view, format, round) -> (etag, content type, body)
+        self.cache = {}
+        self._cache_lock = threading.Lock()
+        self._render_locks = {}
+        super().__init__((host, port), FeedHandler)
+
+    def render_lock(self, key):
+        # One thread renders a stale page while the others wait for it.
+        with self._cache_lock:
+            return self._render_locks.setdefault(key, threading.Lock())
+
+    def store(self, key, cached):
+        # Pages of an older revision of the same tournament are dead; drop
+        # them so the cache never holds more than one revision's pages
+        # (and rounds removed by a rollback do not linger).
+        with self._cache_lock:
+            for old in [k for k, v in self.cache.items() if k[0] == key[0] and v[0] != cached[0]]:
+                del self.cache[old]
+                self._render_locks.pop(old, None)
+            self.cache[key] = cached
+
+    def server_close(self):
+        super().server_close()
+        self.pool.close()
+
+
+class FeedHandler(BaseHTTPRequestHandler):
+    server_version = "ChessFeed/1.0"
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        try:
+            if url.path in ("/", "/index.html"):
+                self.send_tournaments("html")
+            elif url.path == "/tournaments.json":
+                self.send_tournaments("json")
+            else:
+                match = ROUTE.match(url.path)
+                if not match:
+                    self.send_error(404)
+                    return
+                self.send_report(int(match.group(1)), match.group(2), match.group(3), parse_qs(url.query))
+        except ValueError as e:
+            self.send_error(400, str(e))
+
+    def send_tournaments(self, fmt):
+        with self.server.pool.connection() as conn:
+            rows = conn.execute("SELECT TournamentID, TournamentName FROM Tournaments ORDER BY TournamentID").fetchall()
+        if fmt == "json":
+            self.send_body("application/json", json.dumps([{"id": tid, "name": name} for tid, name in rows]))
+            return
+        items = "".join(
+            f'<li>{html.escape(name)}: <a href="/t/{tid}/standings.html">standings</a>, '
+            f'<a href="/t/{tid}/pairings.html">pairings</a>, <a href="/t/{tid}/crosstable.html">crosstable</a>, '
+            f'<a href="/t/{tid}/ratings.html">ratings</a></li>'
+            for tid, name in rows
+        )
+        self.send_body("text/html; charset=utf-8", page("Tournaments", f"<ul>{items}</ul>"))
+
+    def send_report(self, tourney_id, view, fmt, query):
+        # Only pairings take ?round=, and only for a round that exists, so
+        # the cache holds at most one page per view, format and round.
+        round_number = int(query["round"][0]) if view == "pairings" and "round" in query else None
+        key = (tourney_id, view, fmt, round_number)
+        with self.server.pool.connection() as conn:
+            revision = db.revision(conn, tourney_id)
+            if revision is not None and round_number is not None:
+                last_round = reports.last_round_number(conn, tourney_id)
+        if revision is None:
+            self.send_error(404, "no such tournament")
+            return
+        if round_number is not None and not 1 <= round_number <= last_round:
+            self.send_error(404, "no such round")
+            return
+        etag = f'"{tourney_id}-{revision}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        cached = self.server.cache.get(key)
+        if cached is None or cached[0] != etag:
+            with self.server.render_lock(key):
+                cached = self.server.cache.get(key)
+                if cached is None or cached[0] != etag:
+                    with self.server.pool.connection() as conn, metrics.action(f"feed {view}.{fmt}"):
+                        # Render from the same snapshot the ETag comes from.
+                        conn.execute("BEGIN")
+                        try:
+                            etag = f'"{tourney_id}-{db.revision(conn, tourney_id)}"'
+                            content_type, body = render(conn, tourney_id, view, fmt, round_number)
+                        finally:
+                            conn.rollback()
+                    cached = (etag, content_type, body.encode("utf-8"))
+                    self.server.store(key, cached)
+        etag, content_type, body = cached
+        self.send_body(content_type, body, etag)
+
+    def send_body(self, content_type, body, etag=None):
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-cache")
+        if etag:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Hundreds of pollers would flood the console.
+        pass
+
+
+def render(conn, tourney_id, view, fmt, round_number=None):
+    """Return (content type, body) for one report."""
+    name = conn.execute("SELECT TournamentName FROM Tournaments WHERE TournamentID = ?", (tourney_id,)).fetchone()[0]
+    if view == "standings":
+        title = f"{name} - Standings"
+        header, rows = reports.standings_table(conn, tourney_id)
+    elif view == "pairings":
+        round_number = round_number or reports.last_round_number(conn, tourney_id)
+        title = f"{name} - Round {round_number}"
+        header, rows = reports.pairings_table(conn, tourney_id, round_number)
+    elif view == "ratings":
+        title = f"{name} - Ratings"
+        header, rows = reports.ratings_table(conn, tourney_id)
+    else:
+        title = f"{name} - Crosstable"
+        header, rows = reports.crosstable(conn, tourney_id)
+
+    if fmt == "json":
+        body = {"tournament": name, "columns": header, "rows": rows}
+        if view == "pairings":
+            body["round"] = round_number
+        return "application/json", json.dumps(body)
+    cells = "".join(f"<th>{html.escape(str(h))}</th>" for h in header)
+    lines = [f"<tr>{cells}</tr>"]
+    for row in rows:
+        lines.append("<tr>" + "".join(f"<td>{html.escape(str(value))}</td>" for value in row) + "</tr>")
+    return "text/html; charset=utf-8", page(title, f"<table>{''.join(lines)}</table>", refresh=True)
+
+
+def page(title, content, refresh=False):
+    meta = f'<meta http-equiv="refresh" content="{REFRESH_SECONDS}">' if refresh else ""
+    return (
+        f"<!DOCTYPE html><html><head><meta charset=\"utf-8\">{meta}<title>{html.escape(title)}</title>"
+        "<style>body{font-family:sans-serif}table{border-collapse:collapse}"
+        "td,th{border:1px solid #ccc;padding:2px 8px}</style></head>"
+        f"<body><h1>{html.escape(title)}</h1>{content}</body></html>"
+    )
+
+
+def start(db_path, host="127.0.0.1", port=8080):
+    """Serve from a daemon thread and return the server; call shutdown() to stop."""
+    server = FeedServer(db_path, host, port)
+    threading.Thread(target=server.serve_forever, name="chess-feed", daemon=True).start()
+    return server
+
+
+def serve(db_path, host="127.0.0.1", port=8080):
+    """Serve until interrupted."""
+    server = FeedServer(db_path, host, port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,220 @@
+"""Monte Carlo tournament simulator.
+
+    python simulate.py players.csv --rounds 9 --events 2000 --workers 8
+    python simulate.py --players 120 --rounds 7 --events 500 --format json
+
+Each simulated event is a complete tournament in a private in-memory
+database: every round is paired with pair_round, stored with
+db.insert_round, played out with results drawn from the Elo expectation and
+saved with db.save_results, just as the GUI and cli.py do, and the final
+table comes from the tiebreak engine. Events run in batches on a process
+pool and their statistics are summed, so a pairing rule change can be
+checked over thousands of events before it meets a real one.
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import db
+import importers
+import ratings
+import tiebreaks
+from model import TournamentModel
+from pairing import pair_round
+
+DEFAULT_DRAW = 0.30
+WHITE_ADVANTAGE = 35
+
+
+def play_game(white_rating, black_rating, rng, draw=DEFAULT_DRAW, white_advantage=WHITE_ADVANTAGE):
+    """Draw a result (white_points, black_points) from the Elo expectation.
+
+    The expectation is ratings.expected_score, the same one the Ratings tab
+    uses (differences over 400 count as 400). The draw probability is capped
+    so that white's expected score stays exactly that expectation.
+    """
+    expected = ratings.expected_score(white_rating + white_advantage, black_rating)
+    p_draw = min(draw, 2 * min(expected, 1 - expected))
+    x = rng.random()
+    if x < expected - p_draw / 2:
+        return 1.0, 0.0
+    if x < expected + p_draw / 2:
+        return 0.5, 0.5
+    return 0.0, 1.0
+
+
+def simulate_event(player_ratings, rounds, seed, draw=DEFAULT_DRAW, white_advantage=WHITE_ADVANTAGE):
+    """Play one tournament and return its statistics as a dict.
+
+    player_ratings is a list of ratings in seeding order; players get
+    PlayerIDs 1..n in that order.
+    """
+    rng = random.Random(seed)
+    conn = db.connect(":memory:")
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO Tournaments (TournamentName) VALUES (?)", (f"Simulation {seed}",))
+    tourney_id = cursor.lastrowid
+    importers.import_players(conn, tourney_id, ((f"Player {i + 1}", rating) for i, rating in enumerate(player_ratings)))
+    rating_of = {i + 1: rating for i, rating in enumerate(player_ratings)}
+    model = TournamentModel.load(conn, tourney_id)
+
+    stats = {
+        "events": 1, "boards": 0, "rematches": 0, "repeat_byes": 0,
+        "float_boards": 0, "score_gap": 0.0, "colour_streaks": 0,
+        "round_pair_seconds": [], "round_seconds": [],
+    }
+    for round_number in range(1, rounds + 1):
+        start = time.perf_counter()
+        states = model.player_states()
+        paired = time.perf_counter()
+        pairings = pair_round(states)
+        pair_seconds = time.perf_counter() - paired
+        round_id = db.insert_round(conn, tourney_id, round_number, pairings)
+        model.add_round(conn, round_number, pairings)
+
+        by_id = {state.player_id: state for state in states}
+        results = []
+        for white_id, black_id in pairings:
+            white = by_id[white_id]
+            if black_id is None:
+                stats["repeat_byes"] += white.had_bye
+                results.append((white_id, None, 1.0, 0.0))
+                continue
+            black = by_id[black_id]
+            stats["boards"] += 1
+            stats["rematches"] += black_id in white.opponents
+            gap = abs(white.points - black.points)
+            stats["float_boards"] += gap > 0
+            stats["score_gap"] += gap
+            stats["colour_streaks"] += white.colours.endswith("WW") + black.colours.endswith("BB")
+            results.append((white_id, black_id) + play_game(rating_of[white_id], rating_of[black_id], rng, draw, white_advantage))
+        changed = db.save_results(conn, tourney_id, round_id, results)
+        model.set_results(conn, round_number, results, changed)
+        db.standings(conn, tourney_id)
+        stats["round_pair_seconds"].append(pair_seconds)
+        stats["round_seconds"].append(time.perf_counter() - start)
+
+    colours = [state.colours for state in model.player_states()]
+    imbalance = [abs(c.count("W") - c.count("B")) for c in colours]
+    stats["colour_imbalance"] = sum(imbalance) / len(imbalance) if imbalance else 0.0
+    stats["max_colour_imbalance"] = max(imbalance, default=0)
+
+    _, table = tiebreaks.standings(conn, tourney_id, model=model)
+    favourite = max(rating_of, key=lambda pid: (rating_of[pid], -pid))
+    stats["favourite_won"] = int(bool(table) and table[0][1] == favourite)
+    conn.close()
+    return stats
+
+
+def simulate_batch(player_ratings, rounds, seeds, draw=DEFAULT_DRAW, white_advantage=WHITE_ADVANTAGE):
+    """Play one event per seed; the unit of work sent to a pool process."""
+    return [simulate_event(player_ratings, rounds, seed, draw, white_advantage) for seed in seeds]
+
+
+def combine(events, rounds):
+    """Sum the statistics of many events into one summary dict."""
+    n = len(events)
+    boards = sum(e["boards"] for e in events)
+    summary = {
+        "events": n,
+        "rounds": rounds,
+        "rematches": sum(e["rematches"] for e in events),
+        "repeat_byes": sum(e["repeat_byes"] for e in events),
+        "colour_imbalance": sum(e["colour_imbalance"] for e in events) / n if n else 0.0,
+        "max_colour_imbalance": max((e["max_colour_imbalance"] for e in events), default=0),
+        "colour_streaks_per_event": sum(e["colour_streaks"] for e in events) / n if n else 0.0,
+        "float_share": sum(e["float_boards"] for e in events) / boards if boards else 0.0,
+        "mean_score_gap": sum(e["score_gap"] for e in events) / boards if boards else 0.0,
+        "favourite_won": sum(e["favourite_won"] for e in events) / n if n else 0.0,
+        "round_pair_ms": [],
+        "round_ms": [],
+    }
+    for r in range(rounds):
+        summary["round_pair_ms"].append(1000 * sum(e["round_pair_seconds"][r] for e in events) / n if n else 0.0)
+        summary["round_ms"].append(1000 * sum(e["round_seconds"][r] for e in events) / n if n else 0.0)
+    return summary
+
+
+def run(player_ratings, rounds, events, workers=None, batch=25, seed=0, draw=DEFAULT_DRAW,
+        white_advantage=WHITE_ADVANTAGE, progress=None):
+    """Simulate events tournaments across a process pool and combine them.
+
+    progress(done, total) is called as batches complete.
+    """
+    seeds = [seed + i for i in range(events)]
+    batches = [seeds[i:i + batch] for i in range(0, len(seeds), batch)]
+    results = []
+    if workers == 1:
+        for seeds in batches:
+            results.extend(simulate_batch(player_ratings, rounds, seeds, draw, white_advantage))
+            if progress:
+                progress(len(results), events)
+        return combine(results, rounds)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(simulate_batch, player_ratings, rounds, seeds, draw, white_advantage) for seeds in batches]
+        for future in as_completed(futures):
+            results.extend(future.result())
+            if progress:
+                progress(len(results), events)
+    return combine(results, rounds)
+
+
+def format_report(summary, players, out):
+    out.write(f"events               {summary['events']}\n")
+    out.write(f"players              {players}\n")
+    out.write(f"rounds               {summary['rounds']}\n")
+    out.write(f"rematches            {summary['rematches']}\n")
+    out.write(f"repeat byes          {summary['repeat_byes']}\n")
+    out.write(f"colour imbalance     mean |W-B| {summary['colour_imbalance']:.3f}, "
+              f"max {summary['max_colour_imbalance']}\n")
+    out.write(f"same colour 3x       {summary['colour_streaks_per_event']:.2f} per event\n")
+    out.write(f"score-group drift    {summary['float_share'] * 100:.1f}% of boards float, "
+              f"mean gap {summary['mean_score_gap']:.3f} points\n")
+    out.write(f"favourite won        {summary['favourite_won'] * 100:.1f}%\n")
+    out.write(f"{'round':<8}{'pair ms':>10}{'round ms':>10}\n")
+    for r, (pair_ms, round_ms) in enumerate(zip(summary["round_pair_ms"], summary["round_ms"]), start=1):
+        out.write(f"{r:<8}{pair_ms:>10.2f}{round_ms:>10.2f}\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate whole tournaments to test pairing quality and speed")
+    parser.add_argument("file", nargs="?", help="CSV (name,rating) or TRF player list")
+    parser.add_argument("--players", type=int, default=100, help="synthetic field size when no file is given")
+    parser.add_argument("--rounds", type=int, default=9)
+    parser.add_argument("--events", type=int, default=1000)
+    parser.add_argument("--workers", type=int, help="pool processes (default: CPU count, 1 runs in-process)")
+    parser.add_argument("--batch", type=int, default=25, help="events per pool task")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--draw", type=float, default=DEFAULT_DRAW, help="draw rate between equal players")
+    parser.add_argument("--format", choices=("text", "json"), default="text")
+    args = parser.parse_args(argv)
+
+    if args.file:
+        with open(args.file, "r", newline="") as file:
+            player_ratings = [rating for _, rating in importers.read_rated_players(file, args.file)]
+    else:
+        rng = random.Random(args.seed)
+        player_ratings = sorted((int(rng.gauss(1800, 250)) for _ in range(args.players)), reverse=True)
+    if len(player_ratings) < 2:
+        raise SystemExit("error: not enough players for pairing")
+
+    def progress(done, total):
+        sys.stderr.write(f"\r{done}/{total} events")
+        sys.stderr.flush()
+
+    summary = run(player_ratings, args.rounds, args.events, args.workers, args.batch, args.seed, args.draw,
+                  progress=progress if sys.stderr.isatty() else None)
+    if sys.stderr.isatty():
+        sys.stderr.write("\n")
+    if args.format == "json":
+        json.dump(dict(summary, players=len(player_ratings)), sys.stdout, indent=1)
+        print()
+    else:
+        format_report(summary, len(player_ratings), sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The modules import each other by plain name (import db), as when run
+# from the PythonChessPairing folder.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
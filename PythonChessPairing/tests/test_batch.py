@@ -0,0 +1,25 @@
+import pytest
+
+import batch
+import db
+import importers
+
+
+def test_batch_refuses_an_open_transaction(tmp_path):
+    path = str(tmp_path / "chess.db")
+    conn = db.connect(path)
+    conn.executemany("INSERT INTO Tournaments (TournamentName) VALUES (?)", [("Under 9",), ("Open",)])
+    for tourney_id in (1, 2):
+        importers.import_players(conn, tourney_id, [f"Player {i}" for i in range(6)])
+    conn.commit()
+
+    db.add_player(conn, 2, "Late entry")
+    with pytest.raises(ValueError, match="open transaction"):
+        batch.pair_sections(conn, path, [1, 2], workers=1)
+    with pytest.raises(ValueError, match="open transaction"):
+        batch.commit_section(conn, 1, 1, db.revision(conn, 1), [])
+    conn.rollback()
+
+    results = batch.pair_sections(conn, path, [1, 2], workers=1)
+    assert [(r.round_number, r.boards, r.error) for r in results] == [(1, 3, None), (1, 3, None)]
+    assert conn.execute("SELECT COUNT(*) FROM Players WHERE PlayerName = 'Late entry'").fetchone()[0] == 0
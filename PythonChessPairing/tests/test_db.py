@@ -0,0 +1,162 @@
+import random
+
+import pytest
+
+import db
+import importers
+import tiebreaks
+from pairing import pair_round
+from model import TournamentModel
+
+
+def new_tournament(players=12, seed=0):
+    rng = random.Random(seed)
+    conn = db.connect(":memory:")
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO Tournaments (TournamentName) VALUES ('Test')")
+    tourney_id = cursor.lastrowid
+    # Every third player is unrated.
+    importers.import_players(conn, tourney_id, [
+        (f"Player {i}", 0 if i % 3 == 0 else rng.randint(1200, 2500)) for i in range(players)
+    ])
+    conn.commit()
+    return conn, tourney_id
+
+
+def pair_next(conn, tourney_id):
+    round_number = db.next_round_number(conn, tourney_id)
+    pairings = pair_round(TournamentModel.load(conn, tourney_id).player_states())
+    round_id = db.insert_round(conn, tourney_id, round_number, pairings)
+    conn.commit()
+    return round_id, pairings
+
+
+def random_results(pairings, rng):
+    results = []
+    for white_id, black_id in pairings:
+        if black_id is None:
+            results.append((white_id, None, 1.0, 0.0))
+        else:
+            results.append((white_id, black_id) + rng.choice([(1.0, 0.0), (0.5, 0.5), (0.0, 1.0)]))
+    return results
+
+
+def table(conn, sql, tourney_id):
+    # Rows with floats rounded, so running sums compare with a rebuild.
+    rows = conn.execute(sql, (tourney_id,)).fetchall()
+    return [tuple(round(v, 6) if isinstance(v, float) else v for v in row) for row in rows]
+
+
+STANDINGS = "SELECT PlayerID, Points, Wins, Buchholz FROM Standings WHERE TournamentID = ? ORDER BY PlayerID"
+RATING_STATS = """SELECT PlayerID, Games, Score, OpponentRatings, Expected, AverageOpponent, Performance, RatingChange
+                  FROM RatingStats WHERE TournamentID = ? ORDER BY PlayerID"""
+POINTS = "SELECT PlayerID, Points FROM PlayerPoints WHERE TournamentID = ? ORDER BY PlayerID"
+GAMES = """SELECT RoundNumber, Board, WhiteID, BlackID, WhitePoints, BlackPoints
+           FROM Games WHERE TournamentID = ? ORDER BY RoundNumber, Board"""
+
+
+def snapshot(conn, tourney_id):
+    return [table(conn, sql, tourney_id) for sql in (STANDINGS, RATING_STATS, POINTS, GAMES)]
+
+
+def assert_matches_rebuild(conn, tourney_id):
+    # The rebuild is rolled back, so keep what the test has written.
+    conn.commit()
+    incremental = table(conn, STANDINGS, tourney_id), table(conn, RATING_STATS, tourney_id)
+    cursor = conn.cursor()
+    db.rebuild_standings(cursor, tourney_id)
+    db.rebuild_rating_stats(cursor, tourney_id)
+    rebuilt = table(conn, STANDINGS, tourney_id), table(conn, RATING_STATS, tourney_id)
+    conn.rollback()
+    assert incremental == rebuilt
+
+
+def last_checkpoint(conn, tourney_id):
+    return conn.execute("SELECT MAX(CheckpointID) FROM Checkpoints WHERE TournamentID = ?", (tourney_id,)).fetchone()[0]
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_incremental_tables_match_rebuild(seed):
+    rng = random.Random(seed)
+    conn, tourney_id = new_tournament(players=11 + seed, seed=seed)
+    before = {}
+    for _ in range(5):
+        state = snapshot(conn, tourney_id)
+        round_id, pairings = pair_next(conn, tourney_id)
+        before[last_checkpoint(conn, tourney_id)] = state
+        results = random_results(pairings, rng)
+        # Part of the round, the rest, then a few corrections.
+        for batch in (results[:len(results) // 2], results, random_results(rng.sample(pairings, 2), rng)):
+            state = snapshot(conn, tourney_id)
+            changed = db.save_results(conn, tourney_id, round_id, batch)
+            conn.commit()
+            if changed:
+                before[last_checkpoint(conn, tourney_id)] = state
+            assert_matches_rebuild(conn, tourney_id)
+
+    # Each checkpoint restores exactly the state it was taken from.
+    for checkpoint_id in sorted(before, reverse=True)[::3]:
+        db.rollback(conn, tourney_id, checkpoint_id)
+        conn.commit()
+        assert snapshot(conn, tourney_id) == before[checkpoint_id]
+        assert_matches_rebuild(conn, tourney_id)
+
+
+def test_saving_a_round_twice_changes_nothing():
+    rng = random.Random(1)
+    conn, tourney_id = new_tournament()
+    round_id, pairings = pair_next(conn, tourney_id)
+    results = random_results(pairings, rng)
+    db.save_results(conn, tourney_id, round_id, results)
+    state = snapshot(conn, tourney_id)
+    revision = db.revision(conn, tourney_id)
+    assert db.save_results(conn, tourney_id, round_id, results) == 0
+    assert snapshot(conn, tourney_id) == state
+    assert db.revision(conn, tourney_id) == revision
+
+
+def test_set_rating_rebuilds_rating_stats():
+    rng = random.Random(2)
+    conn, tourney_id = new_tournament()
+    for _ in range(3):
+        round_id, pairings = pair_next(conn, tourney_id)
+        db.save_results(conn, tourney_id, round_id, random_results(pairings, rng))
+    player_id = conn.execute("SELECT PlayerID FROM Players WHERE Rating IS NULL LIMIT 1").fetchone()[0]
+    db.set_rating(conn, player_id, 2100)
+    assert_matches_rebuild(conn, tourney_id)
+
+
+def test_buchholz_counts_every_game():
+    # As in tiebreaks.py and the FIDE rules, an opponent met twice counts
+    # twice.
+    conn, tourney_id = new_tournament(players=2)
+    a, b = [pid for pid, in conn.execute("SELECT PlayerID FROM Players ORDER BY PlayerID")]
+    for round_number, result in ((1, (a, b, 1.0, 0.0)), (2, (b, a, 0.5, 0.5))):
+        round_id = db.insert_round(conn, tourney_id, round_number, [result[:2]])
+        db.save_results(conn, tourney_id, round_id, [result])
+    assert table(conn, STANDINGS, tourney_id) == [(a, 1.5, 1, 1.0), (b, 0.5, 0, 3.0)]
+    assert_matches_rebuild(conn, tourney_id)
+    matrix = tiebreaks.TournamentMatrix.from_db(conn, tourney_id)
+    assert matrix.compute(["buchholz"])["buchholz"].tolist() == [1.0, 3.0]
+
+
+def test_rollback_to_round_keeps_late_results():
+    rng = random.Random(3)
+    conn, tourney_id = new_tournament()
+    round_id, pairings = pair_next(conn, tourney_id)
+    results = random_results(pairings, rng)
+    db.save_results(conn, tourney_id, round_id, results[:2])
+    second_id, second = pair_next(conn, tourney_id)
+    # Round 1 is finished and corrected after round 2 was paired.
+    db.save_results(conn, tourney_id, round_id, results)
+    db.save_results(conn, tourney_id, round_id, [results[0][:2] + (0.5, 0.5)])
+    db.save_results(conn, tourney_id, second_id, random_results(second, rng))
+    conn.commit()
+    games = table(conn, GAMES, tourney_id)
+
+    db.rollback_to_round(conn, tourney_id, 1)
+    conn.commit()
+    assert table(conn, GAMES, tourney_id) == [game for game in games if game[0] == 1]
+    assert_matches_rebuild(conn, tourney_id)
+    with pytest.raises(ValueError, match="before round 3 was paired"):
+        db.rollback_to_round(conn, tourney_id, 2)
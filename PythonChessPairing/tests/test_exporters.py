@@ -0,0 +1,49 @@
+import pytest
+
+import db
+import exporters
+import importers
+
+
+def event_with_bye():
+    conn = db.connect(":memory:")
+    conn.execute("INSERT INTO Tournaments (TournamentName) VALUES ('Open')")
+    importers.import_players(conn, 1, ["Ana", "Ben", "Cy"])
+    round_id = db.insert_round(conn, 1, 1, [(1, 2), (3, None)])
+    return conn, round_id
+
+
+def trf_block(conn, name):
+    line = next(line for line in exporters.trf(conn, 1) if name in line)
+    return line[91:99].strip()
+
+
+@pytest.mark.parametrize("score, code", [(1.0, "U"), (0.5, "H"), (0.0, "Z")])
+def test_trf_codes_a_bye_from_its_score(score, code):
+    conn, round_id = event_with_bye()
+    assert trf_block(conn, "Cy") == ""
+    db.save_results(conn, 1, round_id, [(1, 2, 1.0, 0.0), (3, None, score, 0.0)])
+    assert trf_block(conn, "Cy") == f"0000 - {code}"
+    assert trf_block(conn, "Ana") == "2 w 1"
+
+
+def test_trf_refuses_an_unexpected_score():
+    conn, round_id = event_with_bye()
+    conn.execute("UPDATE Games SET WhitePoints = 2, BlackPoints = 0 WHERE WhiteID = 1")
+    with pytest.raises(ValueError, match="unexpected score"):
+        list(exporters.trf(conn, 1))
+
+
+def test_failed_export_keeps_the_old_file(tmp_path):
+    conn, _ = event_with_bye()
+    path = tmp_path / "round.html"
+    exporters.export(conn, 1, "pairings.html", str(path))
+    before = path.read_text(encoding="utf-8")
+    with pytest.raises(ValueError, match="no round 5"):
+        exporters.export(conn, 1, "pairings.html", str(path), round_number=5)
+    # Fails after the header records have been written.
+    conn.execute("UPDATE Games SET WhitePoints = 2, BlackPoints = 0 WHERE WhiteID = 1")
+    with pytest.raises(ValueError, match="unexpected score"):
+        exporters.export(conn, 1, "trf", str(path))
+    assert path.read_text(encoding="utf-8") == before
+    assert [p.name for p in tmp_path.iterdir()] == ["round.html"]
@@ -0,0 +1,82 @@
+import io
+import sqlite3
+
+import pytest
+
+import db
+import exporters
+import importers
+from model import TournamentModel
+from pairing import pair_round
+
+
+def test_import_holds_the_write_lock(tmp_path):
+    path = str(tmp_path / "chess.db")
+    conn = db.connect(path)
+    conn.executemany("INSERT INTO Tournaments (TournamentName) VALUES (?)", [("Open",), ("Under 9",)])
+    conn.commit()
+    other = sqlite3.connect(path, timeout=0.1)
+    blocked = []
+
+    def names():
+        # A player added elsewhere while the file is still being read must
+        # wait, not land in the range seeded for this import.
+        try:
+            db.add_player(other, 2, "Late entry")
+        except sqlite3.OperationalError:
+            blocked.append(True)
+        for i in range(10):
+            yield f"Player {i}"
+
+    importers.import_players(conn, 1, names(), chunk_size=4)
+    conn.commit()
+    assert blocked
+    db.add_player(other, 2, "Late entry")
+    other.commit()
+
+    for table in ("PlayerPoints", "Standings", "RatingStats"):
+        rows = conn.execute(f"""
+            SELECT Players.TournamentID, {table}.TournamentID, COUNT(*) FROM Players
+            JOIN {table} ON {table}.PlayerID = Players.PlayerID GROUP BY 1, 2
+        """).fetchall()
+        assert rows == [(1, 1, 10), (2, 2, 1)]
+
+
+def test_csv_results_name_the_bad_line():
+    rows = ["Board,Result", "1,1-0", "2,1/2,1/2", "3"]
+    assert list(importers.read_csv_results(rows[:3])) == [(1, 1.0, 0.0), (2, 0.5, 0.5)]
+    with pytest.raises(ValueError, match="line 4: board 3 has no result"):
+        list(importers.read_csv_results(rows))
+    for result in ("1-x", "5-0", "-3,1", "nan,0", "inf,0"):
+        with pytest.raises(ValueError, match="line 2: board 1 has an unreadable result"):
+            list(importers.read_csv_results(["Board,Result", f"1,{result}"]))
+    assert list(importers.read_csv_results(["1,0.5,½", "2,=,="])) == [(1, 0.5, 0.5), (2, 0.5, 0.5)]
+
+
+def test_entered_bye_needs_only_the_white_score():
+    entries = [(1, 2, "1", "0"), (3, 4, "", ""), (5, None, "1", "")]
+    assert importers.entered_results(entries) == [(1, 2, 1.0, 0.0), (5, None, 1.0, 0.0)]
+    with pytest.raises(ValueError):
+        importers.entered_results([(1, 2, "1", "")])
+
+
+def trf_round_trip(names):
+    conn = db.connect(":memory:")
+    conn.execute("INSERT INTO Tournaments (TournamentName) VALUES ('Open')")
+    importers.import_players(conn, 1, names)
+    pairings = pair_round(TournamentModel.load(conn, 1).player_states())
+    round_id = db.insert_round(conn, 1, 1, pairings)
+    results = [(white_id, black_id, 1.0, 0.0) for white_id, black_id in pairings]
+    db.save_results(conn, 1, round_id, results)
+    trf = io.StringIO("".join(exporters.trf(conn, 1)))
+    return importers.round_results(conn, 1, 1, trf, "round.trf"), results
+
+
+def test_trf_results_match_players_by_name():
+    read, results = trf_round_trip([f"Player {i}" for i in range(5)])
+    assert sorted(read) == sorted(results)
+
+
+def test_trf_results_refuse_a_shared_name():
+    with pytest.raises(ValueError, match="more than one"):
+        trf_round_trip(["Ana", "Ana", "Ben", "Cy"])
@@ -0,0 +1,37 @@
+import random
+
+import db
+from model import TournamentModel
+from test_db import new_tournament, pair_next, random_results
+
+
+def test_model_follows_its_own_writes():
+    rng = random.Random(4)
+    conn, tourney_id = new_tournament()
+    model = TournamentModel.load(conn, tourney_id)
+    round_id, pairings = pair_next(conn, tourney_id)
+    model.add_round(conn, 1, pairings)
+    results = random_results(pairings, rng)
+    for _ in range(2):
+        changed = db.save_results(conn, tourney_id, round_id, results)
+        model.set_results(conn, 1, results, changed)
+        assert model.revision == db.revision(conn, tourney_id)
+    db.add_player(conn, tourney_id, "Late entry")
+    model.load_new_players(conn)
+    assert model.revision == db.revision(conn, tourney_id)
+    assert model.players[-1].name == "Late entry"
+
+
+def test_model_reloads_after_another_writer():
+    # A save that changes nothing must not take another writer's bump as
+    # its own.
+    rng = random.Random(5)
+    conn, tourney_id = new_tournament()
+    model = TournamentModel.load(conn, tourney_id)
+    round_id, pairings = pair_next(conn, tourney_id)
+    model.add_round(conn, 1, pairings)
+    results = random_results(pairings, rng)
+    model.set_results(conn, 1, results, db.save_results(conn, tourney_id, round_id, results))
+    db.set_rating(conn, pairings[0][0], 2000)
+    model.set_results(conn, 1, results, db.save_results(conn, tourney_id, round_id, results))
+    assert model.revision is None
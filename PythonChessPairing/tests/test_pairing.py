@@ -0,0 +1,126 @@
+import itertools
+import random
+
+import pytest
+
+from pairing import PlayerState, colour_preference, max_weight_matching, pair_round
+from simulate import play_game
+
+
+def play_event(players, rounds, seed):
+    """Pair and play a whole event; yield (states, pairings) per round."""
+    rng = random.Random(seed)
+    ratings = sorted((rng.randint(1000, 2700) for _ in range(players)), reverse=True)
+    states = {i + 1: PlayerState(i + 1, 0.0, rating) for i, rating in enumerate(ratings)}
+    for _ in range(rounds):
+        pairings = pair_round(list(states.values()))
+        yield states, pairings
+        new = dict(states)
+        for white_id, black_id in pairings:
+            white = states[white_id]
+            if black_id is None:
+                new[white_id] = PlayerState(white_id, white.points + 1, white.rating, white.opponents,
+                                            white.colours, True)
+                continue
+            black = states[black_id]
+            white_points, black_points = play_game(white.rating, black.rating, rng)
+            new[white_id] = PlayerState(white_id, white.points + white_points, white.rating,
+                                        white.opponents | {black_id}, white.colours + "W", white.had_bye)
+            new[black_id] = PlayerState(black_id, black.points + black_points, black.rating,
+                                        black.opponents | {white_id}, black.colours + "B", black.had_bye)
+        states = new
+
+
+def rematch_free_pairing_exists(states, player_ids):
+    player_ids = sorted(player_ids)
+    edges = [(i, j, 1) for i, j in itertools.combinations(range(len(player_ids)), 2)
+             if player_ids[j] not in states[player_ids[i]].opponents]
+    mate = max_weight_matching(edges, maxcardinality=True)
+    return len(mate) == len(player_ids) and -1 not in mate
+
+
+def check_round(states, pairings):
+    seen = [pid for pair in pairings for pid in pair if pid is not None]
+    assert sorted(seen) == sorted(states)
+    assert sum(black_id is None for _, black_id in pairings) == len(states) % 2
+    boards = [(w, b) for w, b in pairings if b is not None]
+    rematches = sum(b in states[w].opponents for w, b in boards)
+    if rematches:
+        assert not rematch_free_pairing_exists(states, [pid for pair in boards for pid in pair])
+    return rematches
+
+
+@pytest.mark.parametrize("players,rounds,seed", [(100, 9, seed) for seed in range(5)] + [(31, 9, 7), (40, 11, 3)])
+def test_events_never_rematch(players, rounds, seed):
+    for states, pairings in play_event(players, rounds, seed):
+        assert check_round(states, pairings) == 0
+        for white_id, black_id in pairings:
+            if black_id is None:
+                continue
+            # Nobody plays the same colour a third time or runs 3 ahead.
+            for pid, colour in ((white_id, "W"), (black_id, "B")):
+                colours = states[pid].colours + colour
+                assert not colours.endswith(colour * 3)
+                assert abs(colours.count("W") - colours.count("B")) <= 2
+
+
+@pytest.mark.parametrize("players", [4, 5, 6, 7, 8])
+def test_small_events_rematch_only_when_forced(players):
+    # Past players - 1 rounds rematches are unavoidable; before that they
+    # must only happen when no rematch-free pairing exists.
+    for seed in range(3):
+        for states, pairings in play_event(players, players + 1, seed):
+            check_round(states, pairings)
+
+
+def test_no_rematch_when_bottom_bracket_is_stuck():
+    # 5 and 6 have met and are alone in the last bracket; one of them has
+    # to be paired with somebody from the bracket above.
+    states = [
+        PlayerState(1, 1.0, opponents=[2], colours="W"),
+        PlayerState(2, 1.0, opponents=[1], colours="B"),
+        PlayerState(3, 1.0, opponents=[4], colours="W"),
+        PlayerState(4, 1.0, opponents=[3], colours="B"),
+        PlayerState(5, 0.0, opponents=[6], colours="W"),
+        PlayerState(6, 0.0, opponents=[5], colours="B"),
+    ]
+    by_id = {state.player_id: state for state in states}
+    pairings = pair_round(states)
+    assert all(black_id not in by_id[white_id].opponents for white_id, black_id in pairings)
+
+
+def test_absolute_colour_clash_avoided():
+    # 1 and 2 both need white; 3 and 4 both need black.
+    states = [
+        PlayerState(1, 2.0, opponents=[5, 6], colours="BB"),
+        PlayerState(2, 2.0, opponents=[7, 8], colours="BB"),
+        PlayerState(3, 2.0, opponents=[7, 5], colours="WW"),
+        PlayerState(4, 2.0, opponents=[8, 6], colours="WW"),
+    ]
+    pairings = pair_round(states)
+    for white_id, black_id in pairings:
+        assert colour_preference(dict((s.player_id, s) for s in states)[white_id].colours)[1] == "W"
+
+
+def test_first_round_colours_alternate():
+    pairings = pair_round([PlayerState(i, 0.0, 2000 - i) for i in range(1, 9)])
+    assert pairings == [(1, 5), (6, 2), (3, 7), (8, 4)]
+
+
+def test_max_weight_matching_matches_brute_force():
+    rng = random.Random(1)
+    for _ in range(30):
+        n = rng.randint(2, 8)
+        edges = [(i, j, rng.randint(1, 20)) for i, j in itertools.combinations(range(n), 2) if rng.random() < 0.6]
+        if not edges:
+            continue
+        mate = max_weight_matching(edges, maxcardinality=True)
+        weight = {(i, j): w for i, j, w in edges}
+        got = (sum(m != -1 for m in mate) // 2, sum(weight[(i, j)] for i, j in enumerate(mate) if i < j))
+        best = (0, 0)
+        for size in range(1, n // 2 + 1):
+            for chosen in itertools.combinations(edges, size):
+                ends = [v for i, j, _ in chosen for v in (i, j)]
+                if len(set(ends)) == len(ends):
+                    best = max(best, (size, sum(w for _, _, w in chosen)))
+        assert got == best
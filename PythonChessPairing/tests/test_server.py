@@ -0,0 +1,56 @@
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+import db
+import importers
+import server
+
+
+@pytest.fixture
+def feed(tmp_path):
+    path = str(tmp_path / "chess.db")
+    conn = db.connect(path)
+    conn.execute("INSERT INTO Tournaments (TournamentName) VALUES ('Open')")
+    importers.import_players(conn, 1, [f"Player {i}" for i in range(4)])
+    db.insert_round(conn, 1, 1, [(1, 3), (4, 2)])
+    conn.commit()
+    httpd = server.FeedServer(path, port=0)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+
+    def get(path):
+        url = f"http://127.0.0.1:{httpd.server_address[1]}{path}"
+        with urllib.request.urlopen(url) as response:
+            return response.headers["ETag"], response.read().decode("utf-8")
+
+    yield conn, httpd, get
+    httpd.shutdown()
+    httpd.server_close()
+    conn.close()
+
+
+def test_round_must_exist(feed):
+    conn, httpd, get = feed
+    assert "Round 1" in get("/t/1/pairings.html?round=1")[1]
+    for round_number in (0, 2, 12345):
+        with pytest.raises(urllib.error.HTTPError) as e:
+            get(f"/t/1/pairings.html?round={round_number}")
+        assert e.value.code == 404
+    # Other views ignore the parameter instead of caching a page per value.
+    get("/t/1/standings.json?round=7")
+    assert {key[3] for key in httpd.cache} == {None, 1}
+
+
+def test_rename_changes_etag_and_drops_old_pages(feed):
+    conn, httpd, get = feed
+    etag, body = get("/t/1/standings.html")
+    get("/t/1/pairings.json")
+    conn.execute("UPDATE Tournaments SET TournamentName = 'Spring Open' WHERE TournamentID = 1")
+    db.bump_revision(conn.cursor(), 1)
+    conn.commit()
+    new_etag, body = get("/t/1/standings.html")
+    assert new_etag != etag and "Spring Open" in body
+    assert list(httpd.cache) == [(1, "standings", "html", None)]
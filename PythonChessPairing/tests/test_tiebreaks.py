@@ -0,0 +1,16 @@
+import pytest
+
+import db
+import tiebreaks
+
+
+def test_set_order_rejects_unknown_and_duplicate_names():
+    conn = db.connect(":memory:")
+    conn.execute("INSERT INTO Tournaments (TournamentName) VALUES ('Test')")
+    with pytest.raises(ValueError, match="listed twice"):
+        tiebreaks.set_order(conn, 1, ["buchholz", " buchholz"])
+    with pytest.raises(ValueError, match="unknown"):
+        tiebreaks.set_order(conn, 1, ["koya"])
+    assert tiebreaks.get_order(conn, 1) == list(tiebreaks.DEFAULT_ORDER)
+    tiebreaks.set_order(conn, 1, ["sonneborn_berger", "buchholz"])
+    assert tiebreaks.get_order(conn, 1) == ["sonneborn_berger", "buchholz"]
@@ -0,0 +1,70 @@
+import random
+
+import pytest
+
+import db
+import importers
+from vlist import RowSource
+
+SQL = """
+    SELECT PlayerID AS Key,
+           (SELECT PlayerName FROM Players WHERE Players.PlayerID = Standings.PlayerID) AS Player,
+           Points, Buchholz, Wins
+    FROM Standings
+    WHERE TournamentID = ?
+"""
+RANK = [("Points", True), ("Buchholz", True), ("Wins", True), ("Key", False)]
+
+
+@pytest.fixture
+def source():
+    rng = random.Random(5)
+    conn = db.connect(":memory:")
+    conn.execute("INSERT INTO Tournaments (TournamentName) VALUES ('Test')")
+    importers.import_players(conn, 1, [f"Player {i}" for i in range(300)])
+    # Few distinct values, so that ties go all the way down to Key.
+    conn.executemany(
+        "UPDATE Standings SET Points = ?, Buchholz = ?, Wins = ? WHERE PlayerID = ?",
+        [(rng.randint(0, 4) / 2, rng.randint(0, 3), rng.randint(0, 2), pid) for pid in range(1, 301)],
+    )
+    return RowSource(conn, SQL, (1,), columns=("Rank", "Player", "Points", "Buchholz", "Wins"),
+                     filter_column="Player", rank=RANK)
+
+
+def expected(source, sort, descending, filter_text=""):
+    rows = source.conn.execute(f"""
+        SELECT Key, ROW_NUMBER() OVER (ORDER BY Points DESC, Buchholz DESC, Wins DESC, Key) AS Rank,
+               Player, Points, Buchholz, Wins
+        FROM ({SQL})
+    """, (1,)).fetchall()
+    rows = [row for row in rows if filter_text in row[2]]
+    order = "DESC" if descending else "ASC"
+    if sort != "Rank":
+        rows.sort(key=lambda row: row[0], reverse=descending)
+        rows.sort(key=lambda row: row[source.columns.index(sort)], reverse=descending)
+    elif order == "DESC":
+        rows.reverse()
+    return rows
+
+
+@pytest.mark.parametrize("sort,descending,filter_text", [
+    ("Rank", False, ""), ("Rank", True, ""), ("Points", False, ""), ("Player", True, ""), ("Rank", False, "1"),
+])
+def test_paging_matches_row_number(source, sort, descending, filter_text):
+    want = expected(source, sort, descending, filter_text)
+    assert source.count(filter_text) == len(want)
+
+    # Jump, then step forwards and backwards across the whole list.
+    page = source.fetch(sort, descending, filter_text, limit=20, offset=40)
+    assert page == want[40:60]
+    rows = list(page)
+    while len(rows) < len(want) - 40:
+        rows += source.fetch(sort, descending, filter_text, limit=7, after=rows[-1])
+    assert rows == want[40:]
+    rows = list(page)
+    while len(rows) < 60:
+        rows = source.fetch(sort, descending, filter_text, limit=9, before=rows[0]) + rows
+    assert rows == want[:60]
+
+    assert source.fetch(sort, descending, filter_text, limit=5, start=want[100]) == want[100:105]
+    assert source.position(want[100], sort, descending, filter_text) == 100
@@ -0,0 +1,173 @@
+"""Tiebreak engine on NumPy arrays.
+
+A tournament is loaded once into per-round opponent and score matrices
+(rounds x players). Every tiebreak is then a handful of array operations, so
+a full chain for thousands of players takes milliseconds. Byes and unplayed
+games count towards a player's own score but not towards any opponent-based
+tiebreak.
+"""
+import numpy as np
+
+import db
+import metrics
+
+# Name stored in Tournaments.Tiebreaks -> column heading.
+TIEBREAKS = {
+    "buchholz": "Buchholz",
+    "buchholz_cut1": "Buchholz Cut 1",
+    "median_buchholz": "Median Buchholz",
+    "sonneborn_berger": "Sonneborn-Berger",
+    "progressive": "Progressive",
+    "wins": "Wins",
+}
+DEFAULT_ORDER = ("buchholz", "wins")
+
+
+class TournamentMatrix(object):
+    """Opponent and score arrays for one tournament.
+
+    opponents[r, i] is the index of player i's opponent in round r, or -1 for
+    a bye or no game; scores[r, i] is what i scored in round r. Only games
+    with a result are included.
+    """
+
+    def __init__(self, player_ids, games):
+        # games: (round_number, white_id, black_id, white_points, black_points)
+        self.player_ids = np.asarray(sorted(player_ids), dtype=np.int64)
+        n = len(self.player_ids)
+        games = [g for g in games if g[3] is not None]
+        if games:
+            round_numbers = np.array([g[0] for g in games], dtype=np.int64)
+            white = self._index([g[1] for g in games])
+            black = self._index([-1 if g[2] is None else g[2] for g in games])
+            white_points = np.array([g[3] for g in games], dtype=float)
+            black_points = np.array([g[4] or 0.0 for g in games], dtype=float)
+            self.round_numbers, rounds = np.unique(round_numbers, return_inverse=True)
+        else:
+            self.round_numbers = np.zeros(0, dtype=np.int64)
+        self.opponents = np.full((len(self.round_numbers), n), -1, dtype=np.int64)
+        self.scores = np.zeros((len(self.round_numbers), n))
+        if games:
+            keep = white >= 0
+            pair = keep & (black >= 0)
+            self.opponents[rounds[pair], white[pair]] = black[pair]
+            self.opponents[rounds[pair], black[pair]] = white[pair]
+            self.scores[rounds[keep], white[keep]] = white_points[keep]
+            self.scores[rounds[pair], black[pair]] = black_points[pair]
+
+    def _index(self, ids):
+        # Map PlayerIDs to matrix columns; unknown ids (and -1) become -1.
+        ids = np.asarray(ids, dtype=np.int64)
+        if not len(self.player_ids):
+            return np.full(len(ids), -1, dtype=np.int64)
+        pos = np.clip(np.searchsorted(self.player_ids, ids), 0, len(self.player_ids) - 1)
+        return np.where(self.player_ids[pos] == ids, pos, -1)
+
+    @classmethod
+    def from_arrays(cls, player_ids, round_numbers, opponents, scores):
+        """Wrap ready-made arrays (see model.TournamentModel.matrix)."""
+        matrix = cls.__new__(cls)
+        matrix.player_ids = player_ids
+        matrix.round_numbers = round_numbers
+        matrix.opponents = opponents
+        matrix.scores = scores
+        return matrix
+
+    @classmethod
+    def from_db(cls, conn, tourney_id):
+        cursor = conn.cursor()
+        cursor.execute("SELECT PlayerID FROM Players WHERE TournamentID = ?", (tourney_id,))
+        player_ids = [row[0] for row in cursor.fetchall()]
+        cursor.execute(
+            """SELECT RoundNumber, WhiteID, BlackID, WhitePoints, BlackPoints
+               FROM Games WHERE TournamentID = ? AND WhitePoints IS NOT NULL""",
+            (tourney_id,),
+        )
+        return cls(player_ids, cursor.fetchall())
+
+    def points(self):
+        return self.scores.sum(axis=0)
+
+    def compute(self, names=TIEBREAKS):
+        """Return {"points": array, name: array, ...} indexed like player_ids."""
+        points = self.points()
+        played = self.opponents >= 0
+        opponent_points = np.where(played, points[np.maximum(self.opponents, 0)], 0.0)
+        games = played.sum(axis=0)
+        buchholz = opponent_points.sum(axis=0)
+        lowest = np.where(games > 0, np.where(played, opponent_points, np.inf).min(axis=0, initial=np.inf), 0.0)
+        highest = np.where(games > 0, np.where(played, opponent_points, -np.inf).max(axis=0, initial=-np.inf), 0.0)
+
+        values = {"points": points}
+        for name in names:
+            if name == "buchholz":
+                values[name] = buchholz
+            elif name == "buchholz_cut1":
+                values[name] = buchholz - lowest
+            elif name == "median_buchholz":
+                values[name] = np.where(games >= 3, buchholz - lowest - highest, buchholz)
+            elif name == "sonneborn_berger":
+                values[name] = (np.where(played, self.scores, 0.0) * opponent_points).sum(axis=0)
+            elif name == "progressive":
+                values[name] = np.cumsum(self.scores, axis=0).sum(axis=0)
+            elif name == "wins":
+                values[name] = (played & (self.scores == 1.0)).sum(axis=0)
+            else:
+                raise ValueError(f"unknown tiebreak {name!r}")
+        return values
+
+    def ranking(self, order=DEFAULT_ORDER):
+        """Column indexes best first, plus the computed values."""
+        values = self.compute(order)
+        # lexsort treats the last key as primary; PlayerID settles full ties.
+        keys = [self.player_ids] + [-values[name] for name in reversed(order)] + [-values["points"]]
+        return np.lexsort(keys), values
+
+
+def get_order(conn, tourney_id):
+    cursor = conn.cursor()
+    cursor.execute("SELECT Tiebreaks FROM Tournaments WHERE TournamentID = ?", (tourney_id,))
+    row = cursor.fetchone()
+    if not row or not row[0]:
+        return list(DEFAULT_ORDER)
+    return row[0].split(",")
+
+
+def set_order(conn, tourney_id, names):
+    names = [name.strip() for name in names if name.strip()]
+    for i, name in enumerate(names):
+        if name not in TIEBREAKS:
+            raise ValueError(f"unknown tiebreak {name!r}; choose from {', '.join(TIEBREAKS)}")
+        if name in names[:i]:
+            raise ValueError(f"tiebreak {name!r} is listed twice")
+    cursor = conn.cursor()
+    cursor.execute("UPDATE Tournaments SET Tiebreaks = ? WHERE TournamentID = ?", (",".join(names), tourney_id))
+    db.bump_revision(cursor, tourney_id)
+
+
+def standings(conn, tourney_id, order=None, model=None):
+    """Final standings with the tournament's tiebreak chain.
+
+    Returns (order, rows) where rows are (rank, player_id, name, points,
+    *tiebreak values in order). With a model.TournamentModel the games and
+    names come from it instead of the database.
+    """
+    order = list(order or get_order(conn, tourney_id))
+    with metrics.span("tiebreaks.load"):
+        if model is None:
+            matrix = TournamentMatrix.from_db(conn, tourney_id)
+            cursor = conn.cursor()
+            cursor.execute("SELECT PlayerID, PlayerName FROM Players WHERE TournamentID = ?", (tourney_id,))
+            names = dict(cursor.fetchall())
+        else:
+            model.sync(conn)
+            matrix = model.matrix()
+            names = model.names()
+    with metrics.span("tiebreaks.compute"):
+        ranked, values = matrix.ranking(order)
+    columns = [values["points"]] + [values[name] for name in order]
+    rows = []
+    for rank, i in enumerate(ranked.tolist(), start=1):
+        player_id = int(matrix.player_ids[i])
+        rows.append((rank, player_id, names.get(player_id)) + tuple(column[i].item() for column in columns))
+    return order, rows
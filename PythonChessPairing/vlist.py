@@ -0,0 +1,324 @@
+"""Virtual Treeview that only ever holds the rows on screen.
+
+A RowSource wraps a SELECT and fetches windows of it with keyset pagination
+(WHERE (sort, Key) > (?, ?) ... LIMIT n), so scrolling costs one small
+indexed query per step no matter how deep into the list it is. Sorting and
+filtering are part of the SQL as well. Only a jump with the scrollbar
+thumb falls back to OFFSET. Ranked lists (Standings, Ratings) page on the
+columns of their ranking index and number the rows from the page's
+position, rather than wrapping the query in ROW_NUMBER().
+"""
+import tkinter as tk
+from tkinter.ttk import Treeview, Scrollbar
+
+import metrics
+
+FILTER_DELAY_MS = 250
+
+
+class RowSource(object):
+    """Windowed access to a query.
+
+    sql must be a SELECT whose first column is a unique integer aliased as
+    Key; columns names the remaining aliases in order. Sort columns must not
+    be NULL.
+
+    rank, if given, is a list of (column, descending) pairs ending in Key,
+    matching an index, and adds a computed Rank column: the place of each
+    row in that order over the whole query, filter or not. Sorting by Rank
+    walks the index, and the ranks of a page are its start position plus
+    the offset within the page, so a 50,000 player table costs no more per
+    step than a short one.
+    """
+
+    def __init__(self, conn, sql, params=(), columns=(), filter_column=None, rank=None):
+        self.conn = conn
+        self.sql = sql
+        self.params = tuple(params)
+        self.columns = ("Key",) + tuple(columns)
+        self.filter_column = filter_column
+        self.rank = rank
+        self._selected = [column for column in self.columns if not (rank and column == "Rank")]
+
+    def _where(self, filter_text):
+        if filter_text and self.filter_column:
+            return [f"{self.filter_column} LIKE ?"], [f"%{filter_text}%"]
+        return [], []
+
+    def _terms(self, sort, descending):
+        # (column, descending) pairs of the full display order.
+        if sort == "Rank" and self.rank:
+            return [(column, desc != descending) for column, desc in self.rank]
+        return [(sort, descending), ("Key", descending)]
+
+    def _keyset(self, terms, row, after, inclusive=False):
+        """SQL and args selecting the rows after (or before) row in the
+        order given by terms, optionally including row itself."""
+        values = [self._value(row, column) for column, _ in terms]
+
+        def op(desc):
+            return ("<" if desc == after else ">") + ("=" if inclusive else "")
+
+        if len({desc for _, desc in terms}) == 1:
+            columns = ", ".join(column for column, _ in terms)
+            return f"({columns}) {op(terms[0][1])} ({', '.join('?' * len(terms))})", values
+        # Mixed directions: expand into nested ORs, led by a plain range on
+        # the first column so that the index is entered at the right place.
+        column, desc = terms[-1]
+        sql, args = f"{column} {op(desc)} ?", [values[-1]]
+        for (column, desc), value in zip(reversed(terms[:-1]), reversed(values[:-1])):
+            sql = f"({column} {op(desc)[0]} ? OR ({column} = ? AND {sql}))"
+            args = [value, value] + args
+        column, desc = terms[0]
+        return f"{column} {op(desc)[0]}= ? AND {sql}", [values[0]] + args
+
+    def _value(self, row, column):
+        return row[self.columns.index(column)]
+
+    @metrics.timed("ui.count")
+    def count(self, filter_text=""):
+        where, args = self._where(filter_text)
+        sql = f"SELECT COUNT(*) FROM ({self.sql})"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        return self.conn.execute(sql, self.params + tuple(args)).fetchone()[0]
+
+    @metrics.timed("ui.position")
+    def position(self, row, sort, descending, filter_text=""):
+        """Number of rows that come before row in the given order."""
+        where, args = self._where(filter_text)
+        condition, values = self._keyset(self._terms(sort, descending), row, after=False)
+        where.append(condition)
+        sql = f"SELECT COUNT(*) FROM ({self.sql}) WHERE " + " AND ".join(where)
+        return self.conn.execute(sql, self.params + tuple(args + values)).fetchone()[0]
+
+    @metrics.timed("ui.fetch")
+    def fetch(self, sort, descending, filter_text="", limit=20, after=None, before=None, start=None, offset=0):
+        """Fetch up to limit rows in display order.
+
+        after/before/start take a row previously returned by fetch: the rows
+        strictly after it, strictly before it, or from it onwards.
+        """
+        where, args = self._where(filter_text)
+        forward = before is None
+        terms = self._terms(sort, descending)
+        anchor = after if after is not None else before if before is not None else start
+        if anchor is not None:
+            condition, values = self._keyset(terms, anchor, forward, inclusive=start is not None)
+            where.append(condition)
+            args += values
+        if not forward:
+            terms = [(column, not desc) for column, desc in terms]
+        sql = f"SELECT {', '.join(self._selected)} FROM ({self.sql})"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY " + ", ".join(f"{column} {'DESC' if desc else 'ASC'}" for column, desc in terms)
+        sql += " LIMIT ? OFFSET ?"
+        rows = self.conn.execute(sql, self.params + tuple(args) + (limit, offset)).fetchall()
+        if not forward:
+            rows.reverse()
+        if self.rank:
+            rows = self._add_ranks(rows, sort, descending, filter_text, offset, after, before, start)
+        return rows
+
+    def _add_ranks(self, rows, sort, descending, filter_text, offset, after, before, start):
+        # Rank is the place in the rank order over the unfiltered query.
+        # Scrolling in that order counts on from the anchor's rank; other
+        # fetches count the rows ahead of the first row (or of every row
+        # when filtered or sorted otherwise).
+        if not rows:
+            return rows
+        at = self.columns.index("Rank")
+        if sort == "Rank" and not filter_text:
+            step = -1 if descending else 1
+            if after is not None:
+                first = after[at] + step
+            elif before is not None:
+                first = before[at] - step * len(rows)
+            elif start is None and not descending:
+                first = offset + 1
+            else:
+                first = self._rank_of(rows[0])
+            ranks = [first + step * i for i in range(len(rows))]
+        else:
+            ranks = [self._rank_of(row) for row in rows]
+        return [row[:at] + (rank,) + row[at:] for row, rank in zip(rows, ranks)]
+
+    def _rank_of(self, row):
+        # row as selected, i.e. still without its Rank.
+        at = self.columns.index("Rank")
+        return self.position(row[:at] + (None,) + row[at:], "Rank", False) + 1
+
+
+class VirtualList(tk.Frame):
+    """Treeview plus scrollbar and filter box backed by a RowSource.
+
+    The Treeview always has at most `height` items; scrolling swaps their
+    values in place and only touches items whose values changed.
+    """
+
+    def __init__(self, master, source, headings=None, sort="Key", descending=False, height=20, filterable=True):
+        super().__init__(master)
+        self.source = source
+        self.sort = sort
+        self.descending = descending
+        self.height = height
+        self.rows = []
+        self._shown = []
+        self.offset = 0
+        self.total = 0
+        self._selected_key = None
+        self._filter_job = None
+
+        columns = source.columns[1:]
+        headings = headings or {}
+        self.filter_var = tk.StringVar()
+        if filterable and source.filter_column:
+            bar = tk.Frame(self)
+            bar.pack(fill="x")
+            tk.Label(bar, text="Filter:").pack(side="left")
+            tk.Entry(bar, textvariable=self.filter_var).pack(side="left", fill="x", expand=True)
+            self.filter_var.trace_add("write", self._on_filter)
+
+        self.tree = Treeview(self, columns=columns, show="headings", height=height, selectmode="browse")
+        for column in columns:
+            self.tree.heading(column, text=headings.get(column, column), command=lambda c=column: self.sort_by(c))
+        self.scroll = Scrollbar(self, orient="vertical", command=self._on_scroll)
+        self.scroll.pack(side="right", fill="y")
+        self.tree.pack(side="left", expand=True, fill="both")
+
+        self.tree.bind("<<TreeviewSelect>>", self._on_select)
+        self.tree.bind("<MouseWheel>", lambda e: self._step(-3 if e.delta > 0 else 3))
+        self.tree.bind("<Button-4>", lambda e: self._step(-3))
+        self.tree.bind("<Button-5>", lambda e: self._step(3))
+        self.tree.bind("<Up>", self._on_key)
+        self.tree.bind("<Down>", self._on_key)
+        self.tree.bind("<Prior>", lambda e: self._step(-height))
+        self.tree.bind("<Next>", lambda e: self._step(height))
+
+        self.refresh(reset=True)
+
+    def selected(self):
+        """The selected row as (key, *values), or None."""
+        for row in self.rows:
+            if row[0] == self._selected_key:
+                return row
+        return None
+
+    def selected_key(self):
+        row = self.selected()
+        return row[0] if row else None
+
+    def refresh(self, reset=False):
+        """Reload the visible window, staying at the same place unless reset."""
+        with metrics.action("ui.refresh"):
+            self._refresh(reset)
+
+    def _refresh(self, reset):
+        filter_text = self.filter_var.get()
+        self.total = self.source.count(filter_text)
+        if reset or not self.rows:
+            self._jump(0)
+            return
+        first = self.rows[0]
+        self.rows = self.source.fetch(self.sort, self.descending, filter_text, self.height, start=first)
+        if self.rows:
+            self.offset = self.source.position(self.rows[0], self.sort, self.descending, filter_text)
+            if len(self.rows) < self.height and self.offset:
+                self._jump(self.total - self.height)
+                return
+            self._render()
+        else:
+            self._jump(self.total - self.height)
+
+    def sort_by(self, column):
+        if self.sort == column:
+            self.descending = not self.descending
+        else:
+            self.sort = column
+            self.descending = False
+        self.refresh(reset=True)
+
+    def _jump(self, offset):
+        offset = max(0, min(offset, self.total - self.height))
+        self.rows = self.source.fetch(self.sort, self.descending, self.filter_var.get(), self.height, offset=offset)
+        self.offset = offset
+        self._render()
+
+    def _step(self, n):
+        if not self.rows or n == 0:
+            return "break"
+        filter_text = self.filter_var.get()
+        if n > 0:
+            if self.offset + len(self.rows) >= self.total:
+                return "break"
+            more = self.source.fetch(self.sort, self.descending, filter_text, n, after=self.rows[-1])
+            rows = self.rows + more
+            drop = max(0, len(rows) - self.height)
+            self.rows = rows[drop:]
+            self.offset += drop
+        else:
+            if self.offset == 0:
+                return "break"
+            more = self.source.fetch(self.sort, self.descending, filter_text, -n, before=self.rows[0])
+            self.rows = (more + self.rows)[:self.height]
+            self.offset = max(0, self.offset - len(more))
+        self._render()
+        return "break"
+
+    @metrics.timed("ui.render")
+    def _render(self):
+        shown = [tuple(row[1:]) for row in self.rows]
+        for i, values in enumerate(shown):
+            if i >= len(self._shown):
+                self.tree.insert("", "end", iid=str(i), values=values)
+            elif self._shown[i] != values:
+                self.tree.item(str(i), values=values)
+        if len(self._shown) > len(shown):
+            self.tree.delete(*[str(i) for i in range(len(shown), len(self._shown))])
+        self._shown = shown
+
+        selected = [str(i) for i, row in enumerate(self.rows) if row[0] == self._selected_key]
+        self.tree.selection_set(selected)
+
+        if self.total:
+            self.scroll.set(self.offset / self.total, (self.offset + len(self.rows)) / self.total)
+        else:
+            self.scroll.set(0, 1)
+
+    def _on_scroll(self, action, amount, unit=None):
+        if action == "moveto":
+            self._jump(int(float(amount) * self.total))
+        elif unit == "pages":
+            self._step(int(amount) * self.height)
+        else:
+            self._step(int(amount))
+
+    def _on_select(self, event):
+        sel = self.tree.selection()
+        if sel:
+            self._selected_key = self.rows[int(sel[0])][0]
+
+    def _on_key(self, event):
+        focus = self.tree.focus()
+        if not focus:
+            return None
+        index = int(focus)
+        if event.keysym == "Down" and index == len(self.rows) - 1:
+            self._step(1)
+        elif event.keysym == "Up" and index == 0:
+            self._step(-1)
+        else:
+            return None
+        self.tree.selection_set(focus)
+        self.tree.focus(focus)
+        return "break"
+
+    def _on_filter(self, *args):
+        if self._filter_job is not None:
+            self.after_cancel(self._filter_job)
+        self._filter_job = self.after(FILTER_DELAY_MS, self._apply_filter)
+
+    def _apply_filter(self):
+        self._filter_job = None
+        self.refresh(reset=True)